@@ -0,0 +1,1200 @@
+"""
+Backends de almacenamiento para el motor de verificación
+Define las operaciones que usan el motor, el worker y la app (reclamar
+pendientes, guardar resultados, progreso y estado de control, estadísticas y
+lista de lotes) con dos implementaciones:
+
+- AlmacenamientoSupabase: PostgREST de Supabase (producción)
+- AlmacenamientoSQLite: archivo SQLite local en modo WAL (pruebas, benchmarks
+  y despliegues todo-en-uno sin conexión)
+
+El backend se elige con la variable de entorno ALMACENAMIENTO (supabase | sqlite)
+"""
+
+import os
+import sqlite3
+import threading
+import logging
+from collections import Counter
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Filas por petición al leer la serie por hora (horas x lotes x estatus)
+TAMANO_PAGINA_SERIE = 1000
+
+# Segundos tras los que una consulta express EN_PROCESO se considera abandonada (worker caído)
+ABANDONO_CONSULTA_EXPRESS = 120
+
+# Estados posibles de una ICCID
+ESTATUS_ICCID = ["PENDIENTE", "ACTIVA", "INACTIVA", "ERROR"]
+
+# Ruta por defecto de la base de datos local
+RUTA_SQLITE = os.getenv("ALMACENAMIENTO_SQLITE_RUTA", "verificador_local.db")
+
+
+class AlmacenamientoBase:
+    """Interfaz común de almacenamiento"""
+
+    # Conexión directa a Postgres para operaciones masivas (solo Supabase, opcional)
+    postgres = None
+
+    # ---------- ICCIDs ----------
+
+    def reclamar_pendientes(self, lote: str, limite: int, despues_de_id: int = 0) -> List[Dict]:
+        """ICCIDs PENDIENTE del lote con id > despues_de_id, en orden de id (con sus intentos previos)"""
+        raise NotImplementedError
+
+    def contar_pendientes(self, lote: str) -> int:
+        """Número de ICCIDs PENDIENTE del lote"""
+        raise NotImplementedError
+
+    def muestrear_pendientes(self, lote: str, tamano: int, estratos: int) -> List[Dict]:
+        """
+        Muestra aleatoria de ICCIDs PENDIENTE estratificada por tramos de id, en
+        orden intercalado (una de cada estrato, luego otra de cada uno...)
+        """
+        raise NotImplementedError
+
+    def guardar_resultados(self, resultados: List[Dict]):
+        """Aplicar resultados (iccid_completo, estatus, numero_asignado, fecha_verificacion, observaciones)"""
+        raise NotImplementedError
+
+    def insertar_iccids(self, registros: List[Dict]) -> Tuple[int, int]:
+        """Insertar ICCIDs nuevas; regresa (insertadas, duplicadas)"""
+        raise NotImplementedError
+
+    def lote_existe(self, lote: str) -> bool:
+        raise NotImplementedError
+
+    def eliminar_lote(self, lote: str):
+        """Eliminar las ICCIDs y el proceso de un lote"""
+        raise NotImplementedError
+
+    def resetear_lote(self, lote: str, estatus: Optional[str] = None):
+        """Regresar a PENDIENTE las ICCIDs del lote (opcionalmente solo un estatus)"""
+        raise NotImplementedError
+
+    def iterar_registros(self, lote: Optional[str] = None, estatus: Optional[str] = None,
+                         columnas: Optional[List[str]] = None) -> Iterator[Dict]:
+        """Recorrer por páginas (keyset sobre id) los registros que cumplen el filtro"""
+        raise NotImplementedError
+
+    def pagina_registros(self, lote: Optional[str] = None, estatus: Optional[str] = None,
+                         fecha_desde: Optional[str] = None, fecha_hasta: Optional[str] = None,
+                         orden: str = "id", descendente: bool = False, despues_de=None,
+                         tamano: int = 100) -> List[Dict]:
+        """Una página del navegador de resultados, paginada por llave (ver consultas.obtener_pagina)"""
+        raise NotImplementedError
+
+    def contar_registros(self, lote: Optional[str] = None, estatus: Optional[str] = None,
+                         fecha_desde: Optional[str] = None, fecha_hasta: Optional[str] = None) -> int:
+        """Total de registros que cumplen los filtros"""
+        raise NotImplementedError
+
+    # ---------- Procesos (progreso y estado de control) ----------
+
+    def obtener_proceso(self, lote: str) -> Optional[Dict]:
+        raise NotImplementedError
+
+    def listar_procesos(self, estados: Optional[List[str]] = None) -> List[Dict]:
+        raise NotImplementedError
+
+    def inicializar_proceso(self, lote: str, total: int):
+        """Marcar el proceso como EJECUTANDO con su total (creándolo si no existe)"""
+        raise NotImplementedError
+
+    def iniciar_proceso(self, lote: str, total: int, muestreo: Optional[Dict] = None):
+        """
+        Arrancar un proceso desde la UI: EJECUTANDO, total nuevo, contadores en cero y fecha de inicio actual
+        muestreo: {"margen_objetivo", "poblacion_muestra"} para el modo muestra (ver estimacion.py);
+        sin él el proceso es una corrida completa
+        """
+        raise NotImplementedError
+
+    def actualizar_progreso(self, lote: str, progreso: int, activas: int, inactivas: int, errores: int,
+                            rendimiento: Optional[Dict] = None):
+        """
+        Publicar el progreso del proceso; rendimiento son las columnas de
+        velocidad y ETA (ver rendimiento.MedidorRendimiento.resumen)
+        """
+        raise NotImplementedError
+
+    def cambiar_estado_proceso(self, lote: str, estado: str):
+        raise NotImplementedError
+
+    def actualizar_planificacion(self, lote: str, prioridad: int, peso: int):
+        """Prioridad (mayor = antes) y peso (parte proporcional de los slots) del proceso"""
+        raise NotImplementedError
+
+    def actualizar_presupuesto(self, lote: str, datos: Dict):
+        """Publicar presupuesto_hoy y fecha_estimada del proceso (presupuesto diario)"""
+        raise NotImplementedError
+
+    def sumar_consumo_diario(self, dia: str, cantidad: int) -> Optional[int]:
+        """Sumar `cantidad` despachos al contador del día (YYYY-MM-DD); regresa el total o None sin contador"""
+        raise NotImplementedError
+
+    def actualizar_circuito(self, lote: str, datos: Dict):
+        """Publicar circuito_estado, circuito_tasa_fallos y circuito_reintento del worker del proceso"""
+        raise NotImplementedError
+
+    # ---------- Leases de workers ----------
+
+    def tomar_lease(self, lote: str, worker_id: str, segundos: int) -> bool:
+        """Tomar un proceso EJECUTANDO si está libre, su lease venció o ya es de este worker"""
+        raise NotImplementedError
+
+    def renovar_leases(self, worker_id: str, lotes: List[str], segundos: int) -> List[str]:
+        """Latido del worker: renovar sus leases; regresa los lotes que conserva"""
+        raise NotImplementedError
+
+    def liberar_lease(self, lote: str, worker_id: str):
+        """Soltar el lease de un lote (solo si es de este worker)"""
+        raise NotImplementedError
+
+    def obtener_estado_proceso(self, lote: str) -> str:
+        """Estado de control del proceso (DETENIDO si no existe)"""
+        proceso = self.obtener_proceso(lote)
+        return proceso['estado'] if proceso else "DETENIDO"
+
+    # ---------- Consultas express (una ICCID bajo demanda) ----------
+
+    def crear_consulta_express(self, iccid_completo: str, ultimos_13_digitos: str) -> Dict:
+        """Encolar una consulta express; regresa la fila creada (con id)"""
+        raise NotImplementedError
+
+    def obtener_consulta_express(self, consulta_id: int) -> Optional[Dict]:
+        raise NotImplementedError
+
+    def tomar_consulta_express(self, worker_id: str) -> Optional[Dict]:
+        """Tomar la consulta express más antigua sin atender (o abandonada por un worker caído)"""
+        raise NotImplementedError
+
+    def responder_consulta_express(self, consulta_id: int, estatus: str, numero_asignado: Optional[str],
+                                   observaciones: str):
+        raise NotImplementedError
+
+    # ---------- Bitácora de intentos ----------
+
+    def guardar_intentos(self, intentos: List[Dict]):
+        """Insertar filas en verificacion_intentos (solo se agregan, nunca se actualizan)"""
+        raise NotImplementedError
+
+    def mantener_intentos(self, retencion_dias: int):
+        """Preparar las particiones de los próximos días y borrar lo anterior a retencion_dias"""
+        raise NotImplementedError
+
+    # ---------- Configuración en caliente ----------
+
+    def leer_configuracion(self) -> Dict[str, str]:
+        """Claves guardadas en configuracion (clave -> valor); las ausentes usan su valor por defecto"""
+        raise NotImplementedError
+
+    def guardar_configuracion(self, valores: Dict[str, str]):
+        """Insertar o reemplazar claves de configuracion"""
+        raise NotImplementedError
+
+    def restaurar_configuracion(self):
+        """Borrar todas las claves: cada parámetro vuelve a su valor por defecto"""
+        raise NotImplementedError
+
+    # ---------- Estadísticas y lotes ----------
+
+    def estadisticas_lote(self, lote: str) -> Dict:
+        """Conteos por estatus de un lote: total, pendientes, activas, inactivas, errores"""
+        raise NotImplementedError
+
+    def resumen_lotes(self) -> List[Dict]:
+        """Conteos por lote y estatus: [{lote, estatus, total}, ...]"""
+        raise NotImplementedError
+
+    def catalogo_lotes(self) -> List[Dict]:
+        """
+        Catálogo de lotes ordenado por nombre:
+        [{lote, total, pendientes, activas, inactivas, errores, ultima_actividad}, ...]
+        """
+        raise NotImplementedError
+
+    def listar_lotes(self) -> List[str]:
+        """Nombres de lotes ordenados"""
+        return [c['lote'] for c in self.catalogo_lotes()]
+
+    def verificaciones_por_hora(self, desde: str, lote: Optional[str] = None) -> List[Dict]:
+        """Verificaciones por hora desde `desde` (ISO 8601): [{hora, lote, estatus, total}, ...]"""
+        raise NotImplementedError
+
+
+def _catalogo_desde_resumen(resumen: List[Dict]) -> List[Dict]:
+    """Armar el catálogo a partir de conteos [{lote, estatus, total}] (sin última actividad)"""
+    conteos: Dict[str, Dict[str, int]] = {}
+    for fila in resumen:
+        if fila['lote']:
+            conteos.setdefault(fila['lote'], {})[fila['estatus']] = fila['total']
+    return [
+        {"lote": lote, **_estadisticas_desde_conteos(conteos[lote]), "ultima_actividad": None}
+        for lote in sorted(conteos)
+    ]
+
+
+def _estadisticas_desde_conteos(conteos: Dict[str, int]) -> Dict:
+    """Convertir {estatus: n} al diccionario de estadísticas de lote"""
+    return {
+        "total": sum(conteos.values()),
+        "pendientes": conteos.get("PENDIENTE", 0),
+        "activas": conteos.get("ACTIVA", 0),
+        "inactivas": conteos.get("INACTIVA", 0),
+        "errores": conteos.get("ERROR", 0)
+    }
+
+
+class AlmacenamientoSupabase(AlmacenamientoBase):
+    """Almacenamiento en Supabase a través de PostgREST"""
+
+    def __init__(self, supabase_url: Optional[str] = None, supabase_key: Optional[str] = None,
+                 db_url: Optional[str] = None):
+        from postgrest.exceptions import APIError
+        from cliente_supabase import obtener_cliente
+        from postgres_directo import crear_postgres_directo
+
+        self._api_error = APIError
+        self.supabase = obtener_cliente(supabase_url, supabase_key)
+        self._rpc_resultados_disponible = True
+        self._columnas_rendimiento_disponibles = True
+        self._columnas_presupuesto_disponibles = True
+        self._rpc_consumo_disponible = True
+        self._columnas_circuito_disponibles = True
+        self._tabla_intentos_disponible = True
+        self._columnas_muestreo_disponibles = True
+
+        # Ruta masiva opcional (COPY / cursores); REST queda como respaldo
+        self.postgres = crear_postgres_directo(db_url)
+
+    def _es_rpc_inexistente(self, error) -> bool:
+        # PGRST202: la función no existe en el esquema
+        return isinstance(error, self._api_error) and error.code == "PGRST202"
+
+    def _es_tabla_inexistente(self, error) -> bool:
+        # PGRST205 / 42P01: la tabla no existe (sql/lotes.sql no aplicado)
+        return isinstance(error, self._api_error) and error.code in ("PGRST205", "42P01")
+
+    # ---------- ICCIDs ----------
+
+    def reclamar_pendientes(self, lote: str, limite: int, despues_de_id: int = 0) -> List[Dict]:
+        response = self.supabase.table("verificacion_iccids").select(
+            "id, iccid_completo, ultimos_13_digitos, intentos"
+        ).eq("lote", lote).eq("estatus", "PENDIENTE").gt("id", despues_de_id).order("id").limit(limite).execute()
+        return response.data or []
+
+    def contar_pendientes(self, lote: str) -> int:
+        response = self.supabase.table("verificacion_iccids").select(
+            "id", count="exact"
+        ).eq("lote", lote).eq("estatus", "PENDIENTE").limit(1).execute()
+        return response.count if response.count else 0
+
+    def muestrear_pendientes(self, lote: str, tamano: int, estratos: int) -> List[Dict]:
+        # RPC (sql/muestreo.sql): ntile por id y orden aleatorio dentro de cada estrato
+        response = self.supabase.rpc('muestra_estratificada_pendientes', {
+            "p_lote": lote, "p_tamano": tamano, "p_estratos": estratos
+        }).execute()
+        return response.data or []
+
+    def guardar_resultados(self, resultados: List[Dict]):
+        """
+        Usa la RPC aplicar_resultados_verificacion (un solo UPDATE para todo el lote)
+        y, si no está instalada, actualiza registro por registro
+        """
+        if self._rpc_resultados_disponible:
+            try:
+                self.supabase.rpc("aplicar_resultados_verificacion", {"p_resultados": resultados}).execute()
+                return
+            except Exception as e:
+                if not self._es_rpc_inexistente(e):
+                    raise
+                self._rpc_resultados_disponible = False
+
+        # `intentos` viene ya sumado por el verificador (la RPC y SQLite suman en la base de datos)
+        for fila in resultados:
+            datos = {k: v for k, v in fila.items() if k != "iccid_completo"}
+            self.supabase.table("verificacion_iccids").update(datos).eq(
+                "iccid_completo", fila["iccid_completo"]
+            ).execute()
+
+    def insertar_iccids(self, registros: List[Dict]) -> Tuple[int, int]:
+        if self.postgres:
+            try:
+                return self.postgres.cargar_iccids(registros)
+            except Exception as e:
+                logger.warning(f"⚠️ Carga por COPY falló, usando REST: {e}")
+
+        # Inserción en bloque; las ICCIDs que ya existen se ignoran y no se devuelven
+        response = self.supabase.table("verificacion_iccids").upsert(
+            registros, on_conflict="iccid_completo", ignore_duplicates=True
+        ).execute()
+        insertadas = len(response.data or [])
+        return insertadas, len(registros) - insertadas
+
+    def lote_existe(self, lote: str) -> bool:
+        response = self.supabase.table("verificacion_iccids").select("lote").eq(
+            "lote", lote
+        ).limit(1).execute()
+        return bool(response.data)
+
+    def eliminar_lote(self, lote: str):
+        self.supabase.table("verificacion_iccids").delete().eq("lote", lote).execute()
+        self.supabase.table("proceso_verificacion").delete().eq("lote", lote).execute()
+
+    def resetear_lote(self, lote: str, estatus: Optional[str] = None):
+        if self.postgres:
+            try:
+                self.postgres.resetear_lote(lote, estatus)
+                return
+            except Exception as e:
+                logger.warning(f"⚠️ Reseteo directo falló, usando REST: {e}")
+
+        query = self.supabase.table("verificacion_iccids").update({
+            "estatus": "PENDIENTE",
+            "numero_asignado": None,
+            "fecha_verificacion": None,
+            "observaciones": "Reseteado manualmente"
+        }).eq("lote", lote)
+
+        if estatus:
+            query = query.eq("estatus", estatus)
+
+        query.execute()
+
+    def iterar_registros(self, lote: Optional[str] = None, estatus: Optional[str] = None,
+                         columnas: Optional[List[str]] = None) -> Iterator[Dict]:
+        from consultas import COLUMNAS_RESULTADOS, iterar_registros
+
+        if self.postgres:
+            entregados = 0
+            try:
+                for fila in self.postgres.iterar_registros(lote, estatus, columnas or COLUMNAS_RESULTADOS):
+                    entregados += 1
+                    yield fila
+                return
+            except Exception as e:
+                # Solo se puede pasar a REST si aún no se entregó ninguna fila
+                if entregados:
+                    raise
+                logger.warning(f"⚠️ Cursor directo falló, usando REST: {e}")
+
+        yield from iterar_registros(self.supabase, lote=lote, estatus=estatus, columnas=columnas)
+
+    def pagina_registros(self, lote: Optional[str] = None, estatus: Optional[str] = None,
+                         fecha_desde: Optional[str] = None, fecha_hasta: Optional[str] = None,
+                         orden: str = "id", descendente: bool = False, despues_de=None,
+                         tamano: int = 100) -> List[Dict]:
+        from consultas import obtener_pagina
+        return obtener_pagina(self.supabase, lote, estatus, fecha_desde, fecha_hasta,
+                              orden=orden, descendente=descendente, despues_de=despues_de, tamano=tamano)
+
+    def contar_registros(self, lote: Optional[str] = None, estatus: Optional[str] = None,
+                         fecha_desde: Optional[str] = None, fecha_hasta: Optional[str] = None) -> int:
+        from consultas import contar_registros
+        return contar_registros(self.supabase, lote, estatus, fecha_desde, fecha_hasta)
+
+    # ---------- Procesos ----------
+
+    def obtener_proceso(self, lote: str) -> Optional[Dict]:
+        response = self.supabase.table("proceso_verificacion").select("*").eq("lote", lote).execute()
+        return response.data[0] if response.data else None
+
+    def listar_procesos(self, estados: Optional[List[str]] = None) -> List[Dict]:
+        query = self.supabase.table("proceso_verificacion").select("*")
+        if estados:
+            query = query.in_("estado", estados)
+        return query.execute().data or []
+
+    def inicializar_proceso(self, lote: str, total: int):
+        if self.obtener_proceso(lote):
+            self.supabase.table("proceso_verificacion").update({
+                "estado": "EJECUTANDO",
+                "progreso_total": total,
+                "fecha_actualizacion": datetime.now().isoformat()
+            }).eq("lote", lote).execute()
+        else:
+            self.supabase.table("proceso_verificacion").insert({
+                "lote": lote,
+                "estado": "EJECUTANDO",
+                "progreso_actual": 0,
+                "progreso_total": total,
+                "activas": 0,
+                "inactivas": 0,
+                "errores": 0
+            }).execute()
+
+    def iniciar_proceso(self, lote: str, total: int, muestreo: Optional[Dict] = None):
+        datos = {
+            "estado": "EJECUTANDO",
+            "progreso_actual": 0,
+            "progreso_total": total,
+            "activas": 0,
+            "inactivas": 0,
+            "errores": 0,
+            "fecha_inicio": datetime.now().isoformat(),
+            "fecha_actualizacion": datetime.now().isoformat()
+        }
+        if muestreo or self._columnas_muestreo_disponibles:
+            # Una corrida completa borra el modo muestra de la anterior
+            datos.update(muestreo or {"margen_objetivo": None, "poblacion_muestra": None})
+
+        if not self.obtener_proceso(lote):
+            # Se crea detenido y se arranca con el UPDATE: el worker nunca lo ve EJECUTANDO sin el modo
+            self.supabase.table("proceso_verificacion").insert({"lote": lote, "estado": "DETENIDO"}).execute()
+
+        try:
+            self.supabase.table("proceso_verificacion").update(datos).eq("lote", lote).execute()
+        except Exception as e:
+            # PGRST204: columna inexistente (sql/muestreo.sql no aplicado)
+            if not (isinstance(e, self._api_error) and e.code == "PGRST204"):
+                raise
+            self._columnas_muestreo_disponibles = False
+            if muestreo:
+                raise RuntimeError("El modo muestra requiere sql/muestreo.sql") from e
+            datos.pop("margen_objetivo")
+            datos.pop("poblacion_muestra")
+            self.supabase.table("proceso_verificacion").update(datos).eq("lote", lote).execute()
+
+    def actualizar_progreso(self, lote: str, progreso: int, activas: int, inactivas: int, errores: int,
+                            rendimiento: Optional[Dict] = None):
+        datos = {
+            "progreso_actual": progreso,
+            "activas": activas,
+            "inactivas": inactivas,
+            "errores": errores,
+            "fecha_actualizacion": datetime.now().isoformat()
+        }
+        if rendimiento and self._columnas_rendimiento_disponibles:
+            try:
+                self.supabase.table("proceso_verificacion").update({**datos, **rendimiento}).eq("lote", lote).execute()
+                return
+            except Exception as e:
+                # PGRST204: columna inexistente (sql/rendimiento.sql no aplicado)
+                if not (isinstance(e, self._api_error) and e.code == "PGRST204"):
+                    raise
+                self._columnas_rendimiento_disponibles = False
+
+        self.supabase.table("proceso_verificacion").update(datos).eq("lote", lote).execute()
+
+    def cambiar_estado_proceso(self, lote: str, estado: str):
+        self.supabase.table("proceso_verificacion").update({
+            "estado": estado,
+            "fecha_actualizacion": datetime.now().isoformat()
+        }).eq("lote", lote).execute()
+
+    def actualizar_planificacion(self, lote: str, prioridad: int, peso: int):
+        self.supabase.table("proceso_verificacion").update({
+            "prioridad": prioridad,
+            "peso": peso,
+            "fecha_actualizacion": datetime.now().isoformat()
+        }).eq("lote", lote).execute()
+
+    def actualizar_presupuesto(self, lote: str, datos: Dict):
+        if not self._columnas_presupuesto_disponibles:
+            return
+        try:
+            self.supabase.table("proceso_verificacion").update(datos).eq("lote", lote).execute()
+        except Exception as e:
+            # PGRST204: columna inexistente (sql/presupuesto.sql no aplicado)
+            if not (isinstance(e, self._api_error) and e.code == "PGRST204"):
+                raise
+            self._columnas_presupuesto_disponibles = False
+
+    def sumar_consumo_diario(self, dia: str, cantidad: int) -> Optional[int]:
+        if not self._rpc_consumo_disponible:
+            return None
+        try:
+            # RPC (sql/presupuesto.sql): un upsert que suma y regresa el total, sin carreras entre workers
+            response = self.supabase.rpc('sumar_consumo_presupuesto', {
+                "p_dia": dia, "p_cantidad": cantidad
+            }).execute()
+        except Exception as e:
+            if not self._es_rpc_inexistente(e):
+                raise
+            self._rpc_consumo_disponible = False
+            return None
+        return int(response.data or 0)
+
+    def actualizar_circuito(self, lote: str, datos: Dict):
+        if not self._columnas_circuito_disponibles:
+            return
+        try:
+            self.supabase.table("proceso_verificacion").update(datos).eq("lote", lote).execute()
+        except Exception as e:
+            # PGRST204: columna inexistente (sql/circuito.sql no aplicado)
+            if not (isinstance(e, self._api_error) and e.code == "PGRST204"):
+                raise
+            self._columnas_circuito_disponibles = False
+
+    def tomar_lease(self, lote: str, worker_id: str, segundos: int) -> bool:
+        # RPC (sql/leases.sql): un UPDATE condicional con el reloj del servidor
+        response = self.supabase.rpc('tomar_lease_proceso', {
+            "p_lote": lote, "p_worker": worker_id, "p_segundos": segundos
+        }).execute()
+        return bool(response.data)
+
+    def renovar_leases(self, worker_id: str, lotes: List[str], segundos: int) -> List[str]:
+        if not lotes:
+            return []
+        response = self.supabase.rpc('renovar_leases_proceso', {
+            "p_worker": worker_id, "p_lotes": lotes, "p_segundos": segundos
+        }).execute()
+        return [r['lote'] for r in response.data or []]
+
+    def liberar_lease(self, lote: str, worker_id: str):
+        self.supabase.rpc('liberar_lease_proceso', {"p_lote": lote, "p_worker": worker_id}).execute()
+
+    def obtener_estado_proceso(self, lote: str) -> str:
+        response = self.supabase.table("proceso_verificacion").select("estado").eq("lote", lote).execute()
+        return response.data[0]['estado'] if response.data else "DETENIDO"
+
+    # ---------- Consultas express ----------
+
+    def crear_consulta_express(self, iccid_completo: str, ultimos_13_digitos: str) -> Dict:
+        response = self.supabase.table("consultas_express").insert({
+            "iccid_completo": iccid_completo,
+            "ultimos_13_digitos": ultimos_13_digitos
+        }).execute()
+        return response.data[0]
+
+    def obtener_consulta_express(self, consulta_id: int) -> Optional[Dict]:
+        response = self.supabase.table("consultas_express").select("*").eq("id", consulta_id).execute()
+        return response.data[0] if response.data else None
+
+    def tomar_consulta_express(self, worker_id: str) -> Optional[Dict]:
+        # RPC (sql/consultas_express.sql): UPDATE con FOR UPDATE SKIP LOCKED
+        response = self.supabase.rpc('tomar_consulta_express', {
+            "p_worker": worker_id, "p_segundos": ABANDONO_CONSULTA_EXPRESS
+        }).execute()
+        return response.data[0] if response.data else None
+
+    def responder_consulta_express(self, consulta_id: int, estatus: str, numero_asignado: Optional[str],
+                                   observaciones: str):
+        self.supabase.table("consultas_express").update({
+            "estado": "LISTA",
+            "estatus": estatus,
+            "numero_asignado": numero_asignado,
+            "observaciones": observaciones,
+            "fecha_respuesta": datetime.now().isoformat()
+        }).eq("id", consulta_id).execute()
+
+    # ---------- Bitácora de intentos ----------
+
+    def guardar_intentos(self, intentos: List[Dict]):
+        if not self._tabla_intentos_disponible:
+            return
+        try:
+            self.supabase.table("verificacion_intentos").insert(intentos).execute()
+        except Exception as e:
+            if not self._es_tabla_inexistente(e):
+                raise
+            # sql/verificacion_intentos.sql no aplicado: la bitácora queda apagada
+            self._tabla_intentos_disponible = False
+
+    def mantener_intentos(self, retencion_dias: int):
+        if not self._tabla_intentos_disponible:
+            return
+        try:
+            self.supabase.rpc('mantener_particiones_intentos', {"p_retencion_dias": retencion_dias}).execute()
+        except Exception as e:
+            if not self._es_rpc_inexistente(e):
+                raise
+
+    # ---------- Configuración en caliente ----------
+
+    def leer_configuracion(self) -> Dict[str, str]:
+        try:
+            response = self.supabase.table("configuracion").select("clave, valor").execute()
+        except Exception as e:
+            if not self._es_tabla_inexistente(e):
+                raise
+            return {}  # sql/configuracion.sql no aplicado: todo con valores por defecto
+        return {r['clave']: r['valor'] for r in response.data or []}
+
+    def guardar_configuracion(self, valores: Dict[str, str]):
+        ahora = datetime.now().isoformat()
+        self.supabase.table("configuracion").upsert([
+            {"clave": clave, "valor": str(valor), "fecha_actualizacion": ahora}
+            for clave, valor in valores.items()
+        ], on_conflict="clave").execute()
+
+    def restaurar_configuracion(self):
+        # PostgREST exige un filtro en DELETE
+        self.supabase.table("configuracion").delete().neq("clave", "").execute()
+
+    # ---------- Estadísticas y lotes ----------
+
+    def estadisticas_lote(self, lote: str) -> Dict:
+        # Agregado del lado del servidor (sql/agregados.sql)
+        try:
+            response = self.supabase.rpc('get_estadisticas_lote', {"p_lote": lote}).execute()
+            return _estadisticas_desde_conteos({r['estatus']: r['total'] for r in response.data or []})
+        except Exception as e:
+            if not self._es_rpc_inexistente(e):
+                raise
+
+        # Fallback: un conteo por estatus si la RPC no existe
+        conteos = {}
+        for estatus in ESTATUS_ICCID:
+            response = self.supabase.table("verificacion_iccids").select(
+                "id", count="exact"
+            ).eq("lote", lote).eq("estatus", estatus).limit(1).execute()
+            conteos[estatus] = response.count or 0
+        return _estadisticas_desde_conteos(conteos)
+
+    def resumen_lotes(self) -> List[Dict]:
+        # Agregado del lado del servidor: unas cuantas filas en lugar de la tabla completa
+        try:
+            response = self.supabase.rpc('get_resumen_lotes').execute()
+            return response.data or []
+        except Exception as e:
+            if not self._es_rpc_inexistente(e):
+                raise
+
+        # Fallback: recorrer la tabla paginada y contar en Python si la RPC no existe
+        from consultas import iterar_registros
+        filas = iterar_registros(self.supabase, columnas=["lote", "estatus"])
+        conteos = Counter((r['lote'], r['estatus']) for r in filas)
+        return [{"lote": lote, "estatus": estatus, "total": total}
+                for (lote, estatus), total in conteos.items()]
+
+    def catalogo_lotes(self) -> List[Dict]:
+        # Tabla lotes mantenida por triggers (sql/lotes.sql): una fila por lote
+        try:
+            response = self.supabase.table("lotes").select(
+                "lote, total, pendientes, activas, inactivas, errores, ultima_actividad"
+            ).order("lote").execute()
+            return response.data or []
+        except Exception as e:
+            if not self._es_tabla_inexistente(e):
+                raise
+
+        # Fallback: agregados por lote y estatus
+        return _catalogo_desde_resumen(self.resumen_lotes())
+
+    def verificaciones_por_hora(self, desde: str, lote: Optional[str] = None) -> List[Dict]:
+        # Tabla mantenida por triggers (sql/verificaciones_por_hora.sql); no recorre verificacion_iccids
+        filas = []
+        inicio = 0
+        while True:
+            query = self.supabase.table("verificaciones_por_hora").select(
+                "hora, lote, estatus, total"
+            ).gte("hora", desde)
+            if lote and lote != "Todos":
+                query = query.eq("lote", lote)
+            response = query.order("hora").order("lote").order("estatus").range(
+                inicio, inicio + TAMANO_PAGINA_SERIE - 1
+            ).execute()
+            filas.extend(response.data or [])
+            if len(response.data or []) < TAMANO_PAGINA_SERIE:
+                return filas
+            inicio += TAMANO_PAGINA_SERIE
+
+
+class AlmacenamientoSQLite(AlmacenamientoBase):
+    """
+    Almacenamiento en un archivo SQLite local en modo WAL
+    Mismo esquema que Supabase; una sola conexión protegida por lock
+    """
+
+    def __init__(self, ruta: Optional[str] = None):
+        self.ruta = ruta or RUTA_SQLITE
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.ruta, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._crear_esquema()
+
+    def _crear_esquema(self):
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS verificacion_iccids (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                iccid_completo TEXT NOT NULL UNIQUE,
+                ultimos_13_digitos TEXT,
+                estatus TEXT DEFAULT 'PENDIENTE',
+                numero_asignado TEXT,
+                fecha_verificacion TEXT,
+                lote TEXT,
+                observaciones TEXT,
+                intentos INTEGER DEFAULT 0,
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+            );
+            CREATE INDEX IF NOT EXISTS idx_lote_estatus_id ON verificacion_iccids(lote, estatus, id);
+
+            CREATE TABLE IF NOT EXISTS proceso_verificacion (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                lote TEXT NOT NULL UNIQUE,
+                estado TEXT NOT NULL DEFAULT 'DETENIDO',
+                progreso_actual INTEGER DEFAULT 0,
+                progreso_total INTEGER DEFAULT 0,
+                activas INTEGER DEFAULT 0,
+                inactivas INTEGER DEFAULT 0,
+                errores INTEGER DEFAULT 0,
+                fecha_inicio TEXT DEFAULT CURRENT_TIMESTAMP,
+                fecha_actualizacion TEXT DEFAULT CURRENT_TIMESTAMP
+            );
+
+            CREATE TABLE IF NOT EXISTS consultas_express (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                iccid_completo TEXT NOT NULL,
+                ultimos_13_digitos TEXT NOT NULL,
+                estado TEXT NOT NULL DEFAULT 'PENDIENTE',
+                estatus TEXT,
+                numero_asignado TEXT,
+                observaciones TEXT,
+                worker_id TEXT,
+                fecha_solicitud TEXT DEFAULT CURRENT_TIMESTAMP,
+                fecha_toma TEXT,
+                fecha_respuesta TEXT
+            );
+
+            CREATE TABLE IF NOT EXISTS verificacion_intentos (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                iccid_id INTEGER NOT NULL,
+                lote TEXT,
+                worker_id TEXT,
+                intento INTEGER NOT NULL DEFAULT 1,
+                inicio TEXT NOT NULL,
+                fin_navegacion TEXT,
+                fin_llenado TEXT,
+                fin_deteccion TEXT,
+                estatus TEXT NOT NULL,
+                clase_error TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_verificacion_intentos_inicio ON verificacion_intentos(inicio);
+
+            CREATE TABLE IF NOT EXISTS configuracion (
+                clave TEXT PRIMARY KEY,
+                valor TEXT NOT NULL,
+                fecha_actualizacion TEXT DEFAULT CURRENT_TIMESTAMP
+            );
+
+            CREATE TABLE IF NOT EXISTS presupuesto_consumo (
+                dia TEXT PRIMARY KEY,
+                despachadas INTEGER NOT NULL DEFAULT 0,
+                fecha_actualizacion TEXT DEFAULT CURRENT_TIMESTAMP
+            );
+        """)
+        self._agregar_columnas("proceso_verificacion", {
+            "velocidad_1m": "REAL",
+            "velocidad_5m": "REAL",
+            "velocidad_15m": "REAL",
+            "eta_segundos": "INTEGER",
+            "prioridad": "INTEGER NOT NULL DEFAULT 0",
+            "peso": "INTEGER NOT NULL DEFAULT 1",
+            "worker_id": "TEXT",
+            "lease_expira": "TEXT",
+            "ultimo_latido": "TEXT",
+            "presupuesto_hoy": "INTEGER",
+            "fecha_estimada": "TEXT",
+            "circuito_estado": "TEXT",
+            "circuito_tasa_fallos": "REAL",
+            "circuito_reintento": "TEXT",
+            "margen_objetivo": "REAL",
+            "poblacion_muestra": "INTEGER",
+        })
+
+    def _agregar_columnas(self, tabla: str, columnas: Dict[str, str]):
+        """Agregar a una tabla existente las columnas que le falten (migración)"""
+        existentes = {fila['name'] for fila in self._conn.execute(f"PRAGMA table_info({tabla})")}
+        for nombre, tipo in columnas.items():
+            if nombre not in existentes:
+                self._conn.execute(f"ALTER TABLE {tabla} ADD COLUMN {nombre} {tipo}")
+
+    def _consultar(self, sql: str, parametros: tuple = ()) -> List[Dict]:
+        with self._lock:
+            return [dict(fila) for fila in self._conn.execute(sql, parametros).fetchall()]
+
+    def _ejecutar(self, sql: str, parametros: tuple = ()) -> int:
+        with self._lock:
+            return self._conn.execute(sql, parametros).rowcount
+
+    # ---------- ICCIDs ----------
+
+    def reclamar_pendientes(self, lote: str, limite: int, despues_de_id: int = 0) -> List[Dict]:
+        return self._consultar(
+            "SELECT id, iccid_completo, ultimos_13_digitos, intentos FROM verificacion_iccids "
+            "WHERE lote = ? AND estatus = 'PENDIENTE' AND id > ? ORDER BY id LIMIT ?",
+            (lote, despues_de_id, limite)
+        )
+
+    def muestrear_pendientes(self, lote: str, tamano: int, estratos: int) -> List[Dict]:
+        return self._consultar(
+            "SELECT id, iccid_completo, ultimos_13_digitos, intentos, estrato FROM ("
+            "  SELECT *, ROW_NUMBER() OVER (PARTITION BY estrato ORDER BY random()) AS turno FROM ("
+            "    SELECT id, iccid_completo, ultimos_13_digitos, intentos, NTILE(?) OVER (ORDER BY id) AS estrato "
+            "    FROM verificacion_iccids WHERE lote = ? AND estatus = 'PENDIENTE'"
+            "  )"
+            ") ORDER BY turno, estrato LIMIT ?",
+            (estratos, lote, tamano)
+        )
+
+    def contar_pendientes(self, lote: str) -> int:
+        return self._consultar(
+            "SELECT COUNT(*) AS n FROM verificacion_iccids WHERE lote = ? AND estatus = 'PENDIENTE'",
+            (lote,)
+        )[0]['n']
+
+    def guardar_resultados(self, resultados: List[Dict]):
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "UPDATE verificacion_iccids SET estatus = ?, numero_asignado = ?, fecha_verificacion = ?, "
+                    "observaciones = ?, intentos = COALESCE(intentos, 0) + 1, updated_at = ? WHERE iccid_completo = ?",
+                    [(r['estatus'], r['numero_asignado'], r['fecha_verificacion'], r['observaciones'],
+                      datetime.now().isoformat(), r['iccid_completo']) for r in resultados]
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def insertar_iccids(self, registros: List[Dict]) -> Tuple[int, int]:
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                antes = self._conn.total_changes
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO verificacion_iccids (iccid_completo, ultimos_13_digitos, lote, estatus) "
+                    "VALUES (?, ?, ?, ?)",
+                    [(r['iccid_completo'], r['ultimos_13_digitos'], r['lote'], r.get('estatus', 'PENDIENTE'))
+                     for r in registros]
+                )
+                insertadas = self._conn.total_changes - antes
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return insertadas, len(registros) - insertadas
+
+    def lote_existe(self, lote: str) -> bool:
+        return bool(self._consultar("SELECT 1 FROM verificacion_iccids WHERE lote = ? LIMIT 1", (lote,)))
+
+    def eliminar_lote(self, lote: str):
+        self._ejecutar("DELETE FROM verificacion_iccids WHERE lote = ?", (lote,))
+        self._ejecutar("DELETE FROM proceso_verificacion WHERE lote = ?", (lote,))
+
+    def resetear_lote(self, lote: str, estatus: Optional[str] = None):
+        sql = ("UPDATE verificacion_iccids SET estatus = 'PENDIENTE', numero_asignado = NULL, "
+               "fecha_verificacion = NULL, observaciones = 'Reseteado manualmente', updated_at = ? WHERE lote = ?")
+        parametros = (datetime.now().isoformat(), lote)
+        if estatus:
+            sql += " AND estatus = ?"
+            parametros += (estatus,)
+        self._ejecutar(sql, parametros)
+
+    def iterar_registros(self, lote: Optional[str] = None, estatus: Optional[str] = None,
+                         columnas: Optional[List[str]] = None) -> Iterator[Dict]:
+        from consultas import COLUMNAS_RESULTADOS, TAMANO_PAGINA
+
+        columnas = columnas or COLUMNAS_RESULTADOS
+        seleccion = ", ".join(["id"] + [c for c in columnas if c != "id"])
+        filtros, parametros = self._filtros(lote, estatus)
+
+        ultimo_id = 0
+        while True:
+            filas = self._consultar(
+                f"SELECT {seleccion} FROM verificacion_iccids WHERE id > ?{filtros} ORDER BY id LIMIT ?",
+                (ultimo_id,) + parametros + (TAMANO_PAGINA,)
+            )
+            if not filas:
+                break
+            yield from filas
+            ultimo_id = filas[-1]['id']
+
+    @staticmethod
+    def _filtros(lote: Optional[str] = None, estatus: Optional[str] = None,
+                 fecha_desde: Optional[str] = None, fecha_hasta: Optional[str] = None) -> Tuple[str, tuple]:
+        """Condiciones ' AND ...' y sus parámetros para los filtros de resultados"""
+        filtros = ""
+        parametros: tuple = ()
+        if lote and lote != "Todos":
+            filtros += " AND lote = ?"
+            parametros += (lote,)
+        if estatus and estatus != "Todos":
+            filtros += " AND estatus = ?"
+            parametros += (estatus,)
+        if fecha_desde:
+            filtros += " AND fecha_verificacion >= ?"
+            parametros += (fecha_desde,)
+        if fecha_hasta:
+            filtros += " AND fecha_verificacion < ?"
+            parametros += (fecha_hasta,)
+        return filtros, parametros
+
+    def pagina_registros(self, lote: Optional[str] = None, estatus: Optional[str] = None,
+                         fecha_desde: Optional[str] = None, fecha_hasta: Optional[str] = None,
+                         orden: str = "id", descendente: bool = False, despues_de=None,
+                         tamano: int = 100) -> List[Dict]:
+        from consultas import COLUMNAS_RESULTADOS, ORDENES_NAVEGACION
+
+        if orden not in ORDENES_NAVEGACION:
+            raise ValueError(f"Orden no soportado: {orden}")
+
+        seleccion = ", ".join(["id"] + COLUMNAS_RESULTADOS)
+        filtros, parametros = self._filtros(lote, estatus, fecha_desde, fecha_hasta)
+        if despues_de is not None:
+            filtros += f" AND {orden} {'<' if descendente else '>'} ?"
+            parametros += (despues_de,)
+
+        return self._consultar(
+            f"SELECT {seleccion} FROM verificacion_iccids WHERE 1 = 1{filtros} "
+            f"ORDER BY {orden} {'DESC' if descendente else 'ASC'} LIMIT ?",
+            parametros + (tamano,)
+        )
+
+    def contar_registros(self, lote: Optional[str] = None, estatus: Optional[str] = None,
+                         fecha_desde: Optional[str] = None, fecha_hasta: Optional[str] = None) -> int:
+        filtros, parametros = self._filtros(lote, estatus, fecha_desde, fecha_hasta)
+        filas = self._consultar(f"SELECT COUNT(*) AS n FROM verificacion_iccids WHERE 1 = 1{filtros}", parametros)
+        return filas[0]['n']
+
+    # ---------- Procesos ----------
+
+    def obtener_proceso(self, lote: str) -> Optional[Dict]:
+        filas = self._consultar("SELECT * FROM proceso_verificacion WHERE lote = ?", (lote,))
+        return filas[0] if filas else None
+
+    def listar_procesos(self, estados: Optional[List[str]] = None) -> List[Dict]:
+        if not estados:
+            return self._consultar("SELECT * FROM proceso_verificacion")
+        marcadores = ", ".join("?" for _ in estados)
+        return self._consultar(
+            f"SELECT * FROM proceso_verificacion WHERE estado IN ({marcadores})", tuple(estados)
+        )
+
+    def inicializar_proceso(self, lote: str, total: int):
+        ahora = datetime.now().isoformat()
+        self._ejecutar(
+            "INSERT INTO proceso_verificacion (lote, estado, progreso_total, fecha_inicio, fecha_actualizacion) "
+            "VALUES (?, 'EJECUTANDO', ?, ?, ?) "
+            "ON CONFLICT(lote) DO UPDATE SET estado = 'EJECUTANDO', progreso_total = excluded.progreso_total, "
+            "fecha_actualizacion = excluded.fecha_actualizacion",
+            (lote, total, ahora, ahora)
+        )
+
+    def iniciar_proceso(self, lote: str, total: int, muestreo: Optional[Dict] = None):
+        ahora = datetime.now().isoformat()
+        muestreo = muestreo or {}
+        self._ejecutar(
+            "INSERT INTO proceso_verificacion (lote, estado, progreso_total, fecha_inicio, fecha_actualizacion, "
+            "margen_objetivo, poblacion_muestra) VALUES (?, 'EJECUTANDO', ?, ?, ?, ?, ?) "
+            "ON CONFLICT(lote) DO UPDATE SET estado = 'EJECUTANDO', progreso_actual = 0, "
+            "progreso_total = excluded.progreso_total, activas = 0, inactivas = 0, errores = 0, "
+            "fecha_inicio = excluded.fecha_inicio, fecha_actualizacion = excluded.fecha_actualizacion, "
+            "margen_objetivo = excluded.margen_objetivo, poblacion_muestra = excluded.poblacion_muestra",
+            (lote, total, ahora, ahora, muestreo.get("margen_objetivo"), muestreo.get("poblacion_muestra"))
+        )
+
+    def actualizar_progreso(self, lote: str, progreso: int, activas: int, inactivas: int, errores: int,
+                            rendimiento: Optional[Dict] = None):
+        datos = {
+            "progreso_actual": progreso,
+            "activas": activas,
+            "inactivas": inactivas,
+            "errores": errores,
+            "fecha_actualizacion": datetime.now().isoformat(),
+            **(rendimiento or {})
+        }
+        asignaciones = ", ".join(f"{columna} = ?" for columna in datos)
+        self._ejecutar(
+            f"UPDATE proceso_verificacion SET {asignaciones} WHERE lote = ?",
+            tuple(datos.values()) + (lote,)
+        )
+
+    def cambiar_estado_proceso(self, lote: str, estado: str):
+        self._ejecutar(
+            "UPDATE proceso_verificacion SET estado = ?, fecha_actualizacion = ? WHERE lote = ?",
+            (estado, datetime.now().isoformat(), lote)
+        )
+
+    def actualizar_planificacion(self, lote: str, prioridad: int, peso: int):
+        self._ejecutar(
+            "UPDATE proceso_verificacion SET prioridad = ?, peso = ?, fecha_actualizacion = ? WHERE lote = ?",
+            (prioridad, peso, datetime.now().isoformat(), lote)
+        )
+
+    def _actualizar_columnas_proceso(self, lote: str, datos: Dict):
+        asignaciones = ", ".join(f"{columna} = ?" for columna in datos)
+        self._ejecutar(
+            f"UPDATE proceso_verificacion SET {asignaciones} WHERE lote = ?",
+            tuple(datos.values()) + (lote,)
+        )
+
+    def actualizar_presupuesto(self, lote: str, datos: Dict):
+        self._actualizar_columnas_proceso(lote, datos)
+
+    def sumar_consumo_diario(self, dia: str, cantidad: int) -> Optional[int]:
+        filas = self._consultar(
+            "INSERT INTO presupuesto_consumo (dia, despachadas) VALUES (?, ?) ON CONFLICT(dia) DO UPDATE SET "
+            "despachadas = despachadas + excluded.despachadas, fecha_actualizacion = CURRENT_TIMESTAMP "
+            "RETURNING despachadas",
+            (dia, cantidad)
+        )
+        return filas[0]['despachadas']
+
+    def actualizar_circuito(self, lote: str, datos: Dict):
+        self._actualizar_columnas_proceso(lote, datos)
+
+    # Los leases usan datetime('now') de SQLite (UTC), igual que NOW() en Supabase
+
+    def tomar_lease(self, lote: str, worker_id: str, segundos: int) -> bool:
+        return self._ejecutar(
+            "UPDATE proceso_verificacion SET worker_id = ?, lease_expira = datetime('now', ?), "
+            "ultimo_latido = datetime('now') "
+            "WHERE lote = ? AND estado = 'EJECUTANDO' AND (worker_id IS NULL OR worker_id = ? "
+            "OR lease_expira IS NULL OR lease_expira < datetime('now'))",
+            (worker_id, f"+{segundos} seconds", lote, worker_id)
+        ) > 0
+
+    def renovar_leases(self, worker_id: str, lotes: List[str], segundos: int) -> List[str]:
+        if not lotes:
+            return []
+        marcadores = ", ".join("?" for _ in lotes)
+        with self._lock:
+            self._conn.execute(
+                "UPDATE proceso_verificacion SET lease_expira = datetime('now', ?), ultimo_latido = datetime('now') "
+                f"WHERE lote IN ({marcadores}) AND worker_id = ? AND estado IN ('EJECUTANDO', 'PAUSADO')",
+                (f"+{segundos} seconds", *lotes, worker_id)
+            )
+            filas = self._conn.execute(
+                f"SELECT lote FROM proceso_verificacion WHERE lote IN ({marcadores}) AND worker_id = ? "
+                "AND estado IN ('EJECUTANDO', 'PAUSADO')",
+                (*lotes, worker_id)
+            ).fetchall()
+        return [f['lote'] for f in filas]
+
+    def liberar_lease(self, lote: str, worker_id: str):
+        self._ejecutar(
+            "UPDATE proceso_verificacion SET worker_id = NULL, lease_expira = NULL WHERE lote = ? AND worker_id = ?",
+            (lote, worker_id)
+        )
+
+    # ---------- Consultas express ----------
+
+    def crear_consulta_express(self, iccid_completo: str, ultimos_13_digitos: str) -> Dict:
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO consultas_express (iccid_completo, ultimos_13_digitos) VALUES (?, ?)",
+                (iccid_completo, ultimos_13_digitos)
+            )
+            fila = self._conn.execute("SELECT * FROM consultas_express WHERE id = ?", (cursor.lastrowid,)).fetchone()
+        return dict(fila)
+
+    def obtener_consulta_express(self, consulta_id: int) -> Optional[Dict]:
+        filas = self._consultar("SELECT * FROM consultas_express WHERE id = ?", (consulta_id,))
+        return filas[0] if filas else None
+
+    def tomar_consulta_express(self, worker_id: str) -> Optional[Dict]:
+        filas = self._consultar(
+            "UPDATE consultas_express SET estado = 'EN_PROCESO', worker_id = ?, fecha_toma = datetime('now') "
+            "WHERE id = (SELECT id FROM consultas_express WHERE estado = 'PENDIENTE' "
+            "OR (estado = 'EN_PROCESO' AND fecha_toma < datetime('now', ?)) ORDER BY id LIMIT 1) "
+            "RETURNING *",
+            (worker_id, f"-{ABANDONO_CONSULTA_EXPRESS} seconds")
+        )
+        return filas[0] if filas else None
+
+    def responder_consulta_express(self, consulta_id: int, estatus: str, numero_asignado: Optional[str],
+                                   observaciones: str):
+        self._ejecutar(
+            "UPDATE consultas_express SET estado = 'LISTA', estatus = ?, numero_asignado = ?, observaciones = ?, "
+            "fecha_respuesta = datetime('now') WHERE id = ?",
+            (estatus, numero_asignado, observaciones, consulta_id)
+        )
+
+    # ---------- Bitácora de intentos ----------
+
+    def guardar_intentos(self, intentos: List[Dict]):
+        columnas = list(intentos[0])
+        with self._lock:
+            self._conn.executemany(
+                f"INSERT INTO verificacion_intentos ({', '.join(columnas)}) "
+                f"VALUES ({', '.join('?' for _ in columnas)})",
+                [tuple(fila[c] for c in columnas) for fila in intentos]
+            )
+
+    def mantener_intentos(self, retencion_dias: int):
+        # Sin particiones: un DELETE por fecha sobre el índice de inicio
+        self._ejecutar("DELETE FROM verificacion_intentos WHERE inicio < date('now', ?)", (f"-{retencion_dias} days",))
+
+    # ---------- Configuración en caliente ----------
+
+    def leer_configuracion(self) -> Dict[str, str]:
+        return {f['clave']: f['valor'] for f in self._consultar("SELECT clave, valor FROM configuracion")}
+
+    def guardar_configuracion(self, valores: Dict[str, str]):
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO configuracion (clave, valor) VALUES (?, ?) ON CONFLICT(clave) DO UPDATE SET "
+                "valor = excluded.valor, fecha_actualizacion = CURRENT_TIMESTAMP",
+                [(clave, str(valor)) for clave, valor in valores.items()]
+            )
+
+    def restaurar_configuracion(self):
+        self._ejecutar("DELETE FROM configuracion")
+
+    # ---------- Estadísticas y lotes ----------
+
+    def estadisticas_lote(self, lote: str) -> Dict:
+        filas = self._consultar(
+            "SELECT estatus, COUNT(*) AS n FROM verificacion_iccids WHERE lote = ? GROUP BY estatus", (lote,)
+        )
+        return _estadisticas_desde_conteos({f['estatus']: f['n'] for f in filas})
+
+    def resumen_lotes(self) -> List[Dict]:
+        return self._consultar(
+            "SELECT lote, estatus, COUNT(*) AS total FROM verificacion_iccids GROUP BY lote, estatus"
+        )
+
+    def catalogo_lotes(self) -> List[Dict]:
+        return self._consultar("""
+            SELECT lote,
+                   COUNT(*) AS total,
+                   SUM(estatus = 'PENDIENTE') AS pendientes,
+                   SUM(estatus = 'ACTIVA') AS activas,
+                   SUM(estatus = 'INACTIVA') AS inactivas,
+                   SUM(estatus = 'ERROR') AS errores,
+                   MAX(updated_at) AS ultima_actividad
+            FROM verificacion_iccids
+            WHERE lote IS NOT NULL
+            GROUP BY lote
+            ORDER BY lote
+        """)
+
+    def verificaciones_por_hora(self, desde: str, lote: Optional[str] = None) -> List[Dict]:
+        filtros, parametros = self._filtros(lote, fecha_desde=desde)
+        return self._consultar(
+            "SELECT strftime('%Y-%m-%dT%H:00:00', fecha_verificacion) AS hora, lote, estatus, COUNT(*) AS total "
+            f"FROM verificacion_iccids WHERE fecha_verificacion IS NOT NULL{filtros} "
+            "GROUP BY hora, lote, estatus ORDER BY hora, lote, estatus",
+            parametros
+        )
+
+
+_instancias_sqlite: Dict[str, AlmacenamientoSQLite] = {}
+_lock_instancias = threading.Lock()
+
+
+def crear_almacenamiento(supabase_url: Optional[str] = None, supabase_key: Optional[str] = None,
+                         db_url: Optional[str] = None) -> AlmacenamientoBase:
+    """Crear el backend configurado en ALMACENAMIENTO (por defecto supabase)"""
+    tipo = os.getenv("ALMACENAMIENTO", "supabase").lower()
+
+    if tipo == "sqlite":
+        # Una sola conexión por archivo y proceso
+        with _lock_instancias:
+            if RUTA_SQLITE not in _instancias_sqlite:
+                _instancias_sqlite[RUTA_SQLITE] = AlmacenamientoSQLite(RUTA_SQLITE)
+            return _instancias_sqlite[RUTA_SQLITE]
+    if tipo == "supabase":
+        return AlmacenamientoSupabase(supabase_url, supabase_key, db_url)
+
+    raise ValueError(f"Backend de almacenamiento no soportado: {tipo}")
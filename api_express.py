@@ -0,0 +1,91 @@
+#!/usr/bin/env python3.11
+"""
+API local de consultas express
+
+    POST /consultas        {"iccid": "8952140063719050976F"}
+        Encola la consulta y espera la respuesta del worker (hasta ESPERA_RESPUESTA s).
+        Con {"esperar": false} regresa de inmediato con el id (202).
+    GET  /consultas/<id>   Estado y resultado de una consulta
+
+Escucha en API_EXPRESS_HOST:API_EXPRESS_PUERTO (127.0.0.1:8502 por defecto) y
+usa el mismo almacenamiento que el worker (SUPABASE_URL / SUPABASE_SERVICE_KEY
+o ALMACENAMIENTO=sqlite).
+"""
+
+import json
+import logging
+import os
+import re
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from almacenamiento import crear_almacenamiento
+from consulta_express import esperar_respuesta, solicitar
+from registro import configurar_registro
+
+configurar_registro('/tmp/api_express.log')
+logger = logging.getLogger(__name__)
+
+HOST = os.getenv("API_EXPRESS_HOST", "127.0.0.1")
+PUERTO = int(os.getenv("API_EXPRESS_PUERTO", "8502"))
+
+almacenamiento = crear_almacenamiento(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_SERVICE_KEY"))
+
+
+class ManejadorExpress(BaseHTTPRequestHandler):
+    """Rutas /consultas de la API express"""
+
+    def _responder(self, codigo: int, cuerpo: dict):
+        datos = json.dumps(cuerpo, default=str).encode("utf-8")
+        self.send_response(codigo)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(datos)))
+        self.end_headers()
+        self.wfile.write(datos)
+
+    def do_POST(self):
+        if self.path.rstrip("/") != "/consultas":
+            self._responder(404, {"error": "Ruta no encontrada"})
+            return
+        try:
+            longitud = int(self.headers.get("Content-Length", 0))
+            cuerpo = json.loads(self.rfile.read(longitud) or b"{}")
+            if not isinstance(cuerpo, dict):
+                raise ValueError("El cuerpo debe ser un objeto JSON")
+            consulta = solicitar(almacenamiento, str(cuerpo.get("iccid", "")))
+        except (ValueError, json.JSONDecodeError) as e:
+            self._responder(400, {"error": str(e)})
+            return
+
+        if cuerpo.get("esperar", True) is False:
+            self._responder(202, consulta)
+            return
+
+        consulta = esperar_respuesta(almacenamiento, consulta['id'])
+        if consulta is None:
+            self._responder(404, {"error": "Consulta no encontrada"})
+            return
+        # 504 si ningún worker respondió a tiempo (la consulta sigue en cola)
+        self._responder(200 if consulta['estado'] == "LISTA" else 504, consulta)
+
+    def do_GET(self):
+        coincidencia = re.fullmatch(r"/consultas/(\d+)/?", self.path)
+        if not coincidencia:
+            self._responder(404, {"error": "Ruta no encontrada"})
+            return
+        consulta = almacenamiento.obtener_consulta_express(int(coincidencia.group(1)))
+        if consulta is None:
+            self._responder(404, {"error": "Consulta no encontrada"})
+            return
+        self._responder(200, consulta)
+
+    def log_message(self, formato, *args):
+        logger.info(formato % args)
+
+
+if __name__ == "__main__":
+    servidor = ThreadingHTTPServer((HOST, PUERTO), ManejadorExpress)
+    logger.info(f"⚡ API express escuchando en http://{HOST}:{PUERTO}")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("⏹️ API express detenida")
@@ -6,10 +6,17 @@ Aplicación Streamlit para gestionar verificaciones de hasta 500,000 ICCIDs
 import streamlit as st
 import pandas as pd
 import os
-from datetime import datetime
-from io import BytesIO
-from supabase import create_client, Client
+from datetime import datetime, timedelta, timezone
+from cliente_supabase import obtener_metricas
+from rendimiento import formatear_duracion
+from almacenamiento import AlmacenamientoSupabase, crear_almacenamiento
 from verificador_motor import VerificadorICCID
+from consulta_express import ESPERA_RESPUESTA, esperar_respuesta, solicitar
+from configuracion import CONFIGURACION_TTL, PARAMETROS, convertir, valores_por_defecto
+from estimacion import MARGENES_MUESTREO, estimar, tamano_muestra
+from consultas import COLUMNAS_RESULTADOS, ORDENES_NAVEGACION, listar_consumidores_exportacion
+from exportador import (FORMATOS_EXPORTACION, confirmar_exportacion_delta, exportar_a_archivo,
+                        exportar_copy_a_archivo, exportar_delta)
 import time
 
 # Configuración de página
@@ -20,19 +27,125 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# Inicializar Supabase
-@st.cache_resource
-def init_supabase():
+# Obtener credenciales de Supabase
+def obtener_credenciales():
     # Intentar cargar desde Streamlit secrets primero, luego desde variables de entorno
     try:
-        url = st.secrets["SUPABASE_URL"]
-        key = st.secrets["SUPABASE_SERVICE_KEY"]
+        return st.secrets["SUPABASE_URL"], st.secrets["SUPABASE_SERVICE_KEY"]
+    except:
+        return os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_SERVICE_KEY")
+
+# Cadena de conexión directa a Postgres (opcional, para COPY en cargas y exportaciones)
+def obtener_dsn_directo():
+    try:
+        return st.secrets["SUPABASE_DB_URL"]
     except:
-        url = os.getenv("SUPABASE_URL")
-        key = os.getenv("SUPABASE_SERVICE_KEY")
-    return create_client(url, key)
+        return os.getenv("SUPABASE_DB_URL")
+
+# Inicializar almacenamiento (Supabase o SQLite local según ALMACENAMIENTO)
+@st.cache_resource
+def init_almacenamiento():
+    url, key = obtener_credenciales()
+    return crear_almacenamiento(url, key, obtener_dsn_directo())
+
+almacenamiento = init_almacenamiento()
+
+# Cliente de Supabase para las funciones que solo existen ahí (consultas, exportación, duplicados)
+supabase = almacenamiento.supabase if isinstance(almacenamiento, AlmacenamientoSupabase) else None
+
+# Catálogo de lotes en caché: cada rerun de Streamlit (cualquier clic) no vuelve a
+# consultar la base de datos; se invalida explícitamente al cargar, resetear o eliminar.
+# Todas las páginas (dashboard, selectores de lote, estadísticas) salen de aquí.
+TTL_AGREGADOS = 60
+
+@st.cache_data(ttl=TTL_AGREGADOS, show_spinner=False)
+def cargar_catalogo_lotes():
+    return almacenamiento.catalogo_lotes()
+
+def cargar_lotes():
+    return [c['lote'] for c in cargar_catalogo_lotes()]
+
+def cargar_estadisticas_lote(lote):
+    for c in cargar_catalogo_lotes():
+        if c['lote'] == lote:
+            return c
+    return {"lote": lote, "total": 0, "pendientes": 0, "activas": 0, "inactivas": 0, "errores": 0,
+            "ultima_actividad": None}
 
-supabase = init_supabase()
+# Niveles de prioridad del planificador del worker (mayor = se atiende antes)
+NIVELES_PRIORIDAD = {0: "Normal", 1: "Alta", 2: "Urgente"}
+
+# Una sola lectura de proceso_verificacion por intervalo, compartida por todas
+# las pestañas abiertas que muestran el panel de progreso
+INTERVALO_PANEL = 5
+
+@st.cache_data(ttl=INTERVALO_PANEL, show_spinner=False)
+def cargar_procesos_activos():
+    return almacenamiento.listar_procesos(["EJECUTANDO", "PAUSADO"])
+
+# Procesos terminados en modo muestra, con su estimación guardada
+@st.cache_data(ttl=TTL_AGREGADOS, show_spinner=False)
+def cargar_muestreos_terminados():
+    return [
+        p for p in almacenamiento.listar_procesos(["COMPLETADO", "DETENIDO", "INCOMPLETO"])
+        if p.get('margen_objetivo')
+    ]
+
+def mostrar_estimacion(proceso):
+    """Proporciones estimadas de un proceso en modo muestra, con su intervalo al 95%"""
+    estimacion = estimar(proceso['activas'], proceso['inactivas'], proceso.get('poblacion_muestra'))
+    if not estimacion['n']:
+        st.caption("🎲 Modo muestra: sin resultados todavía")
+        return
+    col_act, col_inact, col_margen = st.columns(3)
+    for columna, titulo, clave in ((col_act, "🎲 Activas (estimado)", 'activas'),
+                                   (col_inact, "🎲 Inactivas (estimado)", 'inactivas')):
+        proporcion, bajo, alto = estimacion[clave]
+        with columna:
+            st.metric(titulo, f"{proporcion:.1%}", delta=f"IC 95%: {bajo:.1%} - {alto:.1%}", delta_color="off")
+    with col_margen:
+        objetivo = float(proceso['margen_objetivo'])
+        st.metric("📏 Margen", f"±{estimacion['margen']:.1%}",
+                  delta=f"objetivo ±{objetivo:.1%}" + (" ✓" if estimacion['margen'] <= objetivo else ""),
+                  delta_color="off")
+    if proceso.get('poblacion_muestra'):
+        st.caption(f"Muestra de {estimacion['n']:,} ICCIDs con resultado de "
+                   f"{proceso['poblacion_muestra']:,} pendientes (los ERROR no cuentan)")
+
+# Navegador de resultados: total y página en caché por filtros, para que los
+# reruns de otros widgets de la página no repitan las consultas
+@st.cache_data(ttl=TTL_AGREGADOS, show_spinner=False)
+def cargar_total_registros(lote, estatus, fecha_desde, fecha_hasta):
+    if not fecha_desde and not fecha_hasta:
+        # Sin rango de fechas el total sale del catálogo, sin contar filas
+        catalogo = [c for c in cargar_catalogo_lotes() if lote == "Todos" or c['lote'] == lote]
+        columna = {"Todos": "total", "PENDIENTE": "pendientes", "ACTIVA": "activas",
+                   "INACTIVA": "inactivas", "ERROR": "errores"}[estatus]
+        return int(sum(c[columna] for c in catalogo))
+    return almacenamiento.contar_registros(lote, estatus, fecha_desde, fecha_hasta)
+
+@st.cache_data(ttl=30, show_spinner=False)
+def cargar_pagina_registros(lote, estatus, fecha_desde, fecha_hasta, orden, descendente, despues_de, tamano):
+    return almacenamiento.pagina_registros(lote, estatus, fecha_desde, fecha_hasta, orden=orden,
+                                           descendente=descendente, despues_de=despues_de, tamano=tamano)
+
+# Serie por hora (tabla de rollup; no recorre verificacion_iccids)
+@st.cache_data(ttl=TTL_AGREGADOS, show_spinner=False)
+def cargar_verificaciones_por_hora(desde, lote):
+    return almacenamiento.verificaciones_por_hora(desde, lote)
+
+# Velocidad real más reciente publicada por el worker (ICCIDs/min, ventana de 15 min)
+@st.cache_data(ttl=TTL_AGREGADOS, show_spinner=False)
+def cargar_velocidad_medida():
+    medidos = [p for p in almacenamiento.listar_procesos() if p.get('velocidad_15m')]
+    if not medidos:
+        return None
+    return float(max(medidos, key=lambda p: str(p['fecha_actualizacion']))['velocidad_15m'])
+
+def invalidar_agregados():
+    cargar_catalogo_lotes.clear()
+    cargar_total_registros.clear()
+    cargar_pagina_registros.clear()
 
 # Estilos CSS personalizados
 st.markdown("""
@@ -84,42 +197,59 @@ with st.sidebar:
     
     menu_option = st.radio(
         "Selecciona una opción:",
-        ["🏠 Dashboard", "📤 Cargar Lote", "▶️ Verificar ICCIDs", 
+        ["🏠 Dashboard", "⚡ Consulta Express", "📤 Cargar Lote", "▶️ Verificar ICCIDs", 
          "📊 Consultar Resultados", "⚙️ Configuración"]
     )
     
     st.divider()
-    st.info("**Capacidad:** 30,000 ICCIDs/día\n\n**Velocidad:** 3 seg/ICCID")
+    try:
+        velocidad_medida = cargar_velocidad_medida()
+    except Exception:
+        velocidad_medida = None
+    if velocidad_medida:
+        st.info(f"**Capacidad:** {velocidad_medida * 1440:,.0f} ICCIDs/día\n\n"
+                f"**Velocidad:** {velocidad_medida:.1f} ICCIDs/min (últimos 15 min)")
+    else:
+        st.info("**Velocidad:** sin medición todavía")
 
 # ==================== DASHBOARD ====================
 if menu_option == "🏠 Dashboard":
     st.header("📊 Panel de Control General")
     
+    if st.button("🔄 Actualizar datos"):
+        invalidar_agregados()
+    st.caption(f"Los conteos se actualizan cada {TTL_AGREGADOS} segundos")
+    
     # Obtener estadísticas generales
     try:
-        response = supabase.table("verificacion_iccids").select("estatus, lote").execute()
-        registros = response.data
+        catalogo = cargar_catalogo_lotes()
         
-        if registros:
-            df = pd.DataFrame(registros)
+        if catalogo:
+            df = pd.DataFrame(catalogo)
+            por_estatus = pd.Series({
+                'ACTIVA': df['activas'].sum(),
+                'INACTIVA': df['inactivas'].sum(),
+                'PENDIENTE': df['pendientes'].sum(),
+                'ERROR': df['errores'].sum()
+            })
             
             # Métricas principales
             col1, col2, col3, col4 = st.columns(4)
             
             with col1:
-                total = len(df)
+                total = int(df['total'].sum())
                 st.metric("📱 Total ICCIDs", f"{total:,}")
             
             with col2:
-                activas = len(df[df['estatus'] == 'ACTIVA'])
+                activas = int(por_estatus.get('ACTIVA', 0))
                 st.metric("✅ Activas", f"{activas:,}", delta=f"{(activas/total*100):.1f}%")
             
             with col3:
-                inactivas = len(df[df['estatus'] == 'INACTIVA'])
+                inactivas = int(por_estatus.get('INACTIVA', 0))
                 st.metric("⭕ Inactivas", f"{inactivas:,}", delta=f"{(inactivas/total*100):.1f}%")
             
             with col4:
-                pendientes = len(df[df['estatus'] == 'PENDIENTE'])
+                pendientes = int(por_estatus.get('PENDIENTE', 0))
                 st.metric("⏳ Pendientes", f"{pendientes:,}", delta=f"{(pendientes/total*100):.1f}%")
             
             st.divider()
@@ -129,19 +259,47 @@ if menu_option == "🏠 Dashboard":
             
             with col1:
                 st.subheader("📈 Distribución por Estado")
-                status_counts = df['estatus'].value_counts()
-                st.bar_chart(status_counts)
+                st.bar_chart(por_estatus)
             
             with col2:
                 st.subheader("📦 ICCIDs por Lote")
-                lote_counts = df['lote'].value_counts().head(10)
+                lote_counts = df.set_index('lote')['total'].sort_values(ascending=False).head(10)
                 st.bar_chart(lote_counts)
             
             # Tabla de lotes
             st.divider()
             st.subheader("📋 Resumen por Lotes")
-            lotes_stats = df.groupby('lote')['estatus'].value_counts().unstack(fill_value=0)
-            st.dataframe(lotes_stats, use_container_width=True)
+            st.dataframe(df.set_index('lote'), use_container_width=True)
+            
+            # Serie de tiempo por hora (para detectar ventanas de throttling del portal)
+            st.divider()
+            st.subheader("🕐 Verificaciones por Hora")
+            
+            col_periodo, col_lote_serie = st.columns(2)
+            with col_periodo:
+                horas_serie = st.selectbox("Periodo", [24, 48, 168], format_func=lambda h: f"Últimas {h} horas")
+            with col_lote_serie:
+                lote_serie = st.selectbox("Lote", ["Todos"] + df['lote'].tolist(), key="lote_serie")
+            
+            # Desde el inicio de la hora (UTC) para que la caché se reutilice dentro de la hora
+            hora_actual = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+            desde_serie = (hora_actual - timedelta(hours=horas_serie)).strftime('%Y-%m-%dT%H:%M:%S')
+            
+            try:
+                serie = cargar_verificaciones_por_hora(desde_serie, lote_serie)
+                if serie:
+                    df_serie = pd.DataFrame(serie)
+                    df_serie['hora'] = pd.to_datetime(df_serie['hora'], utc=True, format='ISO8601')
+                    por_hora = df_serie.pivot_table(index='hora', columns='estatus', values='total',
+                                                    aggfunc='sum', fill_value=0)
+                    # Horas sin verificaciones en cero, para que los huecos se vean en la gráfica
+                    horas_completas = pd.date_range(por_hora.index.min(), hora_actual, freq='h')
+                    por_hora = por_hora.reindex(horas_completas, fill_value=0)
+                    st.bar_chart(por_hora)
+                else:
+                    st.info("📭 Sin verificaciones en el periodo seleccionado")
+            except Exception as e:
+                st.warning(f"⚠️ Serie por hora no disponible (¿se aplicó sql/verificaciones_por_hora.sql?): {e}")
             
         else:
             st.info("📭 No hay datos disponibles. Comienza cargando un lote de ICCIDs.")
@@ -149,6 +307,39 @@ if menu_option == "🏠 Dashboard":
     except Exception as e:
         st.error(f"❌ Error al cargar datos: {e}")
 
+# ==================== CONSULTA EXPRESS ====================
+elif menu_option == "⚡ Consulta Express":
+    st.header("⚡ Consulta Express")
+    st.write("Verifica una sola ICCID al momento, sin crear un lote. "
+             "La atiende el worker en marcha antes que el trabajo por lotes.")
+    
+    with st.form("form_consulta_express"):
+        iccid_express = st.text_input("ICCID", placeholder="8952140063719050976F")
+        enviar_express = st.form_submit_button("🔍 Verificar ahora", type="primary")
+    
+    if enviar_express:
+        try:
+            consulta = solicitar(almacenamiento, iccid_express)
+        except ValueError as e:
+            st.error(f"❌ {e}")
+            st.stop()
+        
+        with st.spinner(f"Verificando {consulta['iccid_completo']} en el portal..."):
+            consulta = esperar_respuesta(almacenamiento, consulta['id'])
+        
+        if consulta['estado'] != "LISTA":
+            st.warning(f"⏳ Ningún worker respondió en {ESPERA_RESPUESTA} segundos. "
+                       f"La consulta #{consulta['id']} sigue en cola; revisa que el worker daemon esté corriendo.")
+        elif consulta['estatus'] == "ACTIVA":
+            st.success(f"✅ ACTIVA - Número asignado: {consulta.get('numero_asignado') or 'N/A'}")
+        elif consulta['estatus'] == "INACTIVA":
+            st.info("⭕ INACTIVA")
+        else:
+            st.error(f"❌ ERROR - {consulta.get('observaciones') or ''}")
+        
+        if consulta['estado'] == "LISTA" and consulta.get('observaciones'):
+            st.caption(consulta['observaciones'])
+
 # ==================== CARGAR LOTE ====================
 elif menu_option == "📤 Cargar Lote":
     st.header("📤 Cargar Nuevo Lote de ICCIDs")
@@ -197,11 +388,7 @@ elif menu_option == "📤 Cargar Lote":
                             st.warning(f"⚠️ Se encontraron {duplicados_en_archivo} ICCIDs duplicadas en el archivo")
                         
                         # Verificar si el lote ya existe en la base de datos
-                        response_lote = supabase.table("verificacion_iccids").select("lote").eq(
-                            "lote", nombre_lote
-                        ).limit(1).execute()
-                        
-                        if response_lote.data:
+                        if almacenamiento.lote_existe(nombre_lote):
                             st.warning(f"⚠️ El lote '{nombre_lote}' ya existe en la base de datos")
                             accion_duplicados = st.radio(
                                 "¿Qué deseas hacer?",
@@ -214,19 +401,12 @@ elif menu_option == "📤 Cargar Lote":
                                 st.stop()
                             elif accion_duplicados == "Sobrescribir lote completo":
                                 # Eliminar lote existente
-                                supabase.table("verificacion_iccids").delete().eq(
-                                    "lote", nombre_lote
-                                ).execute()
+                                almacenamiento.eliminar_lote(nombre_lote)
+                                invalidar_agregados()
                                 st.info(f"🗑️ Lote '{nombre_lote}' eliminado. Procediendo con la carga...")
                         
                         # Procesar ICCIDs
-                        try:
-                            supabase_url = st.secrets["SUPABASE_URL"]
-                            supabase_key = st.secrets["SUPABASE_SERVICE_KEY"]
-                        except:
-                            supabase_url = os.getenv("SUPABASE_URL")
-                            supabase_key = os.getenv("SUPABASE_SERVICE_KEY")
-                        verificador = VerificadorICCID(supabase_url, supabase_key)
+                        verificador = VerificadorICCID(almacenamiento=almacenamiento)
                         registros_insertados = 0
                         registros_duplicados = 0
                         
@@ -234,32 +414,33 @@ elif menu_option == "📤 Cargar Lote":
                         status_text = st.empty()
                         
                         total_iccids = len(df)
+                        # Con conexión directa cada bloque va en un solo COPY
+                        tamano_bloque_carga = 50000 if almacenamiento.postgres else 500
                         
-                        for idx, row in df.iterrows():
-                            iccid_completo = str(row['ICCID']).strip()
-                            ultimos_13 = verificador.extraer_ultimos_13_digitos(iccid_completo)
-                            
-                            # Insertar en Supabase
-                            try:
-                                data = {
+                        # Insertar en bloques; las ICCIDs ya existentes se cuentan como duplicadas
+                        for inicio in range(0, total_iccids, tamano_bloque_carga):
+                            bloque = []
+                            for valor in df['ICCID'].iloc[inicio:inicio + tamano_bloque_carga]:
+                                iccid_completo = str(valor).strip()
+                                bloque.append({
                                     "iccid_completo": iccid_completo,
-                                    "ultimos_13_digitos": ultimos_13,
+                                    "ultimos_13_digitos": verificador.extraer_ultimos_13_digitos(iccid_completo),
                                     "lote": nombre_lote,
                                     "estatus": "PENDIENTE"
-                                }
-                                
-                                supabase.table("verificacion_iccids").insert(data).execute()
-                                registros_insertados += 1
-                            except Exception:
-                                registros_duplicados += 1
+                                })
+                            
+                            insertadas, duplicadas = almacenamiento.insertar_iccids(bloque)
+                            registros_insertados += insertadas
+                            registros_duplicados += duplicadas
                             
                             # Actualizar progreso
-                            progress = (idx + 1) / total_iccids
-                            progress_bar.progress(progress)
-                            status_text.text(f"Procesando: {idx + 1}/{total_iccids}")
+                            procesadas_carga = inicio + len(bloque)
+                            progress_bar.progress(procesadas_carga / total_iccids)
+                            status_text.text(f"Procesando: {procesadas_carga}/{total_iccids}")
                         
                         progress_bar.empty()
                         status_text.empty()
+                        invalidar_agregados()
                         
                         # Mostrar resultados
                         st.success(f"✅ Lote cargado exitosamente: **{nombre_lote}**")
@@ -279,123 +460,188 @@ elif menu_option == "📤 Cargar Lote":
 elif menu_option == "▶️ Verificar ICCIDs":
     st.header("▶️ Iniciar Verificación de ICCIDs")
     
-    # Verificar si hay procesos en ejecución
-    try:
-        response_procesos = supabase.table("proceso_verificacion").select("*").in_(
-            "estado", ["EJECUTANDO", "PAUSADO"]
-        ).execute()
-        procesos_activos = response_procesos.data
+    # Panel de procesos activos: solo este fragmento se vuelve a ejecutar cada
+    # INTERVALO_PANEL segundos, no la página completa
+    @st.fragment(run_every=INTERVALO_PANEL)
+    def panel_procesos_activos():
+        try:
+            procesos_activos = cargar_procesos_activos()
+        except Exception as e:
+            st.error(f"❌ Error al verificar procesos: {e}")
+            return
+        
+        if not procesos_activos:
+            return
         
-        if procesos_activos:
-            st.info(f"🔄 Hay {len(procesos_activos)} proceso(s) activo(s) - Auto-actualización cada 5 segundos")
+        st.info(f"🔄 Hay {len(procesos_activos)} proceso(s) activo(s) - Auto-actualización cada {INTERVALO_PANEL} segundos")
+        
+        for proceso in procesos_activos:
+            # Calcular tiempo transcurrido
+            fecha_inicio = datetime.fromisoformat(proceso['fecha_inicio'].replace('Z', '+00:00'))
+            tiempo_transcurrido = datetime.now(fecha_inicio.tzinfo) - fecha_inicio
+            horas = int(tiempo_transcurrido.total_seconds() // 3600)
+            minutos = int((tiempo_transcurrido.total_seconds() % 3600) // 60)
+            segundos = int(tiempo_transcurrido.total_seconds() % 60)
+            tiempo_str = f"{horas}h {minutos}m {segundos}s"
             
-            # Auto-refresh cada 5 segundos si hay procesos activos
-            import streamlit as st
-            st.markdown(
-                """
-                <script>
-                setTimeout(function(){
-                    window.location.reload();
-                }, 5000);
-                </script>
-                """,
-                unsafe_allow_html=True
-            )
+            # Calcular porcentaje
+            porcentaje = (proceso['progreso_actual'] / proceso['progreso_total'] * 100) if proceso['progreso_total'] > 0 else 0
             
-            for proceso in procesos_activos:
-                # Calcular tiempo transcurrido
-                from datetime import datetime
-                fecha_inicio = datetime.fromisoformat(proceso['fecha_inicio'].replace('Z', '+00:00'))
-                tiempo_transcurrido = datetime.now(fecha_inicio.tzinfo) - fecha_inicio
-                horas = int(tiempo_transcurrido.total_seconds() // 3600)
-                minutos = int((tiempo_transcurrido.total_seconds() % 3600) // 60)
-                segundos = int(tiempo_transcurrido.total_seconds() % 60)
-                tiempo_str = f"{horas}h {minutos}m {segundos}s"
+            with st.expander(f"📦 Lote: {proceso['lote']} - {proceso['estado']} - {porcentaje:.1f}%", expanded=True):
+                # Primera fila: Tiempo y progreso
+                col_time1, col_time2 = st.columns(2)
+                with col_time1:
+                    st.metric("⏱️ Tiempo Corriendo", tiempo_str)
+                with col_time2:
+                    st.metric("📈 Progreso", f"{proceso['progreso_actual']:,}/{proceso['progreso_total']:,}")
                 
-                # Calcular porcentaje
-                porcentaje = (proceso['progreso_actual'] / proceso['progreso_total'] * 100) if proceso['progreso_total'] > 0 else 0
+                # Barra de progreso
+                st.progress(porcentaje / 100)
                 
-                with st.expander(f"📦 Lote: {proceso['lote']} - {proceso['estado']} - {porcentaje:.1f}%", expanded=True):
-                    # Primera fila: Tiempo y progreso
-                    col_time1, col_time2 = st.columns(2)
-                    with col_time1:
-                        st.metric("⏱️ Tiempo Corriendo", tiempo_str)
-                    with col_time2:
-                        st.metric("📈 Progreso", f"{proceso['progreso_actual']:,}/{proceso['progreso_total']:,}")
-                    
-                    # Barra de progreso
-                    st.progress(porcentaje / 100)
-                    
-                    # Segunda fila: Estadísticas
-                    col1, col2, col3 = st.columns(3)
-                    with col1:
-                        st.metric("✅ Activas", f"{proceso['activas']:,}")
-                    with col2:
-                        st.metric("⭕ Inactivas", f"{proceso['inactivas']:,}")
-                    with col3:
-                        st.metric("❌ Errores", f"{proceso['errores']:,}")
-                    
-                    # Botones de control
-                    col_btn1, col_btn2, col_btn3 = st.columns(3)
-                    
-                    with col_btn1:
-                        if proceso['estado'] == "EJECUTANDO":
-                            if st.button("⏸️ Pausar", key=f"pausar_{proceso['lote']}"):
-                                supabase.table("proceso_verificacion").update({
-                                    "estado": "PAUSADO"
-                                }).eq("lote", proceso['lote']).execute()
-                                st.success("⏸️ Proceso pausado")
-                                st.rerun()
-                        else:
-                            if st.button("▶️ Reanudar", key=f"reanudar_{proceso['lote']}"):
-                                supabase.table("proceso_verificacion").update({
-                                    "estado": "EJECUTANDO"
-                                }).eq("lote", proceso['lote']).execute()
-                                st.success("▶️ Proceso reanudado")
-                                st.rerun()
-                    
-                    with col_btn2:
-                        if st.button("⏹️ Detener", key=f"detener_{proceso['lote']}", type="primary"):
-                            supabase.table("proceso_verificacion").update({
-                                "estado": "DETENIDO"
-                            }).eq("lote", proceso['lote']).execute()
-                            st.warning("⏹️ Proceso detenido")
-                            st.rerun()
-                    
-                    with col_btn3:
-                        if st.button("🔄 Actualizar", key=f"actualizar_{proceso['lote']}"):
-                            st.rerun()
-            
-            st.divider()
-    except Exception as e:
-        st.error(f"❌ Error al verificar procesos: {e}")
+                # Segunda fila: Estadísticas
+                col1, col2, col3 = st.columns(3)
+                with col1:
+                    st.metric("✅ Activas", f"{proceso['activas']:,}")
+                with col2:
+                    st.metric("⭕ Inactivas", f"{proceso['inactivas']:,}")
+                with col3:
+                    st.metric("❌ Errores", f"{proceso['errores']:,}")
+                
+                # Tercera fila: velocidad real (ventanas móviles publicadas por el worker) y ETA
+                def velocidad(columna):
+                    valor = proceso.get(columna)
+                    return f"{float(valor):.1f}/min" if valor is not None else "—"
+                
+                col_vel1, col_vel2, col_vel3, col_eta = st.columns(4)
+                with col_vel1:
+                    st.metric("⚡ Últ. 1 min", velocidad('velocidad_1m'))
+                with col_vel2:
+                    st.metric("⚡ Últ. 5 min", velocidad('velocidad_5m'))
+                with col_vel3:
+                    st.metric("⚡ Últ. 15 min", velocidad('velocidad_15m'))
+                with col_eta:
+                    st.metric("🏁 ETA", formatear_duracion(proceso.get('eta_segundos')))
+
+                # Presupuesto diario (solo si el worker corre con CUOTA_DIARIA)
+                if proceso.get('fecha_estimada'):
+                    col_cupo, col_fin = st.columns(2)
+                    with col_cupo:
+                        st.metric("🎟️ Cupo de hoy", f"{proceso.get('presupuesto_hoy') or 0:,}")
+                    with col_fin:
+                        st.metric("📅 Término estimado", str(proceso['fecha_estimada'])[:10])
+
+                # Modo muestra: estimación que se va afinando con cada resultado
+                if proceso.get('margen_objetivo'):
+                    mostrar_estimacion(proceso)
+
+                # Circuit breaker del portal: abierto = no se despacha hasta la siguiente prueba
+                if proceso.get('circuito_estado') == "ABIERTO":
+                    reintento = proceso.get('circuito_reintento')
+                    cuando = ""
+                    if reintento:
+                        reintento = datetime.fromisoformat(str(reintento).replace('Z', '+00:00'))
+                        if reintento.tzinfo is None:
+                            reintento = reintento.replace(tzinfo=timezone.utc)
+                        faltan = (reintento - datetime.now(timezone.utc)).total_seconds()
+                        cuando = f" Siguiente prueba en {formatear_duracion(max(faltan, 0))}."
+                    st.error(f"🔌 Portal degradado: circuito ABIERTO (fallos "
+                             f"{float(proceso.get('circuito_tasa_fallos') or 0):.0%}). "
+                             f"Las ICCIDs siguen PENDIENTE.{cuando}")
+                elif proceso.get('circuito_estado') == "SEMIABIERTO":
+                    st.warning("🔌 Portal en prueba: circuito SEMIABIERTO, verificando una ICCID de prueba")
+
+                # Worker dueño del lote (lease renovado con cada latido)
+                if proceso.get('worker_id') and proceso.get('ultimo_latido'):
+                    latido = datetime.fromisoformat(proceso['ultimo_latido'].replace('Z', '+00:00'))
+                    if latido.tzinfo is None:
+                        latido = latido.replace(tzinfo=timezone.utc)
+                    edad = (datetime.now(timezone.utc) - latido).total_seconds()
+                    texto = f"🖥️ Worker: `{proceso['worker_id']}` - último latido hace {formatear_duracion(edad)}"
+                    expira = proceso.get('lease_expira')
+                    vencido = False
+                    if expira:
+                        expira = datetime.fromisoformat(expira.replace('Z', '+00:00'))
+                        if expira.tzinfo is None:
+                            expira = expira.replace(tzinfo=timezone.utc)
+                        vencido = expira < datetime.now(timezone.utc)
+                    if vencido:
+                        st.warning(f"{texto} (lease vencido: otro worker lo retomará)")
+                    else:
+                        st.caption(texto)
+                elif proceso['estado'] == "EJECUTANDO":
+                    st.warning("🖥️ Ningún worker ha tomado este lote todavía")
+
+                # Planificación: el worker relee prioridad y peso en cada refresco, sin reiniciar
+                niveles = list(NIVELES_PRIORIDAD.keys())
+                prioridad_actual = proceso.get('prioridad') or 0
+                col_prio, col_peso, col_aplicar = st.columns([2, 2, 1])
+                with col_prio:
+                    prioridad = st.selectbox(
+                        "Prioridad", niveles,
+                        index=niveles.index(prioridad_actual) if prioridad_actual in niveles else 0,
+                        format_func=lambda n: NIVELES_PRIORIDAD[n],
+                        key=f"prioridad_{proceso['lote']}"
+                    )
+                with col_peso:
+                    peso = st.number_input(
+                        "Peso", min_value=1, max_value=100, value=int(proceso.get('peso') or 1),
+                        help="Parte proporcional de los slots frente a otros lotes de la misma prioridad",
+                        key=f"peso_{proceso['lote']}"
+                    )
+                with col_aplicar:
+                    st.write("")
+                    if st.button("💾 Aplicar", key=f"planificar_{proceso['lote']}"):
+                        almacenamiento.actualizar_planificacion(proceso['lote'], prioridad, int(peso))
+                        cargar_procesos_activos.clear()
+                        st.rerun(scope="fragment")
+                
+                # Botones de control
+                col_btn1, col_btn2, col_btn3 = st.columns(3)
+                
+                with col_btn1:
+                    if proceso['estado'] == "EJECUTANDO":
+                        if st.button("⏸️ Pausar", key=f"pausar_{proceso['lote']}"):
+                            almacenamiento.cambiar_estado_proceso(proceso['lote'], "PAUSADO")
+                            cargar_procesos_activos.clear()
+                            st.rerun(scope="fragment")
+                    else:
+                        if st.button("▶️ Reanudar", key=f"reanudar_{proceso['lote']}"):
+                            almacenamiento.cambiar_estado_proceso(proceso['lote'], "EJECUTANDO")
+                            cargar_procesos_activos.clear()
+                            st.rerun(scope="fragment")
+                
+                with col_btn2:
+                    if st.button("⏹️ Detener", key=f"detener_{proceso['lote']}", type="primary"):
+                        almacenamiento.cambiar_estado_proceso(proceso['lote'], "DETENIDO")
+                        cargar_procesos_activos.clear()
+                        st.rerun(scope="fragment")
+                
+                with col_btn3:
+                    if st.button("🔄 Actualizar", key=f"actualizar_{proceso['lote']}"):
+                        cargar_procesos_activos.clear()
+                        st.rerun(scope="fragment")
+        
+        st.divider()
+    
+    panel_procesos_activos()
+    
+    # Resultado de las muestras ya terminadas
+    try:
+        muestreos = cargar_muestreos_terminados()
+    except Exception:
+        muestreos = []
+    if muestreos:
+        with st.expander(f"🎲 Estimaciones por muestreo ({len(muestreos)})"):
+            for proceso in muestreos:
+                st.markdown(f"**{proceso['lote']}** - {proceso['estado']}")
+                mostrar_estimacion(proceso)
     
     # Obtener lotes disponibles
     try:
-        # Usar RPC para obtener lotes únicos directamente (evita límite de 1000 registros)
-        response = supabase.rpc('get_lotes_unicos').execute()
+        lotes_disponibles = cargar_lotes()
         
-        if response.data and len(response.data) > 0:
-            lotes_disponibles = sorted([item['lote'] for item in response.data])
-        else:
-            # Fallback: obtener con paginación si RPC no existe
-            all_data = []
-            offset = 0
-            limit = 1000
-            while True:
-                response = supabase.table("verificacion_iccids").select("lote").range(offset, offset + limit - 1).execute()
-                if not response.data:
-                    break
-                all_data.extend(response.data)
-                if len(response.data) < limit:
-                    break
-                offset += limit
-            
-            if not all_data:
-                st.warning("⚠️ No hay lotes disponibles. Primero carga un lote de ICCIDs.")
-                lotes_disponibles = []
-            else:
-                lotes_disponibles = sorted(list(set([r['lote'] for r in all_data])))
+        if not lotes_disponibles:
+            st.warning("⚠️ No hay lotes disponibles. Primero carga un lote de ICCIDs.")
         
         if lotes_disponibles:
             
@@ -409,16 +655,19 @@ elif menu_option == "▶️ Verificar ICCIDs":
                 # Mostrar estadísticas del lote
                 if lote_seleccionado:
                     # Obtener estadísticas del lote seleccionado
-                    response_stats = supabase.table("verificacion_iccids").select("estatus").eq("lote", lote_seleccionado).execute()
-                    if response_stats.data:
-                        lote_df = pd.DataFrame(response_stats.data)
-                        pendientes = len(lote_df[lote_df['estatus'] == 'PENDIENTE'])
+                    stats_lote = cargar_estadisticas_lote(lote_seleccionado)
+                    if stats_lote['total']:
+                        pendientes = stats_lote['pendientes']
                         
                         st.info(f"📊 **ICCIDs pendientes:** {pendientes:,}")
                         
                         if pendientes > 0:
-                            tiempo_estimado = (pendientes * 3) / 60
-                            st.info(f"⏱️ **Tiempo estimado:** {tiempo_estimado:.1f} minutos")
+                            # Estimado con la velocidad medida por el worker, no con el delay configurado
+                            if velocidad_medida:
+                                tiempo_estimado = formatear_duracion(pendientes / velocidad_medida * 60)
+                                st.info(f"⏱️ **Tiempo estimado:** {tiempo_estimado} a {velocidad_medida:.1f} ICCIDs/min")
+                            else:
+                                st.info("⏱️ **Tiempo estimado:** sin velocidad medida todavía")
                 
                 limite_verificacion = st.number_input(
                     "Límite de ICCIDs a verificar (0 = todas)",
@@ -429,6 +678,24 @@ elif menu_option == "▶️ Verificar ICCIDs":
                     help="Recomendado: 100-500 por sesión"
                 )
                 
+                modo_verificacion = st.radio(
+                    "Modo",
+                    ["Completo", "Muestra"],
+                    horizontal=True,
+                    help="Muestra: verifica ICCIDs al azar (estratificadas por tramos del lote) y se detiene "
+                         "cuando la proporción estimada de activas tiene el margen elegido. "
+                         "Las verificadas conservan su resultado y una corrida completa posterior las salta."
+                )
+                margen_muestreo = st.select_slider(
+                    "Margen de la estimación (95% de confianza)",
+                    options=MARGENES_MUESTREO,
+                    value=0.02,
+                    format_func=lambda m: f"±{m:.0%}"
+                )
+                if lote_seleccionado and stats_lote['total'] and pendientes > 0:
+                    st.caption(f"🎲 En modo muestra se verifican a lo más "
+                               f"{tamano_muestra(margen_muestreo, pendientes):,} ICCIDs (el límite no aplica)")
+                
                 iniciar = st.form_submit_button("🚀 Iniciar Verificación", use_container_width=True)
                 
                 if iniciar:
@@ -439,39 +706,19 @@ elif menu_option == "▶️ Verificar ICCIDs":
                         # El worker daemon lo detectará y comenzará a procesarlo
                         try:
                             # Verificar si ya hay un proceso activo para este lote
-                            response_check = supabase.table("proceso_verificacion").select("*").eq(
-                                "lote", lote_seleccionado
-                            ).in_("estado", ["EJECUTANDO", "PAUSADO"]).execute()
+                            proceso_existente = almacenamiento.obtener_proceso(lote_seleccionado)
                             
-                            if response_check.data:
+                            if proceso_existente and proceso_existente['estado'] in ["EJECUTANDO", "PAUSADO"]:
                                 st.warning("⚠️ Ya hay un proceso activo para este lote")
                             else:
                                 # Crear o actualizar proceso como EJECUTANDO
-                                response_exists = supabase.table("proceso_verificacion").select("*").eq(
-                                    "lote", lote_seleccionado
-                                ).execute()
-                                
                                 total_pendientes = pendientes if limite_verificacion == 0 else min(limite_verificacion, pendientes)
-                                
-                                if response_exists.data:
-                                    # Actualizar proceso existente
-                                    supabase.table("proceso_verificacion").update({
-                                        "estado": "EJECUTANDO",
-                                        "progreso_total": total_pendientes,
-                                        "fecha_inicio": datetime.now().isoformat(),
-                                        "fecha_actualizacion": datetime.now().isoformat()
-                                    }).eq("lote", lote_seleccionado).execute()
-                                else:
-                                    # Crear nuevo proceso
-                                    supabase.table("proceso_verificacion").insert({
-                                        "lote": lote_seleccionado,
-                                        "estado": "EJECUTANDO",
-                                        "progreso_actual": 0,
-                                        "progreso_total": total_pendientes,
-                                        "activas": 0,
-                                        "inactivas": 0,
-                                        "errores": 0
-                                    }).execute()
+                                muestreo = None
+                                if modo_verificacion == "Muestra":
+                                    total_pendientes = tamano_muestra(margen_muestreo, pendientes)
+                                    muestreo = {"margen_objetivo": margen_muestreo, "poblacion_muestra": pendientes}
+                                almacenamiento.iniciar_proceso(lote_seleccionado, total_pendientes, muestreo)
+                                cargar_procesos_activos.clear()
                                 
                                 st.success("✅ Proceso iniciado en background")
                                 st.info("🔄 El worker daemon detectará el proceso y comenzará a procesarlo")
@@ -492,13 +739,12 @@ elif menu_option == "▶️ Verificar ICCIDs":
 elif menu_option == "📊 Consultar Resultados":
     st.header("📊 Consultar y Exportar Resultados")
     
-    # Filtros
+    # Filtros (se aplican en el servidor)
     col1, col2, col3 = st.columns(3)
     
     with col1:
         try:
-            response = supabase.table("verificacion_iccids").select("lote").execute()
-            lotes = list(set([r['lote'] for r in response.data]))
+            lotes = cargar_lotes()
             lote_filtro = st.selectbox("Filtrar por Lote", ["Todos"] + lotes)
         except:
             lote_filtro = "Todos"
@@ -510,93 +756,284 @@ elif menu_option == "📊 Consultar Resultados":
         )
     
     with col3:
-        limite_registros = st.number_input(
-            "Límite de registros",
-            min_value=10,
-            max_value=10000,
-            value=1000,
-            step=100
-        )
+        filas_por_pagina = st.selectbox("Filas por página", [50, 100, 250, 500], index=1)
+    
+    col4, col5, col6 = st.columns(3)
+    
+    with col4:
+        fecha_desde = st.date_input("Verificadas desde", value=None)
+    
+    with col5:
+        fecha_hasta = st.date_input("Verificadas hasta", value=None)
+    
+    with col6:
+        orden = st.selectbox("Ordenar por", list(ORDENES_NAVEGACION.keys()),
+                             format_func=lambda c: ORDENES_NAVEGACION[c])
+        descendente = st.checkbox("Descendente")
+    
+    filtros = {
+        "lote": lote_filtro,
+        "estatus": estatus_filtro,
+        "fecha_desde": fecha_desde.isoformat() if fecha_desde else None,
+        # fecha_hasta es exclusiva: incluir el día seleccionado completo
+        "fecha_hasta": (fecha_hasta + timedelta(days=1)).isoformat() if fecha_hasta else None,
+    }
+    
+    # Navegación por llave: la pila guarda el cursor de inicio de cada página visitada,
+    # así "Anterior" no necesita OFFSET; se reinicia al cambiar filtros u orden
+    clave_navegacion = (tuple(filtros.values()), orden, descendente, filas_por_pagina)
+    if st.session_state.get("navegacion_clave") != clave_navegacion:
+        st.session_state["navegacion_clave"] = clave_navegacion
+        st.session_state["navegacion_pila"] = [None]
+    pila = st.session_state["navegacion_pila"]
     
-    # Botón de consulta
-    if st.button("🔍 Buscar", use_container_width=True):
+    try:
+        total_registros = cargar_total_registros(**filtros)
+        # Una fila extra para saber si existe página siguiente
+        filas = cargar_pagina_registros(orden=orden, descendente=descendente, despues_de=pila[-1],
+                                        tamano=filas_por_pagina + 1, **filtros)
+        hay_siguiente = len(filas) > filas_por_pagina
+        filas = filas[:filas_por_pagina]
+        
+        total_paginas = max(1, -(-total_registros // filas_por_pagina))
+        st.caption(f"📄 Página {len(pila):,} de {total_paginas:,} · {total_registros:,} registros")
+        
+        if filas:
+            st.dataframe(
+                pd.DataFrame(filas)[COLUMNAS_RESULTADOS],
+                use_container_width=True,
+                hide_index=True,
+                height=400
+            )
+        else:
+            st.warning("⚠️ No se encontraron resultados con los filtros seleccionados")
+        
+        col_nav1, col_nav2, col_nav3 = st.columns(3)
+        with col_nav1:
+            if st.button("⏮️ Primera", use_container_width=True, disabled=len(pila) == 1):
+                st.session_state["navegacion_pila"] = [None]
+                st.rerun()
+        with col_nav2:
+            if st.button("◀️ Anterior", use_container_width=True, disabled=len(pila) == 1):
+                pila.pop()
+                st.rerun()
+        with col_nav3:
+            if st.button("Siguiente ▶️", use_container_width=True, disabled=not hay_siguiente):
+                pila.append(filas[-1][orden])
+                st.rerun()
+    
+    except Exception as e:
+        st.error(f"❌ Error al consultar: {e}")
+    
+    # Exportación completa en streaming (todas las páginas)
+    st.divider()
+    st.subheader("📥 Exportar Resultados")
+    st.caption("Exporta todos los registros del lote y estado seleccionados, página por página, sin cargarlos en memoria")
+    
+    formato_export = st.selectbox("Formato de exportación", list(FORMATOS_EXPORTACION.keys()))
+    
+    if st.button("📦 Generar Exportación", use_container_width=True):
+        # Eliminar el archivo de una exportación anterior
+        export_anterior = st.session_state.pop("export_resultados", None)
+        if export_anterior and os.path.exists(export_anterior["ruta"]):
+            os.remove(export_anterior["ruta"])
+        
         try:
-            # Construir query
-            query = supabase.table("verificacion_iccids").select("*")
-            
-            if lote_filtro != "Todos":
-                query = query.eq("lote", lote_filtro)
-            
-            if estatus_filtro != "Todos":
-                query = query.eq("estatus", estatus_filtro)
-            
-            query = query.limit(limite_registros)
-            
-            response = query.execute()
-            resultados = response.data
-            
-            if resultados:
-                df = pd.DataFrame(resultados)
-                
-                st.success(f"✅ Se encontraron {len(df)} registros")
-                
-                # Mostrar tabla
-                st.dataframe(
-                    df[[
-                        'iccid_completo', 'ultimos_13_digitos', 'estatus',
-                        'numero_asignado', 'lote', 'fecha_verificacion', 'observaciones'
-                    ]],
-                    use_container_width=True,
-                    height=400
-                )
-                
-                # Botón de exportación
-                st.divider()
-                
-                # Convertir a Excel
-                output = BytesIO()
-                with pd.ExcelWriter(output, engine='openpyxl') as writer:
-                    df.to_excel(writer, index=False, sheet_name='Resultados')
-                
-                excel_data = output.getvalue()
-                
-                st.download_button(
-                    label="📥 Descargar Resultados en Excel",
-                    data=excel_data,
-                    file_name=f"resultados_iccids_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
-                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                    use_container_width=True
+            status_export = st.empty()
+            mostrar_progreso = lambda n: status_export.text(f"Exportando: {n:,} registros...")
+            if almacenamiento.postgres and formato_export != "Excel (xlsx)":
+                # CSV generado por Postgres con COPY TO STDOUT
+                ruta, nombre_descarga, total_exportado = exportar_copy_a_archivo(
+                    almacenamiento.postgres, formato_export, lote_filtro, estatus_filtro,
+                    COLUMNAS_RESULTADOS, callback_progreso=mostrar_progreso
                 )
             else:
-                st.warning("⚠️ No se encontraron resultados con los filtros seleccionados")
-        
+                filas = almacenamiento.iterar_registros(lote=lote_filtro, estatus=estatus_filtro)
+                ruta, nombre_descarga, total_exportado = exportar_a_archivo(
+                    filas, formato_export, COLUMNAS_RESULTADOS, callback_progreso=mostrar_progreso
+                )
+            status_export.empty()
+            
+            st.session_state["export_resultados"] = {
+                "ruta": ruta,
+                "nombre": nombre_descarga,
+                "mime": FORMATOS_EXPORTACION[formato_export][1],
+                "total": total_exportado
+            }
         except Exception as e:
-            st.error(f"❌ Error al consultar: {e}")
+            st.error(f"❌ Error al exportar: {e}")
+    
+    export_generado = st.session_state.get("export_resultados")
+    if export_generado and os.path.exists(export_generado["ruta"]):
+        st.success(f"✅ Exportación lista: {export_generado['total']:,} registros")
+        with open(export_generado["ruta"], "rb") as archivo_export:
+            st.download_button(
+                label=f"📥 Descargar {export_generado['nombre']}",
+                data=archivo_export,
+                file_name=export_generado["nombre"],
+                mime=export_generado["mime"],
+                use_container_width=True
+            )
+    
+    # Exportación incremental: solo lo modificado desde la última entrega a cada consumidor
+    with st.expander("🔁 Exportación Incremental (solo cambios)"):
+        st.info("Exporta únicamente las ICCIDs cuyo registro cambió desde la última exportación confirmada de cada consumidor")
+        
+        if supabase is None:
+            st.warning("⚠️ Disponible solo con almacenamiento en Supabase")
+        else:
+            try:
+                consumidores = listar_consumidores_exportacion(supabase)
+                if consumidores:
+                    st.dataframe(pd.DataFrame(consumidores), use_container_width=True, hide_index=True)
+            except Exception as e:
+                st.warning(f"⚠️ No se pudieron cargar los cursores de exportación: {e}")
+        
+            consumidor = st.text_input("Consumidor", placeholder="Ej: crm_diario", key="consumidor_delta")
+            formato_delta = st.selectbox("Formato", list(FORMATOS_EXPORTACION.keys()), key="formato_delta")
+        
+            if st.button("📦 Generar Exportación Incremental", use_container_width=True):
+                if not consumidor:
+                    st.error("❌ Debes indicar el nombre del consumidor")
+                else:
+                    export_anterior = st.session_state.pop("export_delta", None)
+                    if export_anterior and os.path.exists(export_anterior["ruta"]):
+                        os.remove(export_anterior["ruta"])
+                
+                    try:
+                        status_delta = st.empty()
+                        st.session_state["export_delta"] = exportar_delta(
+                            supabase, consumidor, formato_delta,
+                            callback_progreso=lambda n: status_delta.text(f"Exportando: {n:,} cambios...")
+                        )
+                        st.session_state["export_delta"]["mime"] = FORMATOS_EXPORTACION[formato_delta][1]
+                        status_delta.empty()
+                    except Exception as e:
+                        st.error(f"❌ Error al exportar cambios: {e}")
+        
+            export_delta_generado = st.session_state.get("export_delta")
+            if export_delta_generado and os.path.exists(export_delta_generado["ruta"]):
+                st.success(
+                    f"✅ {export_delta_generado['total']:,} cambios de '{export_delta_generado['consumidor']}' "
+                    f"desde {export_delta_generado['desde']}"
+                )
+                st.caption("El cursor del consumidor avanza al descargar el archivo")
+                with open(export_delta_generado["ruta"], "rb") as archivo_delta:
+                    st.download_button(
+                        label=f"📥 Descargar {export_delta_generado['nombre']}",
+                        data=archivo_delta,
+                        file_name=export_delta_generado["nombre"],
+                        mime=export_delta_generado["mime"],
+                        on_click=confirmar_exportacion_delta,
+                        args=(supabase, export_delta_generado),
+                        use_container_width=True
+                    )
 
 # ==================== CONFIGURACIÓN ====================
 elif menu_option == "⚙️ Configuración":
     st.header("⚙️ Configuración del Sistema")
     
+    # Valores vigentes de la tabla configuracion (los que no tienen fila usan su valor por defecto)
+    configuracion_actual = valores_por_defecto()
+    try:
+        configuracion_guardada = almacenamiento.leer_configuracion()
+    except Exception as e:
+        configuracion_guardada = {}
+        st.error(f"❌ Error al leer la configuración: {e}")
+    for clave, valor in configuracion_guardada.items():
+        convertido = convertir(clave, valor)
+        if convertido is not None:
+            configuracion_actual[clave] = convertido
+    
     st.subheader("📊 Información del Sistema")
     
     col1, col2 = st.columns(2)
     
     with col1:
-        st.info("""
+        st.info(f"""
         **Configuración Actual:**
-        - Velocidad: 3 segundos/ICCID
-        - Capacidad: 30,000 ICCIDs/día
-        - Timeout: 15 segundos
-        - Reintentos: 3 intentos
+        - Pausa entre verificaciones: {configuracion_actual['delay_entre_verificaciones']:g} segundos
+        - Timeout: {configuracion_actual['timeout_pagina'] / 1000:g} segundos
         """)
     
+        if velocidad_medida:
+            st.metric("⚡ Velocidad medida (15 min)", f"{velocidad_medida:.1f} ICCIDs/min",
+                      delta=f"{velocidad_medida * 1440:,.0f} ICCIDs/día", delta_color="off")
+    
     with col2:
-        st.info("""
-        **Base de Datos:**
-        - Proveedor: Supabase
-        - Plan: Pro
-        - Estado: ✅ Conectado
-        """)
+        if supabase is not None:
+            st.info("""
+            **Base de Datos:**
+            - Proveedor: Supabase
+            - Plan: Pro
+            - Estado: ✅ Conectado
+            """)
+        else:
+            st.info(f"""
+            **Base de Datos:**
+            - Proveedor: SQLite local (WAL)
+            - Archivo: `{almacenamiento.ruta}`
+            """)
+    
+    # Métricas del cliente compartido de Supabase en este proceso
+    metricas_http = obtener_metricas()
+    col_http1, col_http2, col_http3 = st.columns(3)
+    with col_http1:
+        st.metric("🔌 Conexiones abiertas", f"{metricas_http['conexiones_abiertas']:,}")
+    with col_http2:
+        st.metric("🔐 Handshakes TLS", f"{metricas_http['handshakes_tls']:,}")
+    with col_http3:
+        st.metric("📨 Peticiones enviadas", f"{metricas_http['peticiones']:,}",
+                  delta="HTTP/2" if metricas_http['http2'] else "HTTP/1.1", delta_color="off")
+    
+    st.divider()
+    
+    st.subheader("🎛️ Parámetros de Velocidad")
+    st.caption(f"Se guardan en la tabla `configuracion`; los workers los aplican en menos de "
+               f"{CONFIGURACION_TTL} segundos, sin reiniciarse")
+    
+    with st.form("form_configuracion"):
+        configuracion_nueva = {}
+        columnas_configuracion = st.columns(2)
+        for i, (clave, parametro) in enumerate(PARAMETROS.items()):
+            with columnas_configuracion[i % 2]:
+                configuracion_nueva[clave] = st.number_input(
+                    parametro["descripcion"],
+                    min_value=parametro["minimo"],
+                    max_value=parametro["maximo"],
+                    value=configuracion_actual[clave],
+                    step=0.5 if isinstance(parametro["defecto"], float) else 1,
+                    key=f"configuracion_{clave}",
+                    help=f"`{clave}` · por defecto: {parametro['defecto']}"
+                )
+        guardar_configuracion = st.form_submit_button("💾 Guardar cambios", type="primary", use_container_width=True)
+    
+    if guardar_configuracion:
+        cambios = {
+            clave: valor for clave, valor in configuracion_nueva.items()
+            if valor != configuracion_actual[clave]
+        }
+        if not cambios:
+            st.info("ℹ️ Sin cambios")
+        else:
+            try:
+                almacenamiento.guardar_configuracion(cambios)
+                st.success("✅ Guardado: " + ", ".join(
+                    f"{clave} {configuracion_actual[clave]} → {valor}" for clave, valor in cambios.items()
+                ))
+            except Exception as e:
+                st.error(f"❌ Error al guardar la configuración (¿se aplicó sql/configuracion.sql?): {e}")
+    
+    if configuracion_guardada:
+        st.caption("Modificados: " + ", ".join(f"`{clave}`" for clave in sorted(configuracion_guardada)))
+        if st.button("↩️ Restaurar valores por defecto", use_container_width=True):
+            try:
+                almacenamiento.restaurar_configuracion()
+                for clave in PARAMETROS:
+                    st.session_state.pop(f"configuracion_{clave}", None)
+                st.rerun()
+            except Exception as e:
+                st.error(f"❌ Error al restaurar la configuración: {e}")
     
     st.divider()
     
@@ -604,16 +1041,10 @@ elif menu_option == "⚙️ Configuración":
     
     # Mostrar estadísticas de lotes
     try:
-        response = supabase.table("verificacion_iccids").select("lote, estatus").execute()
-        if response.data:
-            df_lotes = pd.DataFrame(response.data)
-            lotes_stats = df_lotes.groupby('lote')['estatus'].value_counts().unstack(fill_value=0)
-            
+        catalogo = cargar_catalogo_lotes()
+        if catalogo:
             st.subheader("📊 Estadísticas por Lote")
-            st.dataframe(lotes_stats, use_container_width=True)
-            
-            # Calcular totales
-            lotes_stats['TOTAL'] = lotes_stats.sum(axis=1)
+            st.dataframe(pd.DataFrame(catalogo).set_index('lote'), use_container_width=True)
             
             st.divider()
     except Exception as e:
@@ -621,36 +1052,70 @@ elif menu_option == "⚙️ Configuración":
     
     # Operaciones de limpieza
     with st.expander("🧹 Limpieza de Duplicados"):
-        st.info("Buscar y eliminar registros duplicados en la base de datos")
+        st.info("Buscar y eliminar registros duplicados en la base de datos (la búsqueda se hace en el servidor)")
         
-        if st.button("🔍 Buscar Duplicados", use_container_width=True):
+        # iccid_completo es UNIQUE: los duplicados solo pueden ser por los últimos 13 dígitos
+        if supabase is None:
+            st.warning("⚠️ Disponible solo con almacenamiento en Supabase")
+        elif st.button("🔍 Buscar Duplicados", use_container_width=True):
             try:
-                # Buscar duplicados por iccid_completo
-                response = supabase.table("verificacion_iccids").select("iccid_completo").execute()
-                if response.data:
-                    df_check = pd.DataFrame(response.data)
-                    duplicados = df_check[df_check.duplicated(subset=['iccid_completo'], keep=False)]
-                    
-                    if len(duplicados) > 0:
-                        st.warning(f"⚠️ Se encontraron {len(duplicados)} registros duplicados")
-                        st.dataframe(duplicados.head(20), use_container_width=True)
-                        
-                        if st.button("🗑️ Eliminar Duplicados (mantener el más reciente)"):
-                            st.error("⚠️ Esta operación requiere confirmación manual en la base de datos")
-                    else:
-                        st.success("✅ No se encontraron duplicados")
+                response = supabase.rpc('get_resumen_duplicados').execute()
+                st.session_state["resumen_duplicados"] = (
+                    response.data[0] if response.data else {"grupos": 0, "registros_sobrantes": 0}
+                )
             except Exception as e:
                 st.error(f"❌ Error: {e}")
+        
+        resumen_duplicados = st.session_state.get("resumen_duplicados")
+        if supabase is not None and resumen_duplicados is not None:
+            st.metric(
+                "🔁 Mismos últimos 13 dígitos (entre lotes)",
+                f"{resumen_duplicados['registros_sobrantes']:,} sobrantes",
+                delta=f"{resumen_duplicados['grupos']:,} grupos",
+                delta_color="off"
+            )
+            
+            if resumen_duplicados.get("registros_sobrantes", 0) > 0:
+                try:
+                    muestra = supabase.rpc('get_muestra_duplicados', {"p_limite": 20}).execute()
+                    if muestra.data:
+                        st.dataframe(pd.DataFrame(muestra.data), use_container_width=True, hide_index=True)
+                except Exception as e:
+                    st.warning(f"⚠️ No se pudo cargar la muestra: {e}")
+                
+                if st.button("🗑️ Eliminar Duplicados (mantener el más reciente)", type="primary"):
+                    try:
+                        total_eliminados = 0
+                        desde = None
+                        status_limpieza = st.empty()
+                        # Borrado por tramos de claves (keyset) para no exceder el statement_timeout
+                        while True:
+                            response = supabase.rpc('eliminar_duplicados', {
+                                "p_desde": desde, "p_tamano_lote": 5000
+                            }).execute()
+                            tramo = response.data[0] if response.data else {}
+                            total_eliminados += tramo.get("eliminados") or 0
+                            desde = tramo.get("siguiente")
+                            if desde is None:
+                                break
+                            status_limpieza.text(f"Eliminados: {total_eliminados:,}...")
+                        
+                        status_limpieza.empty()
+                        st.session_state.pop("resumen_duplicados", None)
+                        invalidar_agregados()
+                        st.success(f"✅ Se eliminaron {total_eliminados:,} registros duplicados")
+                    except Exception as e:
+                        st.error(f"❌ Error al eliminar duplicados: {e}")
+            else:
+                st.success("✅ No se encontraron duplicados")
     
     # Eliminar lote específico
     with st.expander("🗑️ Eliminar Lote Completo"):
         st.warning("⚠️ Esta operación eliminará permanentemente todos los registros del lote seleccionado")
         
         try:
-            response = supabase.table("verificacion_iccids").select("lote").execute()
-            if response.data:
-                df_lotes_list = pd.DataFrame(response.data)
-                lotes_disponibles = df_lotes_list['lote'].unique().tolist()
+            lotes_disponibles = cargar_lotes()
+            if lotes_disponibles:
                 
                 lote_a_eliminar = st.selectbox(
                     "Selecciona el lote a eliminar",
@@ -660,8 +1125,8 @@ elif menu_option == "⚙️ Configuración":
                 
                 if lote_a_eliminar:
                     # Mostrar estadísticas del lote
-                    lote_data = df_lotes_list[df_lotes_list['lote'] == lote_a_eliminar]
-                    st.info(f"📄 Total de registros en '{lote_a_eliminar}': {len(lote_data)}")
+                    total_lote = cargar_estadisticas_lote(lote_a_eliminar)['total']
+                    st.info(f"📄 Total de registros en '{lote_a_eliminar}': {total_lote}")
                     
                     confirmar = st.text_input(
                         f"Escribe '{lote_a_eliminar}' para confirmar la eliminación",
@@ -671,15 +1136,9 @@ elif menu_option == "⚙️ Configuración":
                     if st.button("🗑️ ELIMINAR LOTE", type="primary", use_container_width=True):
                         if confirmar == lote_a_eliminar:
                             try:
-                                # Eliminar registros del lote
-                                supabase.table("verificacion_iccids").delete().eq(
-                                    "lote", lote_a_eliminar
-                                ).execute()
-                                
-                                # Eliminar proceso asociado
-                                supabase.table("proceso_verificacion").delete().eq(
-                                    "lote", lote_a_eliminar
-                                ).execute()
+                                # Eliminar registros del lote y proceso asociado
+                                almacenamiento.eliminar_lote(lote_a_eliminar)
+                                invalidar_agregados()
                                 
                                 st.success(f"✅ Lote '{lote_a_eliminar}' eliminado exitosamente")
                                 st.rerun()
@@ -695,10 +1154,8 @@ elif menu_option == "⚙️ Configuración":
         st.info("Cambiar el estado de ICCIDs de un lote a PENDIENTE para re-verificarlas")
         
         try:
-            response = supabase.table("verificacion_iccids").select("lote").execute()
-            if response.data:
-                df_lotes_reset = pd.DataFrame(response.data)
-                lotes_disponibles_reset = df_lotes_reset['lote'].unique().tolist()
+            lotes_disponibles_reset = cargar_lotes()
+            if lotes_disponibles_reset:
                 
                 lote_a_resetear = st.selectbox(
                     "Selecciona el lote a resetear",
@@ -714,17 +1171,11 @@ elif menu_option == "⚙️ Configuración":
                 
                 if st.button("🔄 Resetear a PENDIENTE", use_container_width=True):
                     try:
-                        query = supabase.table("verificacion_iccids").update({
-                            "estatus": "PENDIENTE",
-                            "numero_asignado": None,
-                            "fecha_verificacion": None,
-                            "observaciones": "Reseteado manualmente"
-                        }).eq("lote", lote_a_resetear)
-                        
-                        if estado_a_resetear != "Todos":
-                            query = query.eq("estatus", estado_a_resetear)
-                        
-                        response = query.execute()
+                        almacenamiento.resetear_lote(
+                            lote_a_resetear,
+                            None if estado_a_resetear == "Todos" else estado_a_resetear
+                        )
+                        invalidar_agregados()
                         st.success(f"✅ ICCIDs reseteadas exitosamente")
                         st.rerun()
                     except Exception as e:
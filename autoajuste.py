@@ -0,0 +1,120 @@
+"""
+Autoajuste de la concurrencia del worker
+Cada INTERVALO_AJUSTE segundos compara el throughput (ICCIDs/min), la latencia
+p95 de la verificación en el portal y la proporción de ERROR del periodo, y
+mueve el número de slots activos un paso (como un hill climbing sobre la curva
+throughput vs concurrencia):
+
+- ERROR por encima de UMBRAL_ERRORES: baja a la mitad (el portal se satura)
+- p95 por encima de LATENCIA_P95_MAXIMA: baja un slot
+- el último aumento no mejoró el throughput: regresa al nivel anterior y se
+  queda ahí unos periodos antes de volver a probar
+- si no: sube un slot, hasta SLOTS_MAXIMOS
+
+Cada cambio se registra en el log con el nivel elegido y el motivo.
+"""
+
+import logging
+import math
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Tope de slots; si no supera SLOTS_VERIFICACION el autoajuste queda apagado
+SLOTS_MAXIMOS = int(os.getenv("SLOTS_MAXIMOS", "0"))
+
+# Latencia p95 (segundos) aceptable para una verificación en el portal
+LATENCIA_P95_MAXIMA = float(os.getenv("LATENCIA_P95_MAXIMA", "20"))
+
+# Proporción de ERROR en el periodo que fuerza a bajar la concurrencia
+UMBRAL_ERRORES = float(os.getenv("UMBRAL_ERRORES", "0.2"))
+
+# Segundos por periodo de medición y verificaciones mínimas para decidir
+INTERVALO_AJUSTE = int(os.getenv("INTERVALO_AJUSTE", "120"))
+MUESTRAS_MINIMAS = 10
+
+# Mejora mínima de throughput (proporción) para considerar que subir valió la pena
+MEJORA_MINIMA = 0.05
+
+# Periodos que se sostiene un nivel después de revertir un aumento sin mejora
+PERIODOS_ESPERA = 5
+
+
+def percentil(valores: List[float], p: float) -> float:
+    """Percentil por rango más cercano (p entre 0 y 100)"""
+    ordenados = sorted(valores)
+    return ordenados[max(0, math.ceil(p / 100 * len(ordenados)) - 1)]
+
+
+class AutoajusteConcurrencia:
+    """Controlador del número de slots activos del planificador"""
+
+    def __init__(self, inicial: int, maximo: int, minimo: int = 1, intervalo: int = INTERVALO_AJUSTE):
+        self.minimo = max(1, minimo)
+        self.maximo = max(maximo, inicial)
+        self.nivel = inicial
+        self.intervalo = intervalo
+        self.habilitado = self.maximo > inicial
+        self._muestras: List[Tuple[float, bool]] = []
+        self._inicio_periodo = time.monotonic()
+        self._throughput_por_nivel: Dict[int, float] = {}
+        self._ultimo_cambio: Optional[int] = None  # +1 / -1 del último ajuste
+        self._espera = 0
+        self._lock = threading.Lock()
+
+    def registrar(self, latencia: float, exito: bool):
+        """Registrar una verificación terminada (latencia en segundos)"""
+        with self._lock:
+            self._muestras.append((latencia, exito))
+
+    def _cambiar(self, nivel: int, motivo: str):
+        nivel = min(max(nivel, self.minimo), self.maximo)
+        if nivel != self.nivel:
+            logger.info(f"🎛️ Concurrencia {self.nivel} -> {nivel}: {motivo}")
+            self._ultimo_cambio = 1 if nivel > self.nivel else -1
+            self.nivel = nivel
+        else:
+            self._ultimo_cambio = None
+
+    def evaluar(self):
+        """Cerrar el periodo si ya terminó y ajustar el nivel (llamar en cada refresco)"""
+        if not self.habilitado:
+            return
+
+        ahora = time.monotonic()
+        with self._lock:
+            if ahora - self._inicio_periodo < self.intervalo:
+                return
+            muestras, self._muestras = self._muestras, []
+            duracion = ahora - self._inicio_periodo
+            self._inicio_periodo = ahora
+
+        if len(muestras) < MUESTRAS_MINIMAS:
+            # Sin trabajo, circuito abierto o ritmo del presupuesto: nada que aprender. Se conserva
+            # _ultimo_cambio: una subida justo antes de la pausa se evalúa en el siguiente periodo completo
+            return
+
+        throughput = len(muestras) * 60 / duracion
+        errores = sum(1 for _, exito in muestras if not exito) / len(muestras)
+        p95 = percentil([latencia for latencia, _ in muestras], 95)
+        anterior = self._throughput_por_nivel.get(self.nivel - 1)
+        self._throughput_por_nivel[self.nivel] = throughput
+        medicion = f"{throughput:.1f}/min, p95 {p95:.1f}s, ERROR {errores:.0%}"
+
+        if errores > UMBRAL_ERRORES:
+            self._espera = PERIODOS_ESPERA
+            self._cambiar(self.nivel // 2, f"ERROR por encima de {UMBRAL_ERRORES:.0%} ({medicion})")
+        elif p95 > LATENCIA_P95_MAXIMA:
+            self._espera = PERIODOS_ESPERA
+            self._cambiar(self.nivel - 1, f"p95 por encima de {LATENCIA_P95_MAXIMA:.0f}s ({medicion})")
+        elif self._ultimo_cambio == 1 and anterior is not None and throughput < anterior * (1 + MEJORA_MINIMA):
+            self._espera = PERIODOS_ESPERA
+            self._cambiar(self.nivel - 1, f"subir no mejoró el throughput ({anterior:.1f} -> {medicion})")
+        elif self._espera > 0:
+            self._espera -= 1
+            self._ultimo_cambio = None
+        else:
+            self._cambiar(self.nivel + 1, f"p95 y ERROR dentro de límites ({medicion})")
@@ -1,14 +1,24 @@
 """
 Worker en background para procesar ICCIDs de forma asíncrona
 Permite que el proceso continúe aunque el usuario cierre el navegador
+
+La verificación no corre dentro del servidor de Streamlit: el lote se marca
+EJECUTANDO en proceso_verificacion y lo toma el worker daemon en marcha
+(supervisord lo arranca en la misma imagen). Con LANZAR_WORKER_DEDICADO=1 se
+lanza además un worker_daemon.py dedicado al lote en su propio proceso y
+sesión, para despliegues sin daemon; si el lease ya lo tiene otro worker, el
+dedicado termina sin abrir navegadores.
 """
 
-import threading
-import time
 import logging
-from typing import Dict, Optional
-from verificador_motor import VerificadorICCID
 import os
+import re
+import socket
+import subprocess
+import sys
+from typing import Dict, Optional
+from almacenamiento import crear_almacenamiento
+from estimacion import tamano_muestra
 
 # Configurar logging
 logging.basicConfig(
@@ -17,129 +27,126 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Diccionario global para mantener threads activos
-active_threads: Dict[str, threading.Thread] = {}
-
-
-class BackgroundWorker:
-    """Worker para ejecutar verificaciones en background"""
-    
-    def __init__(self, supabase_url: str, supabase_key: str):
-        self.supabase_url = supabase_url
-        self.supabase_key = supabase_key
-        self.verificador = VerificadorICCID(supabase_url, supabase_key)
-    
-    def ejecutar_verificacion(self, lote_nombre: str, limite: Optional[int] = None):
-        """
-        Ejecutar verificación de un lote en background
-        Esta función se ejecuta en un thread separado
-        """
-        try:
-            logger.info(f"🚀 Iniciando verificación en background para lote: {lote_nombre}")
-            
-            # Ejecutar verificación
-            resultados = self.verificador.procesar_lote(
-                lote_nombre=lote_nombre,
-                limite=limite,
-                callback_progreso=None  # No usar callback en background
-            )
-            
-            logger.info(f"✅ Verificación completada para lote: {lote_nombre}")
-            logger.info(f"📊 Resultados: {resultados}")
-            
-            # Remover thread de la lista de activos
-            if lote_nombre in active_threads:
-                del active_threads[lote_nombre]
-            
-            return resultados
-            
-        except Exception as e:
-            logger.error(f"❌ Error en verificación de lote {lote_nombre}: {e}")
-            
-            # Marcar proceso como error en la base de datos
-            try:
-                self.verificador.finalizar_proceso(lote_nombre, "ERROR")
-            except:
-                pass
-            
-            # Remover thread de la lista de activos
-            if lote_nombre in active_threads:
-                del active_threads[lote_nombre]
-            
-            raise
+# Script del worker que se lanza por lote
+SCRIPT_WORKER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "worker_daemon.py")
+
+# Lanzar un worker dedicado por lote (por defecto solo se deja en cola para los daemons existentes)
+LANZAR_WORKER_DEDICADO = os.getenv("LANZAR_WORKER_DEDICADO", "0") == "1"
+
+# Procesos lanzados desde esta app (lote -> proceso)
+procesos_activos: Dict[str, subprocess.Popen] = {}
+
+
+def _lanzar_worker(lote_nombre: str, supabase_url: Optional[str], supabase_key: Optional[str]) -> subprocess.Popen:
+    """Lanzar worker_daemon.py solo para este lote, en una sesión aparte"""
+    nombre_log = re.sub(r"[^A-Za-z0-9_-]", "_", lote_nombre)
+
+    # Identidad, outbox y log propios: el daemon de supervisord corre en el mismo directorio y no
+    # debe compartir el diario ni el archivo de log (la rotación no es segura entre procesos).
+    # Son estables por lote: si el worker se relanza, reenvía lo pendiente
+    worker_id = f"{socket.gethostname()}-lote-{nombre_log}"
+    entorno = {
+        **os.environ,
+        "LOTE_ASIGNADO": lote_nombre,
+        "SALIR_AL_TERMINAR": "1",
+        "WORKER_ID": worker_id,
+        "OUTBOX_RUTA": f"outbox_{worker_id}.db",
+        "LOG_RUTA": os.path.join("/tmp", f"worker_{worker_id}.log")
+    }
+    if supabase_url and supabase_key:
+        entorno.update({"SUPABASE_URL": supabase_url, "SUPABASE_SERVICE_KEY": supabase_key})
+
+    # start_new_session: no recibe las señales de Streamlit y sigue si la app se reinicia
+    with open(os.path.join("/tmp", f"worker_{nombre_log}.log"), "ab") as salida:
+        return subprocess.Popen(
+            [sys.executable, SCRIPT_WORKER],
+            env=entorno,
+            cwd=os.path.dirname(SCRIPT_WORKER),
+            stdout=salida,
+            stderr=subprocess.STDOUT,
+            start_new_session=True
+        )
 
 
 def iniciar_verificacion_background(lote_nombre: str, limite: Optional[int] = None,
-                                    supabase_url: str = None, supabase_key: str = None) -> bool:
+                                    supabase_url: str = None, supabase_key: str = None,
+                                    margen_muestreo: Optional[float] = None) -> bool:
     """
     Iniciar verificación de un lote en background
-    
+
     Args:
         lote_nombre: Nombre del lote a procesar
         limite: Límite de ICCIDs a procesar (None = todas)
         supabase_url: URL de Supabase
         supabase_key: Key de Supabase
-    
+        margen_muestreo: Modo muestra (ver estimacion.py); el límite no aplica
+
     Returns:
         True si se inició correctamente, False si ya hay un proceso activo
     """
-    # Verificar si ya hay un thread activo para este lote
-    if lote_nombre in active_threads and active_threads[lote_nombre].is_alive():
-        logger.warning(f"⚠️ Ya hay un proceso activo para el lote: {lote_nombre}")
-        return False
-    
     # Obtener credenciales de Supabase
     if not supabase_url or not supabase_key:
         supabase_url = os.getenv("SUPABASE_URL")
         supabase_key = os.getenv("SUPABASE_SERVICE_KEY")
-    
-    # Crear worker
-    worker = BackgroundWorker(supabase_url, supabase_key)
-    
-    # Crear y lanzar thread
-    thread = threading.Thread(
-        target=worker.ejecutar_verificacion,
-        args=(lote_nombre, limite),
-        daemon=True,  # Thread daemon para que no bloquee el cierre del programa
-        name=f"Worker-{lote_nombre}"
-    )
-    
-    # Guardar referencia al thread
-    active_threads[lote_nombre] = thread
-    
-    # Iniciar thread
-    thread.start()
-    
+
+    almacenamiento = crear_almacenamiento(supabase_url, supabase_key)
+
+    # Verificar si ya hay un proceso activo para este lote (en cualquier worker)
+    if almacenamiento.obtener_estado_proceso(lote_nombre) in ("EJECUTANDO", "PAUSADO"):
+        logger.warning(f"⚠️ Ya hay un proceso activo para el lote: {lote_nombre}")
+        return False
+
+    total_pendientes = almacenamiento.contar_pendientes(lote_nombre)
+    if total_pendientes == 0:
+        logger.warning(f"⚠️ No hay ICCIDs pendientes en el lote: {lote_nombre}")
+        return False
+
+    # El límite viaja como progreso_total: el planificador no despacha más allá
+    if margen_muestreo:
+        almacenamiento.iniciar_proceso(
+            lote_nombre, tamano_muestra(margen_muestreo, total_pendientes),
+            {"margen_objetivo": margen_muestreo, "poblacion_muestra": total_pendientes}
+        )
+    else:
+        almacenamiento.iniciar_proceso(lote_nombre, min(total_pendientes, limite) if limite else total_pendientes)
+
+    proceso = procesos_activos.get(lote_nombre)
+    if LANZAR_WORKER_DEDICADO and (proceso is None or proceso.poll() is not None):
+        procesos_activos[lote_nombre] = _lanzar_worker(lote_nombre, supabase_url, supabase_key)
+        logger.info(f"🚀 Worker dedicado lanzado para {lote_nombre} (pid {procesos_activos[lote_nombre].pid})")
+
     logger.info(f"✅ Proceso en background iniciado para lote: {lote_nombre}")
-    logger.info(f"🔢 Threads activos: {len(active_threads)}")
-    
+    logger.info(f"🔢 Workers dedicados activos: {sum(obtener_threads_activos().values())}")
+
     return True
 
 
 def obtener_threads_activos() -> Dict[str, bool]:
     """
-    Obtener lista de threads activos
-    
+    Obtener lista de workers dedicados lanzados desde esta app
+    (conserva el nombre anterior, de cuando eran threads)
+
     Returns:
         Diccionario con nombre de lote y estado (True = activo)
     """
     return {
-        lote: thread.is_alive() 
-        for lote, thread in active_threads.items()
+        lote: proceso.poll() is None
+        for lote, proceso in procesos_activos.items()
     }
 
 
-def detener_verificacion_background(lote_nombre: str, supabase_url: str = None, 
+def detener_verificacion_background(lote_nombre: str, supabase_url: str = None,
                                     supabase_key: str = None) -> bool:
     """
     Detener verificación en background marcando el proceso como DETENIDO
-    El thread verificará el estado y se detendrá en la siguiente iteración
-    
+    El worker deja de despacharlo en su siguiente refresco y, si es el
+    dedicado a este lote, termina solo
+
     Args:
         lote_nombre: Nombre del lote a detener
         supabase_url: URL de Supabase
         supabase_key: Key de Supabase
-    
+
     Returns:
         True si se marcó como detenido correctamente
     """
@@ -148,19 +155,14 @@ def detener_verificacion_background(lote_nombre: str, supabase_url: str = None,
         if not supabase_url or not supabase_key:
             supabase_url = os.getenv("SUPABASE_URL")
             supabase_key = os.getenv("SUPABASE_SERVICE_KEY")
-        
-        # Crear verificador para actualizar estado
-        verificador = VerificadorICCID(supabase_url, supabase_key)
-        
-        # Marcar como detenido en la base de datos
-        verificador.supabase.table("proceso_verificacion").update({
-            "estado": "DETENIDO"
-        }).eq("lote", lote_nombre).execute()
-        
+
+        # Marcar como detenido en el almacenamiento (cliente compartido, sin conexión nueva)
+        crear_almacenamiento(supabase_url, supabase_key).cambiar_estado_proceso(lote_nombre, "DETENIDO")
+
         logger.info(f"⏹️ Proceso marcado como DETENIDO: {lote_nombre}")
-        
+
         return True
-        
+
     except Exception as e:
         logger.error(f"❌ Error al detener proceso {lote_nombre}: {e}")
         return False
@@ -169,4 +171,4 @@ def detener_verificacion_background(lote_nombre: str, supabase_url: str = None,
 if __name__ == "__main__":
     # Prueba básica
     print("✓ Módulo de background worker cargado correctamente")
-    print(f"✓ Threads activos: {len(active_threads)}")
+    print(f"✓ Workers dedicados activos: {len(procesos_activos)}")
@@ -0,0 +1,119 @@
+"""
+Circuit breaker del portal BAIT
+Cuando el portal está caído o limitando, cada ICCID se come el timeout de la
+página y queda como ERROR. El circuito se abre si la proporción de fallos en
+los últimos CIRCUITO_VENTANA resultados llega a CIRCUITO_UMBRAL: mientras está
+abierto no se despacha nada (las ICCIDs siguen PENDIENTE) y, pasado el tiempo
+de espera, una sola verificación de prueba (semiabierto) decide si se cierra o
+se vuelve a abrir con una espera mayor. La prueba se identifica por su ICCID:
+los resultados de verificaciones despachadas antes de abrir no cuentan.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+CERRADO = "CERRADO"
+ABIERTO = "ABIERTO"
+SEMIABIERTO = "SEMIABIERTO"
+
+# Resultados recientes que se evalúan y mínimo de muestras para abrir
+CIRCUITO_VENTANA = int(os.getenv("CIRCUITO_VENTANA", "20"))
+CIRCUITO_MINIMO = int(os.getenv("CIRCUITO_MINIMO", "10"))
+
+# Proporción de fallos (0-1) en la ventana que abre el circuito
+CIRCUITO_UMBRAL = float(os.getenv("CIRCUITO_UMBRAL", "0.5"))
+
+# Segundos abierto antes de la primera prueba; se duplica con cada prueba fallida
+CIRCUITO_ESPERA = int(os.getenv("CIRCUITO_ESPERA", "60"))
+CIRCUITO_ESPERA_MAXIMA = 900
+
+
+class CircuitoPortal:
+    """Estado del circuito de un worker; los métodos son seguros entre slots"""
+
+    def __init__(self, ventana: int = CIRCUITO_VENTANA, minimo: int = CIRCUITO_MINIMO,
+                 umbral: float = CIRCUITO_UMBRAL, espera: int = CIRCUITO_ESPERA):
+        self.minimo = minimo
+        self.umbral = umbral
+        self.espera_base = espera
+        self.estado = CERRADO
+        self._resultados = deque(maxlen=ventana)
+        self._espera = espera
+        self._reintento: Optional[float] = None  # time.time() de la siguiente prueba
+        self._sonda: Optional[str] = None  # ICCID de la prueba en curso (semiabierto)
+        self._lock = threading.Lock()
+
+    def tasa_fallos(self) -> float:
+        with self._lock:
+            return self._tasa_fallos()
+
+    def _tasa_fallos(self) -> float:
+        if not self._resultados:
+            return 0.0
+        return sum(1 for exito in self._resultados if not exito) / len(self._resultados)
+
+    def _abrir(self, espera: int):
+        self.estado = ABIERTO
+        self._espera = espera
+        self._reintento = time.time() + espera
+        self._sonda = None
+
+    def disponible(self) -> bool:
+        """¿Se puede despachar una ICCID? (no cambia el estado)"""
+        with self._lock:
+            if self.estado == CERRADO:
+                return True
+            if self.estado == ABIERTO:
+                return time.time() >= self._reintento
+            return self._sonda is None
+
+    def despachar(self, iccid: str):
+        """Marcar que salió una ICCID; abierto y vencido pasa a semiabierto con ella como prueba"""
+        with self._lock:
+            if self.estado != CERRADO:
+                self.estado = SEMIABIERTO
+                self._sonda = iccid
+
+    def registrar(self, exito: bool, iccid: str) -> str:
+        """Registrar el resultado de la verificación de `iccid`; regresa el estado resultante"""
+        with self._lock:
+            if self.estado == CERRADO:
+                self._resultados.append(exito)
+                if len(self._resultados) >= self.minimo and self._tasa_fallos() >= self.umbral:
+                    self._abrir(self.espera_base)
+                return self.estado
+
+            # Abierto o semiabierto: solo decide la prueba; lo despachado antes de abrir se ignora
+            if self.estado == SEMIABIERTO and iccid == self._sonda:
+                if exito:
+                    self.estado = CERRADO
+                    self._resultados.clear()
+                    self._espera = self.espera_base
+                    self._reintento = None
+                    self._sonda = None
+                else:
+                    self._abrir(min(self._espera * 2, CIRCUITO_ESPERA_MAXIMA))
+            return self.estado
+
+    def abrir_hasta(self, reintento: datetime):
+        """Abrir por el circuito de otro worker (mismo portal) hasta `reintento`"""
+        with self._lock:
+            segundos = reintento.timestamp() - time.time()
+            if self.estado == CERRADO and segundos > 0:
+                self._abrir(int(segundos))
+
+    def resumen(self) -> Dict:
+        """Columnas publicadas en proceso_verificacion"""
+        with self._lock:
+            reintento = None
+            if self.estado != CERRADO and self._reintento:
+                reintento = datetime.fromtimestamp(self._reintento, timezone.utc).isoformat()
+            return {
+                "circuito_estado": self.estado,
+                "circuito_tasa_fallos": round(self._tasa_fallos(), 2),
+                "circuito_reintento": reintento
+            }
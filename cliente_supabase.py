@@ -0,0 +1,117 @@
+"""
+Cliente de Supabase compartido por proceso
+Un solo cliente (y un solo pool de conexiones HTTP keep-alive) por URL/key,
+reutilizado por la app, el worker daemon y los hilos en background, en lugar
+de abrir conexiones y handshakes TLS nuevos en cada VerificadorICCID()
+"""
+
+import os
+import importlib.util
+import threading
+from typing import Dict, Optional, Tuple
+
+import httpx
+from supabase import create_client, Client
+
+try:
+    from supabase import SyncClientOptions
+except ImportError:  # versiones antiguas de supabase-py
+    SyncClientOptions = None
+
+# HTTP/2 solo si está instalado h2 (httpx[http2])
+HTTP2_DISPONIBLE = importlib.util.find_spec("h2") is not None
+
+# Límites del pool compartido
+LIMITES_POOL = httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=120)
+TIMEOUT_HTTP = httpx.Timeout(30.0, connect=10.0)
+
+_clientes: Dict[Tuple[str, str], Client] = {}
+_lock_clientes = threading.Lock()
+
+_metricas = {
+    "conexiones_abiertas": 0,
+    "handshakes_tls": 0,
+    "peticiones": 0,
+}
+_lock_metricas = threading.Lock()
+
+
+def _sumar_metrica(nombre: str):
+    with _lock_metricas:
+        _metricas[nombre] += 1
+
+
+def _trazar_conexion(evento: str, info: dict):
+    """Callback de traza de httpcore: cuenta conexiones TCP y handshakes TLS nuevos"""
+    if evento == "connection.connect_tcp.complete":
+        _sumar_metrica("conexiones_abiertas")
+    elif evento == "connection.start_tls.complete":
+        _sumar_metrica("handshakes_tls")
+
+
+def _al_enviar_peticion(request: httpx.Request):
+    """Hook de httpx: cuenta la petición y activa la traza de conexión"""
+    _sumar_metrica("peticiones")
+    request.extensions["trace"] = _trazar_conexion
+
+
+def _crear_http_client() -> httpx.Client:
+    """Crear el cliente HTTP con keep-alive (y HTTP/2 si está disponible)"""
+    return httpx.Client(
+        http2=HTTP2_DISPONIBLE,
+        limits=LIMITES_POOL,
+        timeout=TIMEOUT_HTTP,
+        event_hooks={"request": [_al_enviar_peticion]},
+    )
+
+
+def _crear_cliente(url: str, key: str) -> Client:
+    http_client = _crear_http_client()
+
+    try:
+        # supabase-py >= 2.16 acepta un httpx.Client propio
+        cliente = create_client(url, key, options=SyncClientOptions(httpx_client=http_client))
+    except TypeError:
+        http_client.close()
+        cliente = create_client(url, key)
+        # Versiones anteriores: conservar su sesión (ya es keep-alive) y solo medirla
+        cliente.postgrest.session.event_hooks["request"].append(_al_enviar_peticion)
+
+    # Inicializar el cliente de PostgREST aquí, bajo el lock, y no en el primer
+    # uso concurrente desde varios hilos
+    cliente.postgrest
+    return cliente
+
+
+def obtener_cliente(url: Optional[str] = None, key: Optional[str] = None) -> Client:
+    """
+    Obtener el cliente de Supabase compartido del proceso
+
+    Es seguro usarlo desde varios hilos: httpx.Client es thread-safe y cada
+    llamada a .table()/.rpc() construye su propia petición.
+
+    Args:
+        url: URL de Supabase (por defecto SUPABASE_URL)
+        key: Service key (por defecto SUPABASE_SERVICE_KEY)
+    """
+    url = url or os.getenv("SUPABASE_URL")
+    key = key or os.getenv("SUPABASE_SERVICE_KEY")
+
+    if not url or not key:
+        raise ValueError("Faltan credenciales de Supabase (SUPABASE_URL / SUPABASE_SERVICE_KEY)")
+
+    with _lock_clientes:
+        cliente = _clientes.get((url, key))
+        if cliente is None:
+            cliente = _crear_cliente(url, key)
+            _clientes[(url, key)] = cliente
+        return cliente
+
+
+def obtener_metricas() -> Dict:
+    """Contadores del proceso: conexiones abiertas, handshakes TLS y peticiones enviadas"""
+    with _lock_metricas:
+        metricas = dict(_metricas)
+    metricas["http2"] = HTTP2_DISPONIBLE
+    metricas["clientes"] = len(_clientes)
+    return metricas
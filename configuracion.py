@@ -0,0 +1,115 @@
+"""
+Configuración de velocidad editable en caliente
+Los parámetros que marcan el ritmo de la verificación (pausas, timeouts,
+espera del popup, tamaño del buffer, intervalo de refresco del daemon) se leen de la
+tabla `configuracion` con una caché de CONFIGURACION_TTL segundos: un cambio
+hecho desde la página de Configuración llega a todos los workers sin
+reconstruir la imagen ni reiniciarlos. Una clave sin fila en la tabla usa su
+valor por defecto, así que borrar las filas es el rollback.
+"""
+
+import logging
+import os
+import threading
+import time
+from typing import Dict, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+# Segundos que un worker reutiliza los valores leídos antes de volver a la tabla
+CONFIGURACION_TTL = int(os.getenv("CONFIGURACION_TTL", "30"))
+
+Numero = Union[int, float]
+
+# clave -> valor por defecto (su tipo es el del parámetro), rango permitido y descripción
+PARAMETROS: Dict[str, Dict] = {
+    "delay_entre_verificaciones": {
+        "defecto": 3.0, "minimo": 0.5, "maximo": 60.0,
+        "descripcion": "Pausa de cada slot entre verificaciones (segundos)"
+    },
+    "timeout_pagina": {
+        "defecto": 15000, "minimo": 1000, "maximo": 120000,
+        "descripcion": "Timeout de carga del portal (milisegundos)"
+    },
+    "espera_popup": {
+        "defecto": 5.0, "minimo": 0.0, "maximo": 30.0,
+        "descripcion": "Espera fija tras Enter antes de buscar el popup (segundos)"
+    },
+    "intentos_popup": {
+        "defecto": 10, "minimo": 1, "maximo": 60,
+        "descripcion": "Revisiones del popup, cada 0.5 s, después de la espera fija"
+    },
+    "tamano_buffer": {
+        "defecto": 50, "minimo": 1, "maximo": 1000,
+        "descripcion": "ICCIDs reclamadas por lote en cada relleno del planificador"
+    },
+    "intervalo_refresco": {
+        # Por debajo de DURACION_LEASE (30 s): el refresco también renueva los leases
+        "defecto": 5, "minimo": 1, "maximo": 20,
+        "descripcion": "Segundos entre refrescos del worker daemon con lotes activos"
+    },
+}
+
+
+def valores_por_defecto() -> Dict[str, Numero]:
+    return {clave: parametro["defecto"] for clave, parametro in PARAMETROS.items()}
+
+
+def convertir(clave: str, valor) -> Optional[Numero]:
+    """Valor guardado (texto) al tipo del parámetro, acotado a su rango; None si no es válido"""
+    parametro = PARAMETROS.get(clave)
+    if parametro is None:
+        return None
+    tipo = type(parametro["defecto"])
+    try:
+        numero = tipo(float(valor))
+    except (TypeError, ValueError):
+        return None
+    return min(max(numero, tipo(parametro["minimo"])), tipo(parametro["maximo"]))
+
+
+class ConfiguracionDinamica:
+    """Valores de `configuracion` con caché por TTL; seguro entre hilos"""
+
+    def __init__(self, almacenamiento, ttl: int = CONFIGURACION_TTL):
+        self.almacenamiento = almacenamiento
+        self.ttl = ttl
+        self._valores = valores_por_defecto()
+        self._leido_en: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def obtener(self, clave: str) -> Numero:
+        with self._lock:
+            if self._leido_en is None or time.monotonic() - self._leido_en >= self.ttl:
+                self._recargar()
+            return self._valores[clave]
+
+    def valores(self) -> Dict[str, Numero]:
+        with self._lock:
+            if self._leido_en is None or time.monotonic() - self._leido_en >= self.ttl:
+                self._recargar()
+            return dict(self._valores)
+
+    def _recargar(self):
+        # Aun si la lectura falla se espera un TTL completo: sin la tabla no se insiste en cada ICCID
+        self._leido_en = time.monotonic()
+        try:
+            guardados = self.almacenamiento.leer_configuracion()
+        except Exception as e:
+            logger.warning(f"⚠️ No se pudo leer la configuración; se conservan los valores actuales: {e}")
+            return
+
+        nuevos = valores_por_defecto()
+        for clave, valor in guardados.items():
+            if clave not in PARAMETROS:
+                continue  # Clave de una versión anterior (p. ej. tamano_bloque, max_reintentos)
+            convertido = convertir(clave, valor)
+            if convertido is None:
+                logger.warning(f"⚠️ Configuración ignorada: {clave}={valor!r}")
+            else:
+                nuevos[clave] = convertido
+
+        for clave, valor in nuevos.items():
+            if valor != self._valores[clave]:
+                logger.info(f"⚙️ Configuración {clave}: {self._valores[clave]} -> {valor}")
+        self._valores = nuevos
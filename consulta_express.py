@@ -0,0 +1,44 @@
+"""
+Consultas express: verificación de una sola ICCID bajo demanda
+La solicitud se encola en consultas_express y la atiende el primer slot libre
+de un worker en marcha, con su navegador ya abierto y antes que el trabajo por
+lotes; el resultado se escribe en la misma fila. Lo usan la página de la app y
+la API local (api_express.py).
+"""
+
+import time
+from typing import Dict, Optional
+
+from almacenamiento import AlmacenamientoBase
+from verificador_motor import VerificadorICCID
+
+# Segundos máximos esperando la respuesta del worker
+ESPERA_RESPUESTA = 60
+
+# Segundos entre lecturas del estado de la consulta
+INTERVALO_SONDEO = 1
+
+
+def solicitar(almacenamiento: AlmacenamientoBase, iccid: str) -> Dict:
+    """
+    Encolar una consulta express y regresar la fila creada
+
+    Raises:
+        ValueError: si la ICCID no tiene al menos 13 dígitos
+    """
+    iccid_completo = iccid.strip().upper()
+    ultimos_13_digitos = VerificadorICCID.extraer_ultimos_13_digitos(iccid_completo)
+    if len(ultimos_13_digitos) != 13 or not ultimos_13_digitos.isdigit():
+        raise ValueError(f"ICCID inválida: {iccid!r}")
+    return almacenamiento.crear_consulta_express(iccid_completo, ultimos_13_digitos)
+
+
+def esperar_respuesta(almacenamiento: AlmacenamientoBase, consulta_id: int,
+                      timeout: float = ESPERA_RESPUESTA) -> Optional[Dict]:
+    """Esperar a que un worker responda; regresa la fila (estado LISTA o la última vista)"""
+    limite = time.monotonic() + timeout
+    consulta = almacenamiento.obtener_consulta_express(consulta_id)
+    while consulta and consulta['estado'] != "LISTA" and time.monotonic() < limite:
+        time.sleep(INTERVALO_SONDEO)
+        consulta = almacenamiento.obtener_consulta_express(consulta_id)
+    return consulta
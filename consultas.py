@@ -0,0 +1,201 @@
+"""
+Consultas paginadas sobre la tabla verificacion_iccids
+Usa paginación por llave (keyset sobre id) para recorrer lotes completos
+sin depender del límite de 1000 filas por petición de PostgREST
+"""
+
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional
+
+# Columnas que se muestran y exportan en "Consultar Resultados"
+COLUMNAS_RESULTADOS = [
+    'iccid_completo', 'ultimos_13_digitos', 'estatus',
+    'numero_asignado', 'lote', 'fecha_verificacion', 'observaciones'
+]
+
+# Tamaño de página por petición (igual al máximo por defecto de PostgREST)
+TAMANO_PAGINA = 1000
+
+
+# Columnas por las que se puede ordenar el navegador de resultados; deben ser
+# únicas para poder paginar por llave
+ORDENES_NAVEGACION = {"id": "Orden de carga", "iccid_completo": "ICCID"}
+
+
+def aplicar_filtros(query, lote: Optional[str] = None, estatus: Optional[str] = None,
+                    fecha_desde: Optional[str] = None, fecha_hasta: Optional[str] = None):
+    """
+    Aplicar los filtros de la página de resultados a una consulta de Supabase
+
+    fecha_desde es inclusiva y fecha_hasta exclusiva (ISO 8601, sobre fecha_verificacion)
+    """
+    if lote and lote != "Todos":
+        query = query.eq("lote", lote)
+
+    if estatus and estatus != "Todos":
+        query = query.eq("estatus", estatus)
+
+    if fecha_desde:
+        query = query.gte("fecha_verificacion", fecha_desde)
+
+    if fecha_hasta:
+        query = query.lt("fecha_verificacion", fecha_hasta)
+
+    return query
+
+
+def iterar_registros(supabase, lote: Optional[str] = None, estatus: Optional[str] = None,
+                     columnas: List[str] = None, tamano_pagina: int = TAMANO_PAGINA) -> Iterator[Dict]:
+    """
+    Recorrer todos los registros que cumplen el filtro, página por página
+
+    Cada página pide las filas con id mayor al último id recibido, por lo que
+    el costo de la página 500 es el mismo que el de la primera (a diferencia
+    de OFFSET). Solo una página vive en memoria a la vez.
+
+    Args:
+        supabase: Cliente de Supabase
+        lote: Lote a filtrar (None o "Todos" = todos)
+        estatus: Estatus a filtrar (None o "Todos" = todos)
+        columnas: Columnas a seleccionar (por defecto COLUMNAS_RESULTADOS)
+        tamano_pagina: Filas por petición
+
+    Yields:
+        Diccionario por registro, en orden de id
+    """
+    columnas = columnas or COLUMNAS_RESULTADOS
+    seleccion = ", ".join(["id"] + [c for c in columnas if c != "id"])
+    ultimo_id = 0
+
+    while True:
+        query = supabase.table("verificacion_iccids").select(seleccion).gt("id", ultimo_id)
+        query = aplicar_filtros(query, lote, estatus)
+        response = query.order("id").limit(tamano_pagina).execute()
+
+        filas = response.data
+        if not filas:
+            break
+
+        for fila in filas:
+            yield fila
+
+        # No se corta con len(filas) < tamano_pagina: el servidor puede tener
+        # un max-rows menor y devolver páginas más cortas que las pedidas
+        ultimo_id = filas[-1]["id"]
+
+
+def obtener_pagina(supabase, lote: Optional[str] = None, estatus: Optional[str] = None,
+                   fecha_desde: Optional[str] = None, fecha_hasta: Optional[str] = None,
+                   orden: str = "id", descendente: bool = False, despues_de=None,
+                   tamano: int = 100, columnas: List[str] = None) -> List[Dict]:
+    """
+    Obtener una página del navegador de resultados
+
+    Pagina por llave sobre la columna de orden: la página siguiente pide las
+    filas posteriores al valor de la última fila mostrada (despues_de), así
+    que la página 400 cuesta lo mismo que la primera.
+
+    Args:
+        orden: Columna única de ORDENES_NAVEGACION
+        descendente: Orden descendente
+        despues_de: Valor de la columna de orden en la última fila de la página
+                    anterior (None = primera página)
+        tamano: Filas por página
+    """
+    if orden not in ORDENES_NAVEGACION:
+        raise ValueError(f"Orden no soportado: {orden}")
+
+    columnas = columnas or COLUMNAS_RESULTADOS
+    seleccion = ", ".join(["id"] + [c for c in columnas if c != "id"])
+
+    query = supabase.table("verificacion_iccids").select(seleccion)
+    query = aplicar_filtros(query, lote, estatus, fecha_desde, fecha_hasta)
+    if despues_de is not None:
+        query = query.lt(orden, despues_de) if descendente else query.gt(orden, despues_de)
+
+    response = query.order(orden, desc=descendente).limit(tamano).execute()
+    return response.data or []
+
+
+def contar_registros(supabase, lote: Optional[str] = None, estatus: Optional[str] = None,
+                     fecha_desde: Optional[str] = None, fecha_hasta: Optional[str] = None) -> int:
+    """Número total de registros que cumplen los filtros (count exacto en el servidor)"""
+    query = supabase.table("verificacion_iccids").select("id", count="exact")
+    query = aplicar_filtros(query, lote, estatus, fecha_desde, fecha_hasta)
+    response = query.limit(1).execute()
+    return response.count or 0
+
+
+# Cursor inicial para un consumidor que nunca ha exportado
+CURSOR_INICIAL = {"ultimo_updated_at": "1970-01-01T00:00:00+00:00", "ultimo_id": 0}
+
+
+def iterar_cambios(supabase, desde: str, desde_id: int = 0, hasta: Optional[str] = None,
+                   columnas: List[str] = None, tamano_pagina: int = TAMANO_PAGINA) -> Iterator[Dict]:
+    """
+    Recorrer los registros modificados después de (desde, desde_id)
+
+    Pagina por la llave compuesta (updated_at, id), que mantiene el trigger
+    update_updated_at_column, usando el índice idx_updated_at_id.
+
+    Args:
+        supabase: Cliente de Supabase
+        desde: updated_at del último registro ya exportado (ISO 8601)
+        desde_id: id del último registro ya exportado (desempate)
+        hasta: Cota superior de updated_at (ISO 8601); None = sin cota
+        columnas: Columnas a seleccionar (se agregan id y updated_at)
+        tamano_pagina: Filas por petición
+
+    Yields:
+        Diccionario por registro, en orden de (updated_at, id)
+    """
+    columnas = columnas or COLUMNAS_RESULTADOS
+    seleccion = ", ".join(["id", "updated_at"] + [c for c in columnas if c not in ("id", "updated_at")])
+    ultimo_updated_at, ultimo_id = desde, desde_id
+
+    while True:
+        query = supabase.table("verificacion_iccids").select(seleccion).or_(
+            f'updated_at.gt."{ultimo_updated_at}",'
+            f'and(updated_at.eq."{ultimo_updated_at}",id.gt.{ultimo_id})'
+        )
+        if hasta:
+            query = query.lte("updated_at", hasta)
+        response = query.order("updated_at").order("id").limit(tamano_pagina).execute()
+
+        filas = response.data
+        if not filas:
+            break
+
+        for fila in filas:
+            yield fila
+
+        ultimo_updated_at, ultimo_id = filas[-1]["updated_at"], filas[-1]["id"]
+
+
+def obtener_cursor_exportacion(supabase, consumidor: str) -> Dict:
+    """Obtener el cursor de exportación incremental de un consumidor"""
+    response = supabase.table("exportacion_cursores").select(
+        "ultimo_updated_at, ultimo_id"
+    ).eq("consumidor", consumidor).execute()
+
+    if response.data:
+        return response.data[0]
+    return dict(CURSOR_INICIAL)
+
+
+def guardar_cursor_exportacion(supabase, consumidor: str, ultimo_updated_at: str,
+                               ultimo_id: int, exportados: int):
+    """Avanzar el cursor de un consumidor tras una exportación entregada"""
+    supabase.table("exportacion_cursores").upsert({
+        "consumidor": consumidor,
+        "ultimo_updated_at": ultimo_updated_at,
+        "ultimo_id": ultimo_id,
+        "ultimos_exportados": exportados,
+        "fecha_actualizacion": datetime.now(timezone.utc).isoformat()
+    }, on_conflict="consumidor").execute()
+
+
+def listar_consumidores_exportacion(supabase) -> List[Dict]:
+    """Listar los consumidores con cursor de exportación registrado"""
+    response = supabase.table("exportacion_cursores").select("*").order("consumidor").execute()
+    return response.data or []
@@ -0,0 +1,71 @@
+"""
+Estimación por muestreo de la proporción de ACTIVA / INACTIVA de un lote
+En modo muestra se verifica una muestra aleatoria estratificada de las ICCIDs
+PENDIENTE (estratos = tramos consecutivos por id, que en un embarque
+corresponden a cajas) en orden intercalado: primero una ICCID de cada
+estrato, luego otra de cada uno... Así la muestra está balanceada en
+cualquier punto en que se corte, y el proceso termina en cuanto el intervalo
+de confianza es más angosto que el margen pedido.
+
+Los intervalos son de Wilson con corrección por población finita. Los ERROR
+no cuentan: la proporción es sobre las ICCIDs con resultado.
+"""
+
+import math
+import os
+from typing import Dict, Optional, Tuple
+
+# z para 95% de confianza
+Z_95 = 1.959964
+
+# Tramos consecutivos por id en que se divide el lote para muestrear
+ESTRATOS_MUESTREO = int(os.getenv("ESTRATOS_MUESTREO", "20"))
+
+# Resultados mínimos antes de dar por alcanzado el margen (evita cortar por suerte)
+MUESTRA_MINIMA = 30
+
+# Márgenes ofrecidos en la UI (mitad del ancho del intervalo, en proporción)
+MARGENES_MUESTREO = [0.01, 0.02, 0.03, 0.05]
+
+
+def tamano_muestra(margen: float, poblacion: int, z: float = Z_95) -> int:
+    """ICCIDs necesarias para el margen en el peor caso (p = 0.5), con corrección por población finita"""
+    if poblacion <= 0:
+        return 0
+    n0 = math.ceil(z * z * 0.25 / (margen * margen))
+    return min(poblacion, math.ceil(n0 / (1 + (n0 - 1) / poblacion)))
+
+
+def intervalo_wilson(exitos: int, n: int, poblacion: Optional[int] = None,
+                     z: float = Z_95) -> Tuple[float, float, float]:
+    """(proporción, límite inferior, límite superior); sin muestra regresa (0, 0, 1)"""
+    if n <= 0:
+        return 0.0, 0.0, 1.0
+    p = exitos / n
+    # Corrección por población finita: la varianza se reduce en (N - n) / (N - 1)
+    if poblacion and poblacion > 1:
+        z = z * math.sqrt(max(poblacion - n, 0) / (poblacion - 1))
+    z2 = z * z
+    centro = (p + z2 / (2 * n)) / (1 + z2 / n)
+    mitad = z * math.sqrt(p * (1 - p) / n + z2 / (4 * n * n)) / (1 + z2 / n)
+    return p, max(0.0, centro - mitad), min(1.0, centro + mitad)
+
+
+def estimar(activas: int, inactivas: int, poblacion: Optional[int] = None) -> Dict:
+    """Proporciones estimadas con su intervalo y el margen actual (mitad del ancho)"""
+    n = activas + inactivas
+    activa = intervalo_wilson(activas, n, poblacion)
+    inactiva = intervalo_wilson(inactivas, n, poblacion)
+    return {
+        "n": n,
+        "activas": activa,
+        "inactivas": inactiva,
+        "margen": (activa[2] - activa[1]) / 2
+    }
+
+
+def objetivo_alcanzado(activas: int, inactivas: int, poblacion: Optional[int], margen: float) -> bool:
+    """¿El intervalo ya es más angosto que el margen pedido?"""
+    if activas + inactivas < MUESTRA_MINIMA:
+        return False
+    return estimar(activas, inactivas, poblacion)["margen"] <= margen
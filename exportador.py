@@ -0,0 +1,257 @@
+"""
+Exportación en streaming de resultados de verificación
+Escribe las filas directamente a un archivo en disco conforme llegan de la
+base de datos, sin construir un DataFrame ni un BytesIO con todo el lote
+"""
+
+import csv
+import gzip
+import os
+import tempfile
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import xlsxwriter
+
+from consultas import (COLUMNAS_RESULTADOS, guardar_cursor_exportacion, iterar_cambios,
+                       obtener_cursor_exportacion)
+
+# Formatos disponibles: nombre visible -> (extensión, mime)
+FORMATOS_EXPORTACION = {
+    "CSV": (".csv", "text/csv"),
+    "CSV comprimido (gzip)": (".csv.gz", "application/gzip"),
+    "Excel (xlsx)": (".xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+}
+
+# Límite de filas por hoja de Excel (sin contar el encabezado)
+MAX_FILAS_HOJA_XLSX = 1048575
+
+# Cada cuántas filas se invoca el callback de progreso
+INTERVALO_PROGRESO = 5000
+
+# Columnas de la exportación incremental (incluye la llave del cursor)
+COLUMNAS_DELTA = ['id', 'updated_at'] + COLUMNAS_RESULTADOS
+
+# Margen para no exportar cambios de transacciones que aún podrían confirmarse
+# con un updated_at anterior (NOW() es la hora de inicio de la transacción)
+MARGEN_DELTA_SEGUNDOS = 60
+
+
+def _escribir_csv(filas: Iterable[Dict], archivo, columnas: List[str],
+                  callback_progreso: Optional[Callable[[int], None]] = None) -> int:
+    """Escribir filas como CSV en un archivo de texto ya abierto"""
+    writer = csv.DictWriter(archivo, fieldnames=columnas, extrasaction='ignore')
+    writer.writeheader()
+
+    total = 0
+    for fila in filas:
+        writer.writerow(fila)
+        total += 1
+        if callback_progreso and total % INTERVALO_PROGRESO == 0:
+            callback_progreso(total)
+
+    return total
+
+
+def exportar_csv(filas: Iterable[Dict], ruta: str, columnas: List[str],
+                 callback_progreso: Optional[Callable[[int], None]] = None) -> int:
+    """Exportar filas a un archivo CSV (UTF-8 con BOM para que Excel lo abra bien)"""
+    with open(ruta, "w", newline="", encoding="utf-8-sig") as archivo:
+        return _escribir_csv(filas, archivo, columnas, callback_progreso)
+
+
+def exportar_csv_gzip(filas: Iterable[Dict], ruta: str, columnas: List[str],
+                      callback_progreso: Optional[Callable[[int], None]] = None) -> int:
+    """Exportar filas a un archivo CSV comprimido con gzip"""
+    with gzip.open(ruta, "wt", newline="", encoding="utf-8") as archivo:
+        return _escribir_csv(filas, archivo, columnas, callback_progreso)
+
+
+def exportar_xlsx(filas: Iterable[Dict], ruta: str, columnas: List[str],
+                  callback_progreso: Optional[Callable[[int], None]] = None) -> int:
+    """
+    Exportar filas a Excel con xlsxwriter en modo constant_memory
+
+    En este modo cada fila se vacía a disco al pasar a la siguiente, por lo que
+    la memoria usada no depende del tamaño del lote. Si se supera el límite de
+    filas de una hoja se continúa en una hoja nueva.
+    """
+    workbook = xlsxwriter.Workbook(ruta, {"constant_memory": True})
+    try:
+        encabezado = workbook.add_format({"bold": True})
+        hoja = None
+        numero_hoja = 0
+        fila_hoja = 0
+        total = 0
+
+        for fila in filas:
+            if hoja is None or fila_hoja > MAX_FILAS_HOJA_XLSX:
+                numero_hoja += 1
+                nombre = "Resultados" if numero_hoja == 1 else f"Resultados_{numero_hoja}"
+                hoja = workbook.add_worksheet(nombre)
+                hoja.write_row(0, 0, columnas, encabezado)
+                fila_hoja = 1
+
+            # write_string evita que xlsxwriter convierta los ICCIDs a número
+            for col, nombre_columna in enumerate(columnas):
+                valor = fila.get(nombre_columna)
+                if valor is not None:
+                    hoja.write_string(fila_hoja, col, str(valor))
+
+            fila_hoja += 1
+            total += 1
+            if callback_progreso and total % INTERVALO_PROGRESO == 0:
+                callback_progreso(total)
+
+        if hoja is None:
+            hoja = workbook.add_worksheet("Resultados")
+            hoja.write_row(0, 0, columnas, encabezado)
+
+        return total
+    finally:
+        workbook.close()
+
+
+_EXPORTADORES = {
+    "CSV": exportar_csv,
+    "CSV comprimido (gzip)": exportar_csv_gzip,
+    "Excel (xlsx)": exportar_xlsx,
+}
+
+
+def exportar_a_archivo(filas: Iterable[Dict], formato: str, columnas: List[str],
+                       prefijo: str = "resultados_iccids",
+                       callback_progreso: Optional[Callable[[int], None]] = None) -> Tuple[str, str, int]:
+    """
+    Exportar filas a un archivo temporal en el formato indicado
+
+    Args:
+        filas: Iterable de registros (puede ser un generador paginado)
+        formato: Una de las llaves de FORMATOS_EXPORTACION
+        columnas: Columnas a escribir, en orden
+        prefijo: Prefijo del nombre de archivo sugerido para la descarga
+        callback_progreso: Función que recibe el número de filas escritas
+
+    Returns:
+        Tuple[ruta_temporal, nombre_descarga, total_filas]
+    """
+    if formato not in _EXPORTADORES:
+        raise ValueError(f"Formato de exportación no soportado: {formato}")
+
+    extension, _ = FORMATOS_EXPORTACION[formato]
+    nombre_descarga = f"{prefijo}_{datetime.now().strftime('%Y%m%d_%H%M%S')}{extension}"
+
+    descriptor, ruta = tempfile.mkstemp(prefix="export_iccids_", suffix=extension)
+    os.close(descriptor)
+
+    try:
+        total = _EXPORTADORES[formato](filas, ruta, columnas, callback_progreso)
+    except Exception:
+        os.remove(ruta)
+        raise
+
+    return ruta, nombre_descarga, total
+
+
+def exportar_copy_a_archivo(postgres, formato: str, lote: Optional[str], estatus: Optional[str],
+                            columnas: List[str], prefijo: str = "resultados_iccids",
+                            callback_progreso: Optional[Callable[[int], None]] = None) -> Tuple[str, str, int]:
+    """
+    Exportar a CSV (o CSV gzip) con COPY TO STDOUT sobre la conexión directa
+
+    Mismo contrato que exportar_a_archivo; Postgres genera el CSV y los bytes
+    se escriben tal cual al archivo, sin pasar por JSON ni por dicts de Python.
+    """
+    if formato not in ("CSV", "CSV comprimido (gzip)"):
+        raise ValueError(f"COPY solo soporta CSV, no {formato}")
+
+    extension, _ = FORMATOS_EXPORTACION[formato]
+    nombre_descarga = f"{prefijo}_{datetime.now().strftime('%Y%m%d_%H%M%S')}{extension}"
+
+    descriptor, ruta = tempfile.mkstemp(prefix="export_iccids_", suffix=extension)
+    os.close(descriptor)
+
+    try:
+        abrir = gzip.open if formato == "CSV comprimido (gzip)" else open
+        with abrir(ruta, "wb") as destino:
+            total = postgres.exportar_csv(destino, lote, estatus, columnas, callback_progreso)
+    except Exception:
+        os.remove(ruta)
+        raise
+
+    return ruta, nombre_descarga, total
+
+
+def exportar_delta(supabase, consumidor: str, formato: str,
+                   margen_segundos: int = MARGEN_DELTA_SEGUNDOS,
+                   callback_progreso: Optional[Callable[[int], None]] = None) -> Dict:
+    """
+    Exportar solo los registros modificados desde el cursor del consumidor
+
+    El cursor NO se avanza aquí: la exportación se entrega primero y después se
+    confirma con confirmar_exportacion_delta, para que una descarga fallida no
+    pierda cambios.
+
+    Returns:
+        Diccionario con ruta, nombre, total y el cursor nuevo a confirmar
+    """
+    cursor = obtener_cursor_exportacion(supabase, consumidor)
+    hasta = (datetime.now(timezone.utc) - timedelta(seconds=margen_segundos)).isoformat()
+    ultimo = {"ultimo_updated_at": cursor["ultimo_updated_at"], "ultimo_id": cursor["ultimo_id"]}
+
+    def filas_con_seguimiento():
+        for fila in iterar_cambios(supabase, cursor["ultimo_updated_at"], cursor["ultimo_id"],
+                                   hasta=hasta, columnas=COLUMNAS_DELTA):
+            ultimo["ultimo_updated_at"] = fila["updated_at"]
+            ultimo["ultimo_id"] = fila["id"]
+            yield fila
+
+    ruta, nombre, total = exportar_a_archivo(
+        filas_con_seguimiento(), formato, COLUMNAS_DELTA,
+        prefijo=f"cambios_{consumidor}", callback_progreso=callback_progreso
+    )
+
+    return {
+        "consumidor": consumidor,
+        "ruta": ruta,
+        "nombre": nombre,
+        "total": total,
+        "desde": cursor["ultimo_updated_at"],
+        "cursor_nuevo": ultimo
+    }
+
+
+def confirmar_exportacion_delta(supabase, resultado: Dict):
+    """Avanzar el cursor del consumidor después de entregar una exportación incremental"""
+    if resultado["total"] == 0:
+        return
+
+    guardar_cursor_exportacion(
+        supabase, resultado["consumidor"],
+        resultado["cursor_nuevo"]["ultimo_updated_at"],
+        resultado["cursor_nuevo"]["ultimo_id"],
+        resultado["total"]
+    )
+
+
+if __name__ == "__main__":
+    # Exportación incremental desde línea de comandos para sistemas downstream
+    # Ejemplo: python exportador.py --consumidor crm --formato gzip --salida cambios.csv.gz
+    import argparse
+    import shutil
+    from cliente_supabase import obtener_cliente
+
+    formatos_cli = {"csv": "CSV", "gzip": "CSV comprimido (gzip)", "xlsx": "Excel (xlsx)"}
+
+    parser = argparse.ArgumentParser(description="Exportación incremental de ICCIDs modificados")
+    parser.add_argument("--consumidor", required=True, help="Nombre del cursor del consumidor")
+    parser.add_argument("--formato", choices=formatos_cli.keys(), default="gzip")
+    parser.add_argument("--salida", required=True, help="Ruta del archivo de salida")
+    args = parser.parse_args()
+
+    supabase = obtener_cliente()
+    resultado = exportar_delta(supabase, args.consumidor, formatos_cli[args.formato])
+    shutil.move(resultado["ruta"], args.salida)
+    confirmar_exportacion_delta(supabase, resultado)
+
+    print(f"✓ {resultado['total']:,} registros modificados desde {resultado['desde']} -> {args.salida}")
@@ -0,0 +1,201 @@
+"""
+Outbox local (write-ahead) para resultados de verificación
+Cada resultado se escribe primero en un diario SQLite en modo WAL y se
+considera confirmado en cuanto queda en disco. Un hilo replicador lo envía
+a Supabase en lotes, reintentando mientras la base de datos no responda.
+"""
+
+import os
+import re
+import sqlite3
+import threading
+import time
+import logging
+from typing import Callable, Dict, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# Ruta por defecto del diario (se puede cambiar con OUTBOX_RUTA). Cada proceso necesita
+# el suyo: con un WORKER_ID explícito el diario lleva su nombre, así dos workers en el
+# mismo directorio no replican (y aplican dos veces) las mismas filas
+_WORKER_ID = os.getenv("WORKER_ID")
+RUTA_OUTBOX = os.getenv("OUTBOX_RUTA") or (
+    f"outbox_{re.sub(r'[^A-Za-z0-9_-]', '_', _WORKER_ID)}.db" if _WORKER_ID else "outbox_resultados.db"
+)
+
+
+class OutboxResultados:
+    """Diario durable de resultados pendientes de enviar a la base de datos"""
+
+    def __init__(self, ruta: Optional[str] = None):
+        self.ruta = ruta or RUTA_OUTBOX
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.ruta, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+
+        # WAL permite leer mientras se escribe; synchronous=FULL garantiza que
+        # el resultado está en disco antes de darlo por confirmado
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=FULL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS resultados (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                iccid_completo TEXT NOT NULL,
+                estatus TEXT NOT NULL,
+                numero_asignado TEXT,
+                observaciones TEXT,
+                fecha_verificacion TEXT NOT NULL,
+                creado REAL NOT NULL,
+                intentos_envio INTEGER DEFAULT 0,
+                intentos INTEGER
+            )
+        """)
+        # Diarios creados antes de guardar el número de intento
+        columnas = {fila['name'] for fila in self._conn.execute("PRAGMA table_info(resultados)")}
+        if "intentos" not in columnas:
+            self._conn.execute("ALTER TABLE resultados ADD COLUMN intentos INTEGER")
+
+    def registrar(self, iccid_completo: str, estatus: str, numero_asignado: Optional[str],
+                  observaciones: str, fecha_verificacion: str, intentos: Optional[int] = None) -> int:
+        """
+        Agregar un resultado al diario; al regresar ya es durable
+        `intentos` es el contador de la ICCID ya con este intento (None si no se conoce)
+        """
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO resultados (iccid_completo, estatus, numero_asignado, observaciones, "
+                "fecha_verificacion, creado, intentos) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (iccid_completo, estatus, numero_asignado, observaciones, fecha_verificacion, time.time(),
+                 intentos)
+            )
+            return cursor.lastrowid
+
+    def pendientes(self, limite: int = 200) -> List[Dict]:
+        """Obtener los resultados más antiguos aún no enviados"""
+        with self._lock:
+            filas = self._conn.execute(
+                "SELECT * FROM resultados ORDER BY id LIMIT ?", (limite,)
+            ).fetchall()
+        return [dict(fila) for fila in filas]
+
+    def iccids_pendientes(self) -> Set[str]:
+        """ICCIDs con resultado en el diario que la base de datos aún ve como PENDIENTE"""
+        with self._lock:
+            filas = self._conn.execute("SELECT DISTINCT iccid_completo FROM resultados").fetchall()
+        return {fila[0] for fila in filas}
+
+    def contar_pendientes(self) -> int:
+        """Número de resultados en espera de envío"""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM resultados").fetchone()[0]
+
+    def marcar_enviados(self, ids: List[int]):
+        """Eliminar del diario los resultados ya aplicados en la base de datos"""
+        if not ids:
+            return
+        with self._lock:
+            self._conn.executemany("DELETE FROM resultados WHERE id = ?", [(i,) for i in ids])
+
+    def marcar_intento_fallido(self, ids: List[int]):
+        """Registrar un intento de envío fallido (solo informativo)"""
+        if not ids:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE resultados SET intentos_envio = intentos_envio + 1 WHERE id = ?",
+                [(i,) for i in ids]
+            )
+
+
+class ReplicadorOutbox:
+    """
+    Hilo que envía el contenido del outbox a la base de datos en lotes
+
+    Es seguro detenerlo y volver a iniciarlo: lo que no se alcanzó a enviar
+    permanece en el diario y se reenvía en el siguiente arranque.
+    """
+
+    def __init__(self, outbox: OutboxResultados, enviar: Callable[[List[Dict]], None],
+                 tamano_lote: int = 200, intervalo: float = 1.0, espera_maxima: float = 60.0):
+        """
+        Args:
+            outbox: Diario de resultados
+            enviar: Función que aplica una lista de resultados en la base de datos
+                    (debe lanzar excepción si no se aplicaron)
+            tamano_lote: Resultados por envío
+            intervalo: Segundos entre revisiones cuando el diario está vacío
+            espera_maxima: Tope del backoff exponencial tras errores
+        """
+        self.outbox = outbox
+        self.enviar = enviar
+        self.tamano_lote = tamano_lote
+        self.intervalo = intervalo
+        self.espera_maxima = espera_maxima
+        self._despertar = threading.Event()
+        self._detener = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def iniciar(self):
+        """Arrancar el hilo replicador (idempotente)"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._detener.clear()
+        self._thread = threading.Thread(target=self._loop, daemon=True, name="ReplicadorOutbox")
+        self._thread.start()
+
+    def detener(self, timeout: float = 10.0):
+        """Detener el hilo; lo no enviado queda en el diario"""
+        self._detener.set()
+        self._despertar.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def notificar(self):
+        """Avisar que hay resultados nuevos para enviar"""
+        self._despertar.set()
+
+    def enviar_lote(self) -> int:
+        """Enviar un lote del diario; regresa cuántos resultados se aplicaron"""
+        lote = self.outbox.pendientes(self.tamano_lote)
+        if not lote:
+            return 0
+
+        ids = [r["id"] for r in lote]
+        try:
+            self.enviar(lote)
+        except Exception:
+            self.outbox.marcar_intento_fallido(ids)
+            raise
+
+        self.outbox.marcar_enviados(ids)
+        return len(lote)
+
+    def vaciar(self, timeout: float = 60.0) -> bool:
+        """Esperar a que el diario quede vacío; False si se agotó el tiempo"""
+        limite = time.time() + timeout
+        self.notificar()
+        while time.time() < limite:
+            if self.outbox.contar_pendientes() == 0:
+                return True
+            time.sleep(0.2)
+        return self.outbox.contar_pendientes() == 0
+
+    def _loop(self):
+        espera_error = self.intervalo
+
+        while not self._detener.is_set():
+            try:
+                enviados = self.enviar_lote()
+                espera_error = self.intervalo
+                if enviados:
+                    continue
+            except Exception as e:
+                logger.warning(
+                    f"⚠️ No se pudo enviar el outbox ({self.outbox.contar_pendientes()} pendientes): {e}"
+                )
+                self._detener.wait(espera_error)
+                espera_error = min(espera_error * 2, self.espera_maxima)
+                continue
+
+            self._despertar.wait(self.intervalo)
+            self._despertar.clear()
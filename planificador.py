@@ -0,0 +1,704 @@
+"""
+Planificador de lotes del worker daemon
+Reparte las ICCIDs de todos los lotes EJECUTANDO entre N slots de verificación
+(cada uno con su propio navegador) usando stride scheduling: dentro del nivel
+de prioridad más alto que tiene trabajo, cada lote recibe ICCIDs en proporción
+a su peso. Prioridad y peso se leen de proceso_verificacion en cada refresco,
+así que un cambio hecho desde la UI aplica sin reiniciar el daemon.
+
+Con conexión directa a Postgres el planificador escucha el NOTIFY de
+proceso_verificacion y despierta en cuanto se inicia, pausa o cambia un
+proceso; sin ella sigue refrescando cada `intervalo_refresco` segundos (tabla
+configuracion, igual que el tamaño del buffer: se ajustan sin reiniciar).
+
+Las consultas express (una ICCID bajo demanda) van antes que cualquier lote:
+cada slot revisa la cola entre ICCID e ICCID y la atiende con su navegador abierto.
+
+Un lote en modo muestra (margen_objetivo) se llena con una muestra aleatoria
+estratificada en lugar de en orden de id, y se cierra en cuanto la estimación
+de ACTIVA / INACTIVA alcanza el margen pedido (ver estimacion.py).
+"""
+
+import os
+import socket
+import threading
+import time
+import logging
+from collections import deque
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+
+from playwright.sync_api import sync_playwright
+
+from autoajuste import SLOTS_MAXIMOS, AutoajusteConcurrencia
+from circuito import ABIERTO, CERRADO, CircuitoPortal
+from cliente_supabase import obtener_metricas
+from estimacion import ESTRATOS_MUESTREO, estimar, objetivo_alcanzado
+from postgres_directo import CANAL_EXPRESS, CANAL_PROCESOS
+from presupuesto import PresupuestoDiario
+from rendimiento import MedidorRendimiento
+
+logger = logging.getLogger(__name__)
+
+# Slots de verificación concurrentes (un navegador por slot)
+SLOTS_VERIFICACION = int(os.getenv("SLOTS_VERIFICACION", "1"))
+
+# Sondeo de respaldo cuando no hay lotes activos y se escucha el NOTIFY
+INTERVALO_SEGURIDAD = 60
+
+# Zancada base: cada ICCID despachada avanza el pase del lote ZANCADA / peso
+ZANCADA = 10000
+
+# Segundos antes de volver a buscar trabajo en un lote sin ICCIDs disponibles
+ESPERA_SIN_TRABAJO = 5
+
+# Segundos entre revisiones de la cola express sin NOTIFY (con NOTIFY es solo respaldo)
+INTERVALO_EXPRESS = 2
+INTERVALO_EXPRESS_RESPALDO = 30
+
+# Segundos entre sincronizaciones del consumo del día con la base de datos (todos los workers)
+INTERVALO_SINCRONIZAR_PRESUPUESTO = 60
+
+# Identidad del worker para los leases (único por nodo y proceso)
+WORKER_ID = os.getenv("WORKER_ID") or f"{socket.gethostname()}-{os.getpid()}"
+
+# Vigencia del lease; se renueva en cada refresco, así que un worker caído
+# libera sus lotes en a lo más DURACION_LEASE segundos
+DURACION_LEASE = 30
+
+
+def _lease_vigente(proceso: Dict) -> bool:
+    """¿El lease del proceso sigue vigente? (SQLite guarda UTC sin zona, Supabase en ISO con zona)"""
+    if not proceso.get('lease_expira'):
+        return False
+    expira = datetime.fromisoformat(str(proceso['lease_expira']).replace('Z', '+00:00'))
+    if expira.tzinfo is None:
+        expira = expira.replace(tzinfo=timezone.utc)
+    return expira > datetime.now(timezone.utc)
+
+
+class LoteActivo:
+    """Estado en memoria de un lote que el planificador está procesando"""
+
+    def __init__(self, lote: str, total: int, prioridad: int, peso: int, pase: float,
+                 stats: Optional[Dict] = None, muestreo: Optional[Dict] = None):
+        self.lote = lote
+        self.total = total
+        self.prioridad = prioridad
+        self.peso = max(1, peso)
+        self.pase = pase
+        self.estado = "EJECUTANDO"
+
+        self.buffer = deque()
+        self.ultimo_id = 0  # Cursor por id para reclamar el siguiente bloque
+        self.en_vuelo = set()
+        self.sin_pendientes = False
+        self.reintentar_desde = 0.0
+
+        # Contadores acumulados del proceso (al retomar un lote se continúa desde ellos)
+        self.stats = {"procesadas": 0, "activas": 0, "inactivas": 0, "errores": 0, **(stats or {})}
+        self.despachadas = self.stats["procesadas"]
+        self.medidor = MedidorRendimiento()
+
+        # Modo muestra: {"margen", "poblacion"}; None = corrida completa en orden de id
+        self.muestreo = muestreo
+
+    def tiene_cupo(self) -> bool:
+        return self.despachadas < self.total
+
+
+class PlanificadorLotes:
+    """Ejecuta varios lotes a la vez, intercalando sus ICCIDs entre los slots"""
+
+    def __init__(self, verificador, slots: int = SLOTS_VERIFICACION, lote_asignado: Optional[str] = None,
+                 worker_id: str = WORKER_ID, presupuesto: Optional[PresupuestoDiario] = None,
+                 salir_al_terminar: bool = False, slots_maximos: int = SLOTS_MAXIMOS):
+        """
+        Args:
+            verificador: VerificadorICCID (portal, outbox y almacenamiento)
+            slots: Verificaciones concurrentes (nivel inicial si hay autoajuste)
+            lote_asignado: Procesar solo este lote (LOTE_ASIGNADO)
+            worker_id: Identidad con la que se toman los leases
+            presupuesto: Cuota diaria y ventanas (por defecto CUOTA_DIARIA / VENTANAS_VERIFICACION)
+            salir_al_terminar: Terminar ejecutar() cuando no quede ningún lote activo
+            slots_maximos: Tope del autoajuste de concurrencia (apagado si no supera `slots`)
+        """
+        self.verificador = verificador
+        self.worker_id = worker_id
+        self.almacenamiento = verificador.almacenamiento
+        self.slots = max(1, slots)
+        self.lote_asignado = lote_asignado
+        self.salir_al_terminar = salir_al_terminar
+        self.lotes: Dict[str, LoteActivo] = {}
+        self._lock = threading.Lock()
+        self._detener = threading.Event()
+        self._despertar = threading.Event()
+        self.presupuesto = presupuesto or PresupuestoDiario.desde_entorno()
+        self._presupuesto_sincronizado = 0.0
+        self._presupuesto_publicado: Dict[str, Dict] = {}
+        self._escuchando = False
+        self._aviso_express = threading.Event()
+        self._express_revisado = 0.0
+        self._lock_express = threading.Lock()
+        self.circuito = CircuitoPortal()
+        self._circuito_publicado: Dict[str, Dict] = {}
+        self._estado_circuito = CERRADO
+        # Se arrancan hilos hasta el máximo; solo los `autoajuste.nivel` primeros verifican
+        self.autoajuste = AutoajusteConcurrencia(self.slots, slots_maximos)
+
+    def despertar(self, payload: str = ""):
+        """Adelantar el siguiente refresco (llamado por el NOTIFY de proceso_verificacion)"""
+        if payload:
+            logger.info(f"🔔 Cambio en proceso_verificacion: {payload}")
+        self._despertar.set()
+
+    def _al_notificar(self, canal: str, payload: str):
+        if canal == CANAL_EXPRESS:
+            self._aviso_express.set()
+        else:
+            self.despertar(payload)
+
+    # ---------- Consultas express ----------
+
+    def siguiente_express(self) -> Optional[Dict]:
+        """
+        Tomar una consulta express si hay aviso (NOTIFY) o ya tocaba revisar la cola
+        Solo un slot consulta la base de datos por intervalo.
+        """
+        intervalo = INTERVALO_EXPRESS_RESPALDO if self._escuchando else INTERVALO_EXPRESS
+        with self._lock_express:
+            ahora = time.monotonic()
+            if not self._aviso_express.is_set() and ahora - self._express_revisado < intervalo:
+                return None
+            self._aviso_express.clear()
+            self._express_revisado = ahora
+
+        try:
+            consulta = self.almacenamiento.tomar_consulta_express(self.worker_id)
+        except Exception as e:
+            # Sin sql/consultas_express.sql o error de red: no tumbar el navegador del slot
+            logger.warning(f"⚠️ No se pudo revisar la cola express: {e}")
+            return None
+        if consulta:
+            # Puede haber más en cola: que el siguiente slot libre vuelva a revisar
+            self._aviso_express.set()
+        return consulta
+
+    def _atender_express(self, numero: int, page, consulta: Dict):
+        """Verificar una consulta express y escribir el resultado (no consume presupuesto ni lotes)"""
+        logger.info(f"[slot {numero}] ⚡ Consulta express {consulta['id']}: {consulta['iccid_completo']}")
+        try:
+            estatus, numero_asignado, observaciones = self.verificador.verificar_iccid_en_portal(
+                page, consulta['ultimos_13_digitos']
+            )
+        except Exception as e:
+            estatus, numero_asignado, observaciones = "ERROR", None, f"Error al verificar: {e}"
+        self.almacenamiento.responder_consulta_express(consulta['id'], estatus, numero_asignado, observaciones)
+
+    # ---------- Selección de trabajo ----------
+
+    def siguiente_trabajo(self) -> Optional[Tuple[LoteActivo, Dict]]:
+        """Elegir la siguiente ICCID: prioridad más alta primero, luego el menor pase"""
+        with self._lock:
+            # Portal degradado: no despachar (las ICCIDs siguen PENDIENTE)
+            if not self.circuito.disponible():
+                return None
+
+            ahora = time.monotonic()
+            candidatos = [
+                l for l in self.lotes.values()
+                if l.estado == "EJECUTANDO" and l.tiene_cupo() and ahora >= l.reintentar_desde
+            ]
+
+            for prioridad in sorted({l.prioridad for l in candidatos}, reverse=True):
+                nivel = sorted((l for l in candidatos if l.prioridad == prioridad), key=lambda l: l.pase)
+                for lote in nivel:
+                    registro = self._siguiente_registro(lote)
+                    if registro:
+                        # Fuera de ventana, sin cuota o antes de tiempo según el ritmo del día
+                        if self.presupuesto and not self.presupuesto.tomar_turno():
+                            lote.buffer.appendleft(registro)
+                            return None
+                        self.circuito.despachar(registro['iccid_completo'])
+                        lote.pase += ZANCADA / lote.peso
+                        lote.despachadas += 1
+                        lote.en_vuelo.add(registro['iccid_completo'])
+                        return lote, registro
+        return None
+
+    def _siguiente_registro(self, lote: LoteActivo) -> Optional[Dict]:
+        if not lote.buffer:
+            self._rellenar(lote)
+        return lote.buffer.popleft() if lote.buffer else None
+
+    def _rellenar(self, lote: LoteActivo):
+        """Reclamar el siguiente bloque de pendientes del lote (se llama con el lock tomado)"""
+        en_outbox = self.verificador.outbox.iccids_pendientes()
+
+        if lote.muestreo is not None:
+            # Toda la muestra que falta de una vez (el orden ya viene intercalado por estrato);
+            # si se vacía antes de tiempo (ICCIDs devueltas por el circuito) se sortea de nuevo
+            muestra = self.almacenamiento.muestrear_pendientes(
+                lote.lote, lote.total - lote.despachadas, ESTRATOS_MUESTREO
+            )
+            nuevos = [
+                r for r in muestra
+                if r['iccid_completo'] not in en_outbox and r['iccid_completo'] not in lote.en_vuelo
+            ]
+            lote.buffer.extend(nuevos)
+            lote.sin_pendientes = not nuevos
+            if not nuevos:
+                lote.reintentar_desde = time.monotonic() + ESPERA_SIN_TRABAJO
+            return
+
+        for _ in range(5):
+            reclamados = self.almacenamiento.reclamar_pendientes(
+                lote.lote, self.verificador.configuracion.obtener("tamano_buffer"), despues_de_id=lote.ultimo_id
+            )
+            if reclamados:
+                lote.ultimo_id = reclamados[-1]['id']
+                # Excluir las ya verificadas (en el outbox) y las que otro slot está verificando
+                nuevos = [
+                    r for r in reclamados
+                    if r['iccid_completo'] not in en_outbox and r['iccid_completo'] not in lote.en_vuelo
+                ]
+                if nuevos:
+                    lote.buffer.extend(nuevos)
+                    lote.sin_pendientes = False
+                    return
+                continue
+
+            if lote.ultimo_id == 0:
+                break
+            lote.ultimo_id = 0  # Volver al inicio para recoger las que quedaron atrás
+
+        # Lo que queda está en vuelo o esperando en el outbox
+        lote.sin_pendientes = True
+        lote.reintentar_desde = time.monotonic() + ESPERA_SIN_TRABAJO
+
+    def _completar(self, lote: LoteActivo, registro: Dict, estatus: str):
+        """Registrar el resultado de una ICCID y publicar el progreso del lote"""
+        with self._lock:
+            lote.en_vuelo.discard(registro['iccid_completo'])
+            lote.medidor.registrar()
+            lote.stats["procesadas"] += 1
+            if estatus == "ACTIVA":
+                lote.stats["activas"] += 1
+            elif estatus == "INACTIVA":
+                lote.stats["inactivas"] += 1
+            else:
+                lote.stats["errores"] += 1
+            stats = dict(lote.stats)
+
+            # Modo muestra: con el margen alcanzado no se despacha más; lo que está en vuelo termina
+            if (lote.muestreo is not None and lote.tiene_cupo() and objetivo_alcanzado(
+                    stats["activas"], stats["inactivas"], lote.muestreo["poblacion"], lote.muestreo["margen"])):
+                estimacion = estimar(stats["activas"], stats["inactivas"], lote.muestreo["poblacion"])
+                logger.info(f"🎯 {lote.lote}: margen ±{estimacion['margen']:.1%} alcanzado con "
+                            f"{estimacion['n']:,} ICCIDs (ACTIVA {estimacion['activas'][0]:.1%})")
+                lote.buffer.clear()
+                lote.total = lote.despachadas
+
+            rendimiento = lote.medidor.resumen(lote.total - stats["procesadas"])
+            # Si el lote se soltó mientras esta ICCID estaba en vuelo, el progreso ya es de otro worker
+            if self.lotes.get(lote.lote) is not lote:
+                return
+
+        self.verificador.actualizar_progreso_proceso(
+            lote.lote, stats["procesadas"], stats["activas"], stats["inactivas"], stats["errores"],
+            rendimiento
+        )
+
+    def _liberar(self, lote: LoteActivo, registro: Dict):
+        """Devolver una ICCID que no se pudo verificar para que se vuelva a despachar"""
+        with self._lock:
+            lote.en_vuelo.discard(registro['iccid_completo'])
+            lote.despachadas -= 1
+
+    # ---------- Lotes activos ----------
+
+    def refrescar(self) -> set:
+        """
+        Leer proceso_verificacion: adoptar lotes nuevos y aplicar prioridad, peso y estado
+        Regresa los lotes EJECUTANDO o PAUSADO (de este worker o de otros)
+        """
+        procesos = self.almacenamiento.listar_procesos(["EJECUTANDO", "PAUSADO"])
+
+        # El ritmo del presupuesto es por worker: se reparte entre los que tienen un lease vigente
+        if self.presupuesto:
+            trabajadores = {p['worker_id'] for p in procesos
+                            if p['estado'] == "EJECUTANDO" and p.get('worker_id') and _lease_vigente(p)}
+            trabajadores.add(self.worker_id)
+            self.presupuesto.fijar_trabajadores(len(trabajadores))
+
+        if self.lote_asignado:
+            procesos = [p for p in procesos if p['lote'] == self.lote_asignado]
+
+        with self._lock:
+            # Un lote que llega (o se reanuda) entra con el pase mínimo actual:
+            # ni monopoliza los slots ni espera a que los demás lo alcancen
+            pase_minimo = min((l.pase for l in self.lotes.values() if l.estado == "EJECUTANDO"), default=0.0)
+
+        vigentes = set()
+        for proceso in procesos:
+            nombre = proceso['lote']
+            vigentes.add(nombre)
+            prioridad = proceso.get('prioridad') or 0
+            peso = proceso.get('peso') or 1
+
+            # El circuito abierto de otro worker vale para todos: es el mismo portal
+            if (proceso.get('circuito_estado') == ABIERTO and proceso.get('circuito_reintento')
+                    and proceso.get('worker_id') != self.worker_id):
+                self.circuito.abrir_hasta(
+                    datetime.fromisoformat(str(proceso['circuito_reintento']).replace('Z', '+00:00'))
+                )
+
+            with self._lock:
+                lote = self.lotes.get(nombre)
+                if lote:
+                    if (lote.prioridad, lote.peso) != (prioridad, max(1, peso)):
+                        logger.info(f"🎚️ {nombre}: prioridad {prioridad}, peso {peso}")
+                    lote.prioridad = prioridad
+                    lote.peso = max(1, peso)
+                    if lote.estado == "PAUSADO" and proceso['estado'] == "EJECUTANDO":
+                        lote.pase = max(lote.pase, pase_minimo)
+                    lote.estado = proceso['estado']
+                    continue
+
+            # Solo se adopta con el lease: libre, vencido (worker caído) o ya nuestro
+            if proceso['estado'] == "EJECUTANDO" and self.almacenamiento.tomar_lease(
+                    nombre, self.worker_id, DURACION_LEASE):
+                self._adoptar(proceso, prioridad, peso, pase_minimo)
+
+        # Lotes detenidos desde la UI (o eliminados): dejar de despacharlos
+        with self._lock:
+            for nombre in [n for n in self.lotes if n not in vigentes]:
+                logger.info(f"⏹️ Lote {nombre} ya no está activo; se deja de despachar")
+                del self.lotes[nombre]
+
+        return vigentes
+
+    def _adoptar(self, proceso: Dict, prioridad: int, peso: int, pase: float):
+        nombre = proceso['lote']
+        pendientes = self.almacenamiento.contar_pendientes(nombre)
+        progreso = proceso.get('progreso_actual') or 0
+
+        # Continuar desde los contadores del proceso (puede venir de un worker caído);
+        # progreso_total es el límite pedido desde la UI
+        total = progreso + pendientes
+        if proceso.get('progreso_total'):
+            total = min(total, proceso['progreso_total'])
+
+        if pendientes == 0 or total <= progreso:
+            estado = "COMPLETADO" if pendientes == 0 else "INCOMPLETO"
+            logger.info(f"✅ Lote {nombre} sin trabajo restante ({estado})")
+            self.verificador.finalizar_proceso(nombre, estado)
+            self.almacenamiento.liberar_lease(nombre, self.worker_id)
+            return
+
+        if total != proceso.get('progreso_total'):
+            self.verificador.inicializar_proceso(nombre, total)
+
+        stats = {
+            "procesadas": progreso,
+            "activas": proceso.get('activas') or 0,
+            "inactivas": proceso.get('inactivas') or 0,
+            "errores": proceso.get('errores') or 0
+        }
+        muestreo = None
+        if proceso.get('margen_objetivo'):
+            muestreo = {
+                "margen": float(proceso['margen_objetivo']),
+                "poblacion": proceso.get('poblacion_muestra') or progreso + pendientes
+            }
+        with self._lock:
+            self.lotes[nombre] = LoteActivo(nombre, total, prioridad, peso, pase, stats, muestreo)
+
+        anterior = proceso.get('worker_id')
+        retomado = f", retomado de {anterior}" if anterior and anterior != self.worker_id else ""
+        modo = f", muestra ±{muestreo['margen']:.0%}" if muestreo else ""
+        logger.info(f"🚀 Lote {nombre}: {progreso:,}/{total:,} (prioridad {prioridad}, peso {peso}{modo}{retomado})")
+
+    def latido(self):
+        """Renovar los leases de los lotes activos; soltar los que ya no son de este worker"""
+        with self._lock:
+            nombres = list(self.lotes)
+        if not nombres:
+            return
+
+        conservados = set(self.almacenamiento.renovar_leases(self.worker_id, nombres, DURACION_LEASE))
+        with self._lock:
+            for nombre in nombres:
+                if nombre not in conservados and nombre in self.lotes:
+                    logger.warning(f"⚠️ Lease perdido para el lote {nombre}; se deja de despachar")
+                    del self.lotes[nombre]
+
+    def publicar_presupuesto(self):
+        """
+        Publicar por lote la parte del presupuesto de hoy y la fecha estimada de término
+
+        Los lotes de un nivel de prioridad se reparten el presupuesto en proporción
+        a su peso y empiezan cuando se acaba el trabajo de los niveles superiores.
+        Es una estimación: no redistribuye lo que liberan los lotes que terminan antes.
+        """
+        if not self.presupuesto:
+            return
+
+        if time.monotonic() - self._presupuesto_sincronizado >= INTERVALO_SINCRONIZAR_PRESUPUESTO:
+            self.presupuesto.sincronizar(self._sumar_consumo())
+            self._presupuesto_sincronizado = time.monotonic()
+
+        with self._lock:
+            activos = [
+                (l.lote, l.prioridad, l.peso, max(l.total - l.stats["procesadas"], 0))
+                for l in self.lotes.values() if l.estado == "EJECUTANDO"
+            ]
+
+        restante_hoy = self.presupuesto.restante_hoy()
+        anterior = 0  # ICCIDs de los niveles de mayor prioridad, que se consumen primero
+        publicados = {}
+        for prioridad in sorted({a[1] for a in activos}, reverse=True):
+            nivel = [a for a in activos if a[1] == prioridad]
+            trabajo = sum(restantes for *_, restantes in nivel)
+            pesos = sum(peso for _, _, peso, _ in nivel)
+
+            for nombre, _, peso, restantes in nivel:
+                parte = peso / pesos
+                datos = {
+                    "presupuesto_hoy": min(restantes, int(max(restante_hoy - anterior, 0) * parte)),
+                    "fecha_estimada": self.presupuesto.fecha_estimada(
+                        anterior + min(restantes / parte, trabajo)
+                    ).isoformat()
+                }
+                if self._presupuesto_publicado.get(nombre) != datos:
+                    self.almacenamiento.actualizar_presupuesto(nombre, datos)
+                publicados[nombre] = datos
+            anterior += trabajo
+
+        self._presupuesto_publicado = publicados
+
+    def _sumar_consumo(self) -> int:
+        """
+        Sumar los despachos de este worker al contador diario global y regresar el total de hoy
+        El contador (presupuesto_consumo) cuenta llamadas al portal: no baja con un reinicio
+        del lote ni cuando una ICCID se vuelve a verificar, a diferencia de verificaciones_por_hora.
+        """
+        inicio = self.presupuesto.inicio_del_dia()
+        hoy = inicio.date()
+        pendientes = self.presupuesto.tomar_sin_publicar()
+        pendientes.setdefault(hoy, 0)
+
+        consumidas = None
+        for dia in sorted(pendientes):
+            try:
+                total = self.almacenamiento.sumar_consumo_diario(dia.isoformat(), pendientes[dia])
+            except Exception:
+                self.presupuesto.devolver_sin_publicar({d: n for d, n in pendientes.items() if d >= dia})
+                raise
+            if dia == hoy:
+                consumidas = total
+
+        if consumidas is None:
+            # Sin presupuesto_consumo: resultados de hoy (subestima reintentos y reinicios)
+            filas = self.almacenamiento.verificaciones_por_hora(inicio.astimezone(timezone.utc).isoformat())
+            consumidas = sum(f['total'] for f in filas)
+        return consumidas
+
+    def publicar_circuito(self):
+        """Publicar el estado del circuito en los lotes de este worker (solo si cambió)"""
+        resumen = self.circuito.resumen()
+        if resumen["circuito_estado"] != self._estado_circuito:
+            logger.warning(f"🔌 Circuito del portal: {self._estado_circuito} -> {resumen['circuito_estado']} "
+                           f"(fallos {resumen['circuito_tasa_fallos']:.0%})")
+            self._estado_circuito = resumen["circuito_estado"]
+
+        with self._lock:
+            nombres = list(self.lotes)
+        for nombre in nombres:
+            if self._circuito_publicado.get(nombre) != resumen:
+                self.almacenamiento.actualizar_circuito(nombre, resumen)
+        self._circuito_publicado = {nombre: resumen for nombre in nombres}
+
+    def liberar_todos(self):
+        """Soltar todos los leases (al apagar) para que otro worker los tome sin esperar"""
+        with self._lock:
+            nombres = list(self.lotes)
+            self.lotes.clear()
+        for nombre in nombres:
+            try:
+                self.almacenamiento.liberar_lease(nombre, self.worker_id)
+            except Exception as e:
+                logger.error(f"❌ No se pudo liberar el lease de {nombre}: {e}")
+
+    def revisar_terminados(self):
+        """Cerrar los lotes sin trabajo restante ni ICCIDs en vuelo"""
+        with self._lock:
+            terminados = [
+                l for l in self.lotes.values()
+                if not l.en_vuelo and (not l.tiene_cupo() or l.sin_pendientes)
+            ]
+
+        if not terminados:
+            return
+
+        # Esperar una sola vez, por todos los lotes, a que el outbox llegue a la base de datos
+        # (espera corta para no dejar vencer los leases; se reintenta en el siguiente ciclo)
+        if not self.verificador.replicador.vaciar(timeout=15):
+            logger.warning(f"⚠️ Outbox con {self.verificador.outbox.contar_pendientes()} resultado(s) sin enviar")
+            return
+
+        for lote in terminados:
+            pendientes = self.almacenamiento.contar_pendientes(lote.lote)
+            if lote.tiene_cupo() and pendientes > 0:
+                continue  # Aún hay pendientes que no se alcanzaron a reclamar; seguir
+
+            # Una muestra terminada está completa aunque el lote conserve PENDIENTE
+            estado = "COMPLETADO" if pendientes == 0 or lote.muestreo is not None else "INCOMPLETO"
+            with self._lock:
+                if self.lotes.get(lote.lote) is not lote:
+                    continue
+                del self.lotes[lote.lote]
+            self.verificador.finalizar_proceso(lote.lote, estado)
+            self.almacenamiento.liberar_lease(lote.lote, self.worker_id)
+
+            logger.info(f"🏁 Lote {lote.lote} {estado}: {lote.stats}")
+            logger.info(f"🔌 Cliente Supabase: {obtener_metricas()}")
+
+    # ---------- Slots ----------
+
+    def _slot(self, numero: int):
+        """
+        Hilo de verificación: toma ICCIDs del planificador con su propio navegador
+        Un slot por encima del nivel del autoajuste cierra su navegador y espera.
+        """
+        while not self._detener.is_set():
+            if numero > self.autoajuste.nivel:
+                self._detener.wait(1)
+                continue
+            try:
+                with sync_playwright() as p:
+                    browser, page = self.verificador.abrir_navegador(p)
+                    try:
+                        while not self._detener.is_set() and numero <= self.autoajuste.nivel:
+                            consulta = self.siguiente_express()
+                            if consulta:
+                                self._atender_express(numero, page, consulta)
+                                continue
+                            trabajo = self.siguiente_trabajo()
+                            if trabajo is None:
+                                self._detener.wait(1)
+                                continue
+                            self._verificar(numero, page, *trabajo)
+                    finally:
+                        browser.close()
+            except Exception as e:
+                logger.error(f"❌ Slot {numero}: {e}")
+                self._detener.wait(10)
+
+    def _verificar(self, numero: int, page, lote: LoteActivo, registro: Dict):
+        iccid_completo = registro['iccid_completo']
+        inicio = time.monotonic()
+        try:
+            logger.info("[slot %d] %s: verificando %s", numero, lote.lote, iccid_completo,
+                        extra={"muestreo": True, "slot": numero, "lote": lote.lote, "iccid": iccid_completo})
+            etapas = {}
+            estatus, numero_asignado, observaciones = self.verificador.verificar_iccid_en_portal(
+                page, registro['ultimos_13_digitos'], etapas=etapas
+            )
+        except Exception:
+            self.autoajuste.registrar(time.monotonic() - inicio, False)
+            self.circuito.registrar(False, iccid_completo)
+            self._liberar(lote, registro)
+            raise
+
+        self.autoajuste.registrar(time.monotonic() - inicio, estatus != "ERROR")
+        self.verificador.registrar_intento(lote.lote, registro, etapas, estatus)
+
+        # Con el circuito abierto el ERROR es del portal, no de la ICCID: se devuelve como PENDIENTE
+        estado_circuito = self.circuito.registrar(estatus != "ERROR", iccid_completo)
+        if estatus == "ERROR" and estado_circuito != CERRADO:
+            logger.warning(f"[slot {numero}] 🔌 Circuito {estado_circuito}: {iccid_completo} queda PENDIENTE")
+            self._liberar(lote, registro)
+            return
+
+        try:
+            if not self.verificador.actualizar_iccid_en_db(iccid_completo, estatus, numero_asignado, observaciones,
+                                                           registro.get('intentos') or 0):
+                raise RuntimeError("no se pudo registrar el resultado en el outbox")
+        except Exception:
+            self._liberar(lote, registro)
+            raise
+
+        self._completar(lote, registro, estatus)
+        time.sleep(self.verificador.delay_entre_verificaciones)
+
+    # ---------- Ciclo principal ----------
+
+    def ejecutar(self):
+        """Arrancar los slots y refrescar los lotes activos hasta que se interrumpa"""
+        self._detener.clear()
+        self.verificador.iniciar_outbox()
+
+        # Worker dedicado: si otro worker ya tiene el lease del lote, terminar sin abrir navegadores
+        if self.salir_al_terminar:
+            self.refrescar()
+            if not self.lotes:
+                logger.info("🏁 El lote lo atiende otro worker o ya no está activo; el planificador termina")
+                self.verificador.replicador.vaciar(timeout=30)
+                return
+
+        self.verificador.iniciar_registro_intentos(self.worker_id)
+
+        hilos = [
+            threading.Thread(target=self._slot, args=(i,), daemon=True, name=f"Slot-{i}")
+            for i in range(1, self.autoajuste.maximo + 1)
+        ]
+        for hilo in hilos:
+            hilo.start()
+        logger.info(f"🧵 Planificador {self.worker_id} con {self.slots} slot(s) de verificación")
+        if self.autoajuste.habilitado:
+            logger.info(f"🎛️ Autoajuste de concurrencia entre {self.autoajuste.minimo} y {self.autoajuste.maximo} slots")
+        if self.presupuesto:
+            logger.info(f"🎟️ Cuota diaria: {self.presupuesto.cuota:,} ICCIDs")
+
+        postgres = getattr(self.almacenamiento, "postgres", None)
+        self._escuchando = postgres is not None
+        if postgres:
+            threading.Thread(
+                target=postgres.escuchar, args=([CANAL_PROCESOS, CANAL_EXPRESS], self._al_notificar, self._detener),
+                daemon=True, name="Escucha-procesos"
+            ).start()
+            logger.info(f"👂 Escuchando NOTIFY {CANAL_PROCESOS} y {CANAL_EXPRESS}")
+
+        try:
+            while True:
+                self._despertar.clear()
+                vigentes = None
+                try:
+                    vigentes = self.refrescar()
+                    self.latido()
+                    self.revisar_terminados()
+                    self.publicar_presupuesto()
+                    self.publicar_circuito()
+                    self.autoajuste.evaluar()
+                except Exception as e:
+                    logger.error(f"❌ Error al refrescar lotes: {e}")
+
+                # Sin lotes propios (terminados, detenidos o con el lease perdido) el dedicado sobra
+                if self.salir_al_terminar and vigentes is not None and not self.lotes:
+                    logger.info("🏁 Sin lotes activos; el planificador termina")
+                    return
+
+                # Con lotes activos se refresca seguido (latidos y progreso); en reposo
+                # basta el NOTIFY y un sondeo lento de respaldo
+                if postgres and not self.lotes:
+                    espera = INTERVALO_SEGURIDAD
+                else:
+                    espera = self.verificador.configuracion.obtener("intervalo_refresco")
+                self._despertar.wait(espera)
+        finally:
+            self._detener.set()
+            for hilo in hilos:
+                hilo.join(timeout=30)
+            self.liberar_todos()
+            self.verificador.intentos.detener()
@@ -0,0 +1,174 @@
+"""
+Conexión directa a Postgres (opcional) para operaciones masivas
+Usa COPY FROM STDIN para cargas, COPY TO STDOUT para exportaciones y
+cursores del lado del servidor para recorridos grandes, evitando el límite
+de filas por petición y la codificación JSON de PostgREST.
+
+Se activa configurando SUPABASE_DB_URL con la cadena de conexión directa de
+Supabase (puerto 5432, modo sesión). Si no está configurada o psycopg no está
+instalado, la app usa la ruta REST como hasta ahora.
+"""
+
+import os
+import logging
+import threading
+from typing import Callable, Dict, IO, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    import psycopg
+    from psycopg import sql
+    from psycopg.rows import dict_row
+    PSYCOPG_DISPONIBLE = True
+except ImportError:
+    psycopg = None
+    sql = None
+    dict_row = None
+    PSYCOPG_DISPONIBLE = False
+
+logger = logging.getLogger(__name__)
+
+# Filas por viaje de red al recorrer con cursor del lado del servidor
+FILAS_POR_FETCH = 5000
+
+# Canales de NOTIFY (ver sql/notificaciones.sql y sql/consultas_express.sql)
+CANAL_PROCESOS = "proceso_verificacion"
+CANAL_EXPRESS = "consultas_express"
+
+# Segundos máximos bloqueado esperando un NOTIFY antes de revisar si hay que detenerse
+ESPERA_NOTIFICACION = 5
+
+
+def obtener_dsn() -> Optional[str]:
+    """Cadena de conexión directa configurada (SUPABASE_DB_URL)"""
+    return os.getenv("SUPABASE_DB_URL")
+
+
+class PostgresDirecto:
+    """Operaciones masivas sobre verificacion_iccids con una conexión directa"""
+
+    def __init__(self, dsn: str):
+        if not PSYCOPG_DISPONIBLE:
+            raise RuntimeError("psycopg no está instalado (pip install 'psycopg[binary]')")
+        self.dsn = dsn
+
+    def _conectar(self):
+        # prepare_threshold=None: compatible también con el pooler de Supabase
+        return psycopg.connect(self.dsn, prepare_threshold=None)
+
+    @staticmethod
+    def _filtros(lote: Optional[str], estatus: Optional[str]):
+        """Cláusula WHERE compuesta como SQL seguro (sin interpolar valores)"""
+        condiciones = []
+        if lote and lote != "Todos":
+            condiciones.append(sql.SQL("lote = {}").format(sql.Literal(lote)))
+        if estatus and estatus != "Todos":
+            condiciones.append(sql.SQL("estatus = {}").format(sql.Literal(estatus)))
+        if not condiciones:
+            return sql.SQL("")
+        return sql.SQL(" WHERE ") + sql.SQL(" AND ").join(condiciones)
+
+    def cargar_iccids(self, registros: Iterable[Dict]) -> Tuple[int, int]:
+        """
+        Cargar ICCIDs con COPY a una tabla temporal e insertarlas en un solo INSERT
+        Las que ya existen se ignoran (ON CONFLICT DO NOTHING)
+
+        Returns:
+            Tuple[insertadas, duplicadas]
+        """
+        with self._conectar() as conn, conn.cursor() as cur:
+            cur.execute(
+                "CREATE TEMP TABLE carga_iccids (iccid_completo TEXT, ultimos_13_digitos TEXT, lote TEXT) "
+                "ON COMMIT DROP"
+            )
+
+            total = 0
+            with cur.copy("COPY carga_iccids (iccid_completo, ultimos_13_digitos, lote) FROM STDIN") as copy:
+                for r in registros:
+                    copy.write_row((r['iccid_completo'], r['ultimos_13_digitos'], r['lote']))
+                    total += 1
+
+            cur.execute(
+                "INSERT INTO verificacion_iccids (iccid_completo, ultimos_13_digitos, lote, estatus) "
+                "SELECT DISTINCT ON (iccid_completo) iccid_completo, ultimos_13_digitos, lote, 'PENDIENTE' "
+                "FROM carga_iccids "
+                "ON CONFLICT (iccid_completo) DO NOTHING"
+            )
+            insertadas = cur.rowcount
+
+        return insertadas, total - insertadas
+
+    def resetear_lote(self, lote: str, estatus: Optional[str] = None) -> int:
+        """Regresar a PENDIENTE las ICCIDs de un lote en un solo UPDATE; regresa cuántas"""
+        consulta = sql.SQL(
+            "UPDATE verificacion_iccids SET estatus = 'PENDIENTE', numero_asignado = NULL, "
+            "fecha_verificacion = NULL, observaciones = 'Reseteado manualmente'"
+        ) + self._filtros(lote, estatus)
+
+        with self._conectar() as conn, conn.cursor() as cur:
+            cur.execute(consulta)
+            return cur.rowcount
+
+    def exportar_csv(self, destino: IO[bytes], lote: Optional[str], estatus: Optional[str],
+                     columnas: List[str], callback_progreso: Optional[Callable[[int], None]] = None) -> int:
+        """
+        Exportar con COPY ... TO STDOUT directamente a un archivo binario abierto
+        (puede ser un gzip.open(..., "wb")); regresa el número de filas
+        """
+        consulta = sql.SQL("COPY (SELECT {} FROM verificacion_iccids{} ORDER BY id) TO STDOUT WITH (FORMAT csv, HEADER)").format(
+            sql.SQL(", ").join(sql.Identifier(c) for c in columnas),
+            self._filtros(lote, estatus)
+        )
+
+        lineas = 0
+        with self._conectar() as conn, conn.cursor() as cur:
+            with cur.copy(consulta) as copy:
+                for bloque in copy:
+                    destino.write(bloque)
+                    # Aproximado (un campo puede contener saltos de línea); solo para progreso
+                    lineas += bytes(bloque).count(b"\n")
+                    if callback_progreso:
+                        callback_progreso(max(lineas - 1, 0))
+            return cur.rowcount if cur.rowcount >= 0 else max(lineas - 1, 0)
+
+    def iterar_registros(self, lote: Optional[str], estatus: Optional[str],
+                         columnas: List[str]) -> Iterator[Dict]:
+        """Recorrer registros con un cursor del lado del servidor (memoria constante)"""
+        columnas = ["id"] + [c for c in columnas if c != "id"]
+        consulta = sql.SQL("SELECT {} FROM verificacion_iccids{} ORDER BY id").format(
+            sql.SQL(", ").join(sql.Identifier(c) for c in columnas),
+            self._filtros(lote, estatus)
+        )
+
+        with self._conectar() as conn:
+            with conn.cursor(name="recorrido_iccids", row_factory=dict_row) as cur:
+                cur.itersize = FILAS_POR_FETCH
+                cur.execute(consulta)
+                for fila in cur:
+                    yield fila
+
+    def escuchar(self, canales: List[str], al_notificar: Callable[[str, str], None], detener: threading.Event):
+        """
+        LISTEN en `canales` y llamar al_notificar(canal, payload) con cada NOTIFY
+        hasta que se active `detener`. Si la conexión se cae se reconecta, y al
+        reconectar avisa en cada canal con payload vacío por si se perdió algo.
+        """
+        while not detener.is_set():
+            try:
+                with psycopg.connect(self.dsn, autocommit=True, prepare_threshold=None) as conn:
+                    for canal in canales:
+                        conn.execute(sql.SQL("LISTEN {}").format(sql.Identifier(canal)))
+                        al_notificar(canal, "")
+                    while not detener.is_set():
+                        for notificacion in conn.notifies(timeout=ESPERA_NOTIFICACION):
+                            al_notificar(notificacion.channel, notificacion.payload)
+            except psycopg.Error as e:
+                logger.warning(f"⚠️ LISTEN {', '.join(canales)} interrumpido, reconectando: {e}")
+                detener.wait(10)
+
+
+def crear_postgres_directo(dsn: Optional[str] = None) -> Optional[PostgresDirecto]:
+    """Crear la conexión directa si hay DSN configurado y psycopg instalado"""
+    dsn = dsn or obtener_dsn()
+    if not dsn or not PSYCOPG_DISPONIBLE:
+        return None
+    return PostgresDirecto(dsn)
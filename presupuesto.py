@@ -0,0 +1,160 @@
+"""
+Presupuesto diario de verificaciones
+Reparte una cuota diaria (CUOTA_DIARIA, p. ej. 30,000 ICCIDs/día) dentro de
+ventanas horarias permitidas (VENTANAS_VERIFICACION, p. ej. fuera de las horas
+pico del portal) y espacia los despachos para que la cuota se use de forma
+pareja: el intervalo entre ICCIDs es el tiempo de ventana que queda en el día
+entre la cuota que queda. Si el portal va más lento que eso, no se frena nada.
+Con varios workers el intervalo se multiplica por cuántos tienen un lease vigente,
+para que entre todos despachen al ritmo del día y no N veces más rápido.
+"""
+
+import math
+import os
+import threading
+import time
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+# Cuota diaria de ICCIDs; 0 = sin límite ni ritmo (comportamiento anterior)
+CUOTA_DIARIA = int(os.getenv("CUOTA_DIARIA", "0"))
+
+# Ventanas permitidas "HH:MM-HH:MM" separadas por coma; una ventana puede cruzar la medianoche
+VENTANAS_VERIFICACION = os.getenv("VENTANAS_VERIFICACION", "00:00-24:00")
+
+# Zona horaria en la que se cuentan el día y las ventanas
+ZONA_HORARIA = os.getenv("ZONA_HORARIA", "America/Mexico_City")
+
+SEGUNDOS_DIA = 24 * 3600
+
+
+def _segundos(hora: str) -> int:
+    horas, minutos = hora.strip().split(":")
+    segundos = int(horas) * 3600 + int(minutos) * 60
+    if not 0 <= segundos <= SEGUNDOS_DIA:
+        raise ValueError(f"Hora fuera de rango: {hora}")
+    return segundos
+
+
+def parsear_ventanas(texto: str) -> List[Tuple[int, int]]:
+    """
+    Convertir "07:00-12:00,15:00-22:00" en [(inicio, fin)] en segundos del día
+    Una ventana como "22:00-06:00" se parte en dos: hasta la medianoche y desde ella.
+    """
+    ventanas = []
+    for tramo in texto.split(","):
+        if not tramo.strip():
+            continue
+        inicio, fin = (_segundos(h) for h in tramo.split("-"))
+        if fin > inicio:
+            ventanas.append((inicio, fin))
+        else:
+            ventanas.extend([(inicio, SEGUNDOS_DIA), (0, fin)])
+    if not ventanas:
+        raise ValueError(f"Sin ventanas válidas: {texto!r}")
+    return sorted(ventanas)
+
+
+class PresupuestoDiario:
+    """Cuota diaria con ventanas horarias y ritmo parejo de despacho"""
+
+    def __init__(self, cuota: int, ventanas: List[Tuple[int, int]], zona: ZoneInfo):
+        self.cuota = cuota
+        self.ventanas = ventanas
+        self.zona = zona
+        self._dia: Optional[date] = None
+        self._consumidas = 0
+        self._siguiente = 0.0  # time.monotonic() a partir del cual se puede despachar
+        self._trabajadores = 1  # Workers que se reparten el ritmo (ver fijar_trabajadores)
+        self._sin_publicar: Dict[date, int] = {}  # Despachos de este worker aún no sumados en la base de datos
+        self._lock = threading.Lock()
+
+    @classmethod
+    def desde_entorno(cls) -> Optional["PresupuestoDiario"]:
+        """Presupuesto configurado por variables de entorno; None si no hay cuota"""
+        if CUOTA_DIARIA <= 0:
+            return None
+        return cls(CUOTA_DIARIA, parsear_ventanas(VENTANAS_VERIFICACION), ZoneInfo(ZONA_HORARIA))
+
+    def _ahora(self) -> datetime:
+        return datetime.now(self.zona)
+
+    def _renovar_dia(self, ahora: datetime):
+        if ahora.date() != self._dia:
+            self._dia = ahora.date()
+            self._consumidas = 0
+            self._siguiente = 0.0
+
+    def _segundo_del_dia(self, ahora: datetime) -> int:
+        return ahora.hour * 3600 + ahora.minute * 60 + ahora.second
+
+    def _en_ventana(self, ahora: datetime) -> bool:
+        segundo = self._segundo_del_dia(ahora)
+        return any(inicio <= segundo < fin for inicio, fin in self.ventanas)
+
+    def _ventana_restante(self, ahora: datetime) -> int:
+        """Segundos de ventana permitida que quedan hoy"""
+        segundo = self._segundo_del_dia(ahora)
+        return sum(max(0, fin - max(inicio, segundo)) for inicio, fin in self.ventanas)
+
+    def inicio_del_dia(self) -> datetime:
+        """Medianoche de hoy en la zona del presupuesto"""
+        return self._ahora().replace(hour=0, minute=0, second=0, microsecond=0)
+
+    def sincronizar(self, consumidas_hoy: int):
+        """
+        Ajustar lo consumido hoy con el conteo global (todos los workers)
+        Se conserva el mayor: lo local incluye despachos aún no registrados.
+        """
+        with self._lock:
+            self._renovar_dia(self._ahora())
+            self._consumidas = max(self._consumidas, consumidas_hoy)
+
+    def tomar_sin_publicar(self) -> Dict[date, int]:
+        """Despachos por día aún no sumados al contador global; quedan en cero"""
+        with self._lock:
+            pendientes, self._sin_publicar = self._sin_publicar, {}
+            return pendientes
+
+    def devolver_sin_publicar(self, pendientes: Dict[date, int]):
+        """Regresar despachos que no se pudieron sumar para el siguiente intento"""
+        with self._lock:
+            for dia, cantidad in pendientes.items():
+                self._sin_publicar[dia] = self._sin_publicar.get(dia, 0) + cantidad
+
+    def fijar_trabajadores(self, cantidad: int):
+        """Número de workers con lease vigente; cada uno despacha a 1/cantidad del ritmo"""
+        with self._lock:
+            self._trabajadores = max(1, cantidad)
+
+    def tomar_turno(self) -> bool:
+        """Reservar un despacho si hay cuota, ventana abierta y ya tocó según el ritmo"""
+        ahora = self._ahora()
+        with self._lock:
+            self._renovar_dia(ahora)
+            restantes = self.cuota - self._consumidas
+            if restantes <= 0 or not self._en_ventana(ahora) or time.monotonic() < self._siguiente:
+                return False
+
+            self._consumidas += 1
+            self._sin_publicar[ahora.date()] = self._sin_publicar.get(ahora.date(), 0) + 1
+            self._siguiente = time.monotonic() + self._ventana_restante(ahora) * self._trabajadores / restantes
+            return True
+
+    def restante_hoy(self) -> int:
+        """ICCIDs que aún caben hoy (0 si ya no queda ventana)"""
+        ahora = self._ahora()
+        with self._lock:
+            self._renovar_dia(ahora)
+            if self._ventana_restante(ahora) == 0:
+                return 0
+            return max(self.cuota - self._consumidas, 0)
+
+    def fecha_estimada(self, iccids: float) -> date:
+        """Día en que se habrán consumido `iccids` más del presupuesto (hoy incluido)"""
+        hoy = self._ahora().date()
+        cupo_hoy = self.restante_hoy()
+        if iccids <= cupo_hoy:
+            return hoy
+        return hoy + timedelta(days=math.ceil((iccids - cupo_hoy) / self.cuota))
@@ -0,0 +1,100 @@
+"""
+Registro (logging) estructurado del worker
+Los hilos que verifican solo encolan el registro (QueueHandler); un hilo de
+fondo (QueueListener) lo formatea como JSON y lo escribe en un archivo con
+rotación por tamaño, así la E/S no cae en el camino de cada ICCID.
+
+- LOG_NIVEL: nivel mínimo (DEBUG muestra el detalle de la detección del popup)
+- LOG_MUESTREO: de las líneas por ICCID (extra={"muestreo": True}) se escribe
+  una de cada N; WARNING y superiores siempre pasan
+- LOG_TAMANO_MB / LOG_RESPALDOS: rotación del archivo
+"""
+
+import atexit
+import itertools
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+from datetime import datetime, timezone
+from typing import Optional
+
+LOG_NIVEL = os.getenv("LOG_NIVEL", "INFO").upper()
+LOG_MUESTREO = max(1, int(os.getenv("LOG_MUESTREO", "20")))
+LOG_TAMANO_MB = int(os.getenv("LOG_TAMANO_MB", "10"))
+LOG_RESPALDOS = int(os.getenv("LOG_RESPALDOS", "5"))
+
+# Atributos propios de LogRecord; el resto viene de extra={...} y va al JSON
+_ATRIBUTOS_RECORD = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taskName"}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class FormatoJSON(logging.Formatter):
+    """Una línea JSON por registro, con los campos de extra={...}"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        datos = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "nivel": record.levelname,
+            "logger": record.name,
+            "hilo": record.threadName,
+            "mensaje": record.getMessage(),
+        }
+        for clave, valor in vars(record).items():
+            if clave not in _ATRIBUTOS_RECORD and clave != "muestreo":
+                datos[clave] = valor
+        if record.exc_info:
+            datos["excepcion"] = self.formatException(record.exc_info)
+        return json.dumps(datos, ensure_ascii=False, default=str)
+
+
+class FiltroMuestreo(logging.Filter):
+    """Deja pasar 1 de cada `cada` registros marcados con muestreo (los demás siempre)"""
+
+    def __init__(self, cada: int):
+        super().__init__()
+        self.cada = cada
+        self._contador = itertools.count()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not getattr(record, "muestreo", False) or record.levelno >= logging.WARNING:
+            return True
+        return next(self._contador) % self.cada == 0
+
+
+def configurar_registro(ruta: str, nivel: str = LOG_NIVEL):
+    """
+    Enviar todo el logging del proceso a `ruta` (JSON, con rotación) a través de una cola
+    En consola solo se escriben advertencias, salvo en una terminal interactiva;
+    así la salida capturada por supervisord no crece con cada ICCID.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    archivo = logging.handlers.RotatingFileHandler(
+        ruta, maxBytes=LOG_TAMANO_MB * 1024 * 1024, backupCount=LOG_RESPALDOS, encoding="utf-8"
+    )
+    archivo.setFormatter(FormatoJSON())
+
+    consola = logging.StreamHandler(sys.stdout)
+    consola.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+    consola.setLevel(logging.DEBUG if sys.stdout.isatty() else logging.WARNING)
+
+    cola = queue.SimpleQueue()
+    manejador = logging.handlers.QueueHandler(cola)
+    # Se filtra antes de encolar: lo descartado no cuesta ni la cola
+    manejador.addFilter(FiltroMuestreo(LOG_MUESTREO))
+
+    raiz = logging.getLogger()
+    for anterior in list(raiz.handlers):
+        raiz.removeHandler(anterior)
+    raiz.addHandler(manejador)
+    raiz.setLevel(nivel)
+
+    _listener = logging.handlers.QueueListener(cola, archivo, consola, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
@@ -0,0 +1,126 @@
+"""
+Bitácora de intentos de verificación (verificacion_intentos)
+Cada verificación en el portal deja una fila con el worker, el número de
+intento de la ICCID, la hora de fin de cada etapa (navegación, llenado del
+campo, detección del resultado), el estatus y la clase de error. Es solo de
+diagnóstico: las filas se acumulan en memoria y un hilo las inserta en lotes,
+así que no agrega una escritura por ICCID; si la base de datos no responde se
+conservan hasta MAXIMO_EN_MEMORIA y después se descartan las más antiguas.
+
+El mismo hilo llama cada hora al mantenimiento: crea las particiones diarias
+de los próximos días y borra las que pasan de RETENCION_INTENTOS_DIAS.
+"""
+
+import logging
+import os
+import socket
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Días de bitácora que se conservan
+RETENCION_INTENTOS_DIAS = int(os.getenv("RETENCION_INTENTOS_DIAS", "30"))
+
+# Filas por inserción y segundos máximos que una fila espera en memoria
+TAMANO_LOTE_INTENTOS = 500
+INTERVALO_INTENTOS = 10
+
+# Tope de filas en memoria mientras la base de datos no responde
+MAXIMO_EN_MEMORIA = 20000
+
+# Segundos entre mantenimientos de particiones y retención
+INTERVALO_MANTENIMIENTO = 3600
+
+
+def _iso(instante: Optional[float]) -> Optional[str]:
+    if instante is None:
+        return None
+    return datetime.fromtimestamp(instante, timezone.utc).isoformat(timespec="milliseconds")
+
+
+class RegistroIntentos:
+    """Buffer de filas de verificacion_intentos con envío en lotes desde un hilo de fondo"""
+
+    def __init__(self, almacenamiento, worker_id: Optional[str] = None):
+        self.almacenamiento = almacenamiento
+        self.worker_id = worker_id or os.getenv("WORKER_ID") or f"{socket.gethostname()}-{os.getpid()}"
+        self._filas = deque(maxlen=MAXIMO_EN_MEMORIA)
+        self._fallido: List[Dict] = []  # Lote cuyo envío falló; va primero en el siguiente intento
+        self._despertar = threading.Event()
+        self._detener = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._ultimo_mantenimiento: Optional[float] = None
+
+    def registrar(self, lote: str, registro: Dict, etapas: Dict, estatus: str):
+        """Encolar el intento de `registro` (fila de reclamar_pendientes) con sus etapas"""
+        self._filas.append({
+            "iccid_id": registro['id'],
+            "lote": lote,
+            "worker_id": self.worker_id,
+            "intento": (registro.get('intentos') or 0) + 1,
+            "inicio": _iso(etapas.get("inicio", time.time())),
+            "fin_navegacion": _iso(etapas.get("fin_navegacion")),
+            "fin_llenado": _iso(etapas.get("fin_llenado")),
+            "fin_deteccion": _iso(etapas.get("fin_deteccion")),
+            "estatus": estatus,
+            "clase_error": etapas.get("clase_error")
+        })
+        if len(self._filas) >= TAMANO_LOTE_INTENTOS:
+            self._despertar.set()
+
+    def iniciar(self):
+        """Arrancar el hilo de envío (idempotente)"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._detener.clear()
+        self._thread = threading.Thread(target=self._loop, daemon=True, name="RegistroIntentos")
+        self._thread.start()
+
+    def detener(self, timeout: float = 10.0):
+        """Detener el hilo después de un último envío"""
+        self._detener.set()
+        self._despertar.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def enviar(self) -> int:
+        """Insertar un lote de filas; si falla se guarda aparte y es lo primero que se reintenta"""
+        # Aparte y no de regreso al buffer: en un deque lleno, extendleft tiraría las filas más nuevas
+        lote, self._fallido = self._fallido, []
+        while self._filas and len(lote) < TAMANO_LOTE_INTENTOS:
+            lote.append(self._filas.popleft())
+        if not lote:
+            return 0
+        try:
+            self.almacenamiento.guardar_intentos(lote)
+        except Exception:
+            self._fallido = lote
+            raise
+        return len(lote)
+
+    def _mantener(self):
+        ahora = time.monotonic()
+        if self._ultimo_mantenimiento is not None and ahora - self._ultimo_mantenimiento < INTERVALO_MANTENIMIENTO:
+            return
+        self._ultimo_mantenimiento = ahora
+        try:
+            self.almacenamiento.mantener_intentos(RETENCION_INTENTOS_DIAS)
+        except Exception as e:
+            logger.warning(f"⚠️ No se pudo dar mantenimiento a verificacion_intentos: {e}")
+
+    def _loop(self):
+        while True:
+            self._mantener()
+            try:
+                while self.enviar() == TAMANO_LOTE_INTENTOS:
+                    pass
+            except Exception as e:
+                logger.warning(f"⚠️ No se pudo enviar la bitácora de intentos ({len(self._filas) + len(self._fallido)} en memoria): {e}")
+            if self._detener.is_set():
+                return
+            self._despertar.wait(INTERVALO_INTENTOS)
+            self._despertar.clear()
@@ -0,0 +1,80 @@
+"""
+Medición de rendimiento real de la verificación
+Ventanas móviles de 1, 5 y 15 minutos (como el load average) sobre los
+instantes en que se completó cada ICCID, y ETA a partir de ellas.
+"""
+
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional
+
+# Ventanas publicadas en proceso_verificacion (columna -> segundos)
+VENTANAS = {"velocidad_1m": 60, "velocidad_5m": 300, "velocidad_15m": 900}
+
+
+class MedidorRendimiento:
+    """Cuenta ICCIDs completadas y calcula ICCIDs/min en ventanas móviles"""
+
+    def __init__(self):
+        self._inicio = time.monotonic()
+        self._marcas = deque()
+        self._lock = threading.Lock()
+        self._ventana_maxima = max(VENTANAS.values())
+
+    def registrar(self, cantidad: int = 1):
+        """Registrar ICCIDs completadas en este instante"""
+        ahora = time.monotonic()
+        with self._lock:
+            for _ in range(cantidad):
+                self._marcas.append(ahora)
+            self._descartar_viejas(ahora)
+
+    def _descartar_viejas(self, ahora: float):
+        while self._marcas and self._marcas[0] < ahora - self._ventana_maxima:
+            self._marcas.popleft()
+
+    def por_minuto(self, segundos: int) -> float:
+        """ICCIDs por minuto en los últimos `segundos`"""
+        ahora = time.monotonic()
+        with self._lock:
+            self._descartar_viejas(ahora)
+            completadas = sum(1 for marca in self._marcas if marca >= ahora - segundos)
+
+        # Al arrancar la ventana todavía no está llena: dividir entre lo transcurrido
+        transcurrido = min(segundos, ahora - self._inicio)
+        if transcurrido <= 0:
+            return 0.0
+        return completadas * 60 / transcurrido
+
+    def resumen(self, restantes: int) -> Dict:
+        """
+        Velocidades por ventana y ETA en segundos para `restantes` ICCIDs
+
+        El ETA usa la ventana de 5 minutos (la de 15 o la de 1 si aún no hay
+        datos); None si todavía no se ha completado ninguna.
+        """
+        velocidades = {columna: round(self.por_minuto(segundos), 2) for columna, segundos in VENTANAS.items()}
+
+        velocidad_eta = (velocidades["velocidad_5m"] or velocidades["velocidad_15m"]
+                         or velocidades["velocidad_1m"])
+        eta_segundos: Optional[int] = None
+        if velocidad_eta > 0:
+            eta_segundos = int(max(restantes, 0) / velocidad_eta * 60)
+
+        return {**velocidades, "eta_segundos": eta_segundos}
+
+
+def formatear_duracion(segundos: Optional[float]) -> str:
+    """Duración legible (2d 3h, 4h 12m, 7m 30s); '—' si no se conoce"""
+    if segundos is None:
+        return "—"
+    segundos = int(segundos)
+    dias, resto = divmod(segundos, 86400)
+    horas, resto = divmod(resto, 3600)
+    minutos, segundos = divmod(resto, 60)
+    if dias:
+        return f"{dias}d {horas}h"
+    if horas:
+        return f"{horas}h {minutos}m"
+    return f"{minutos}m {segundos}s"
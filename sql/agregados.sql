@@ -0,0 +1,29 @@
+-- Agregados del dashboard calculados en el servidor
+-- Regresan unas cuantas filas (lote x estatus) en lugar de la tabla completa
+-- El índice idx_lote_estatus_id (sql/exportacion.sql) permite resolverlos con index-only scan
+
+-- Conteo por lote y estatus (dashboard y estadísticas de configuración)
+CREATE OR REPLACE FUNCTION get_resumen_lotes()
+RETURNS TABLE (lote TEXT, estatus TEXT, total BIGINT) AS $$
+BEGIN
+  RETURN QUERY
+  SELECT v.lote::TEXT, v.estatus::TEXT, COUNT(*)::BIGINT
+  FROM verificacion_iccids v
+  GROUP BY v.lote, v.estatus;
+END;
+$$ LANGUAGE plpgsql STABLE;
+
+-- Conteo por estatus de un solo lote
+CREATE OR REPLACE FUNCTION get_estadisticas_lote(p_lote TEXT)
+RETURNS TABLE (estatus TEXT, total BIGINT) AS $$
+BEGIN
+  RETURN QUERY
+  SELECT v.estatus::TEXT, COUNT(*)::BIGINT
+  FROM verificacion_iccids v
+  WHERE v.lote = p_lote
+  GROUP BY v.estatus;
+END;
+$$ LANGUAGE plpgsql STABLE;
+
+GRANT EXECUTE ON FUNCTION get_resumen_lotes() TO service_role;
+GRANT EXECUTE ON FUNCTION get_estadisticas_lote(TEXT) TO service_role;
@@ -0,0 +1,30 @@
+-- Aplicar en un solo UPDATE un lote de resultados de verificación
+-- Lo usa el replicador del outbox local (outbox_resultados.py)
+-- p_resultados: [{"iccid_completo", "estatus", "numero_asignado", "fecha_verificacion", "observaciones"}, ...]
+
+CREATE OR REPLACE FUNCTION aplicar_resultados_verificacion(p_resultados JSONB)
+RETURNS INT AS $$
+DECLARE
+  v_actualizados INT;
+BEGIN
+  UPDATE verificacion_iccids v
+  SET estatus = r.estatus,
+      numero_asignado = r.numero_asignado,
+      fecha_verificacion = r.fecha_verificacion,
+      observaciones = r.observaciones,
+      intentos = COALESCE(v.intentos, 0) + 1  -- número de intento en verificacion_intentos
+  FROM jsonb_to_recordset(p_resultados) AS r(
+    iccid_completo TEXT,
+    estatus TEXT,
+    numero_asignado TEXT,
+    fecha_verificacion TIMESTAMP WITH TIME ZONE,
+    observaciones TEXT
+  )
+  WHERE v.iccid_completo = r.iccid_completo;
+
+  GET DIAGNOSTICS v_actualizados = ROW_COUNT;
+  RETURN v_actualizados;
+END;
+$$ LANGUAGE plpgsql VOLATILE;
+
+GRANT EXECUTE ON FUNCTION aplicar_resultados_verificacion(JSONB) TO service_role;
@@ -0,0 +1,7 @@
+-- Estado del circuit breaker del portal, publicado por el worker en sus lotes
+-- circuito_estado: CERRADO (normal), ABIERTO (sin despachar) o SEMIABIERTO (prueba en curso)
+-- circuito_reintento: cuándo se hace la siguiente verificación de prueba
+-- Los demás workers leen un ABIERTO ajeno y también se detienen hasta ese momento.
+ALTER TABLE proceso_verificacion ADD COLUMN IF NOT EXISTS circuito_estado TEXT;
+ALTER TABLE proceso_verificacion ADD COLUMN IF NOT EXISTS circuito_tasa_fallos NUMERIC(4, 2);
+ALTER TABLE proceso_verificacion ADD COLUMN IF NOT EXISTS circuito_reintento TIMESTAMP WITH TIME ZONE;
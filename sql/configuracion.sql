@@ -0,0 +1,9 @@
+-- Configuración de velocidad editable en caliente (configuracion.py)
+-- Una fila por parámetro cambiado desde la página de Configuración; los workers
+-- la releen cada CONFIGURACION_TTL segundos. Sin fila, el parámetro usa su
+-- valor por defecto: borrar las filas regresa todo a los valores de fábrica.
+CREATE TABLE IF NOT EXISTS configuracion (
+  clave TEXT PRIMARY KEY,
+  valor TEXT NOT NULL,
+  fecha_actualizacion TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
@@ -0,0 +1,56 @@
+-- Consultas express: verificación de una sola ICCID bajo demanda
+-- La UI o la API local insertan la solicitud; el primer slot libre de un worker
+-- la toma (antes que el trabajo por lotes), la verifica con su navegador ya
+-- abierto y escribe el resultado en la misma fila.
+CREATE TABLE IF NOT EXISTS consultas_express (
+  id BIGSERIAL PRIMARY KEY,
+  iccid_completo TEXT NOT NULL,
+  ultimos_13_digitos TEXT NOT NULL,
+  estado TEXT NOT NULL DEFAULT 'PENDIENTE' CHECK (estado IN ('PENDIENTE', 'EN_PROCESO', 'LISTA')),
+  estatus TEXT,
+  numero_asignado TEXT,
+  observaciones TEXT,
+  worker_id TEXT,
+  fecha_solicitud TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+  fecha_toma TIMESTAMP WITH TIME ZONE,
+  fecha_respuesta TIMESTAMP WITH TIME ZONE
+);
+
+CREATE INDEX IF NOT EXISTS idx_consultas_express_abiertas
+  ON consultas_express (id) WHERE estado <> 'LISTA';
+
+-- Tomar la solicitud más antigua: pendiente, o en proceso por un worker que
+-- no respondió en p_segundos (se cayó). SKIP LOCKED: dos workers nunca toman la misma
+CREATE OR REPLACE FUNCTION tomar_consulta_express(p_worker TEXT, p_segundos INT DEFAULT 120)
+RETURNS SETOF consultas_express AS $$
+BEGIN
+  RETURN QUERY
+  UPDATE consultas_express c
+  SET estado = 'EN_PROCESO', worker_id = p_worker, fecha_toma = NOW()
+  WHERE c.id = (
+    SELECT id FROM consultas_express
+    WHERE estado = 'PENDIENTE'
+       OR (estado = 'EN_PROCESO' AND fecha_toma < NOW() - make_interval(secs => p_segundos))
+    ORDER BY id
+    LIMIT 1
+    FOR UPDATE SKIP LOCKED
+  )
+  RETURNING c.*;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Aviso inmediato a los workers que escuchan (LISTEN consultas_express)
+CREATE OR REPLACE FUNCTION notificar_consulta_express()
+RETURNS TRIGGER AS $$
+BEGIN
+  PERFORM pg_notify('consultas_express', NEW.id::TEXT);
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_notificar_consulta_express ON consultas_express;
+CREATE TRIGGER trg_notificar_consulta_express
+AFTER INSERT ON consultas_express
+FOR EACH ROW EXECUTE FUNCTION notificar_consulta_express();
+
+GRANT EXECUTE ON FUNCTION tomar_consulta_express(TEXT, INT) TO service_role;
@@ -0,0 +1,95 @@
+-- Detección y limpieza de duplicados del lado del servidor
+-- Criterio: mismos ultimos_13_digitos (aunque estén en lotes distintos).
+-- iccid_completo es UNIQUE, así que no puede haber duplicados por ICCID completo.
+-- Se conserva siempre el registro verificado más recientemente
+
+CREATE INDEX IF NOT EXISTS idx_ultimos_13 ON verificacion_iccids(ultimos_13_digitos);
+
+-- Firmas anteriores (con criterio 'iccid' / '13')
+DROP FUNCTION IF EXISTS get_resumen_duplicados();
+DROP FUNCTION IF EXISTS get_muestra_duplicados(TEXT, INT);
+DROP FUNCTION IF EXISTS eliminar_duplicados(TEXT, INT);
+
+-- Resumen: grupos duplicados y registros sobrantes
+CREATE OR REPLACE FUNCTION get_resumen_duplicados()
+RETURNS TABLE (grupos BIGINT, registros_sobrantes BIGINT) AS $$
+BEGIN
+  RETURN QUERY
+  SELECT COUNT(*)::BIGINT, COALESCE(SUM(d.total - 1), 0)::BIGINT
+  FROM (
+    SELECT COUNT(*) AS total
+    FROM verificacion_iccids v
+    WHERE v.ultimos_13_digitos IS NOT NULL
+    GROUP BY v.ultimos_13_digitos
+    HAVING COUNT(*) > 1
+  ) d;
+END;
+$$ LANGUAGE plpgsql STABLE;
+
+-- Muestra de los grupos duplicados más repetidos (para mostrar en la UI)
+CREATE OR REPLACE FUNCTION get_muestra_duplicados(p_limite INT DEFAULT 20)
+RETURNS TABLE (clave TEXT, repeticiones BIGINT, lotes TEXT[]) AS $$
+BEGIN
+  RETURN QUERY
+  SELECT
+    v.ultimos_13_digitos::TEXT,
+    COUNT(*)::BIGINT,
+    ARRAY_AGG(DISTINCT v.lote::TEXT)
+  FROM verificacion_iccids v
+  WHERE v.ultimos_13_digitos IS NOT NULL
+  GROUP BY 1
+  HAVING COUNT(*) > 1
+  ORDER BY 2 DESC, 1
+  LIMIT p_limite;
+END;
+$$ LANGUAGE plpgsql STABLE;
+
+-- Eliminar duplicados por tramos de idx_ultimos_13, conservando el verificado más reciente
+-- Cada llamada recorre unos p_tamano_lote registros con clave > p_desde (sin partir un grupo)
+-- y devuelve cuántos eliminó y la clave desde la que sigue la siguiente llamada.
+-- Llamar en ciclo pasando `siguiente` hasta que sea NULL: entre todas las llamadas
+-- el índice se recorre una sola vez, sin repetir el GROUP BY de toda la tabla.
+CREATE OR REPLACE FUNCTION eliminar_duplicados(p_desde TEXT DEFAULT NULL, p_tamano_lote INT DEFAULT 5000)
+RETURNS TABLE (eliminados INT, siguiente TEXT) AS $$
+DECLARE
+  v_hasta TEXT;
+  v_eliminados INT;
+BEGIN
+  -- Última clave del tramo; el tramo se extiende hasta cerrar su grupo
+  SELECT MAX(t.ultimos_13_digitos) INTO v_hasta
+  FROM (
+    SELECT v.ultimos_13_digitos
+    FROM verificacion_iccids v
+    WHERE v.ultimos_13_digitos IS NOT NULL
+      AND (p_desde IS NULL OR v.ultimos_13_digitos > p_desde)
+    ORDER BY v.ultimos_13_digitos
+    LIMIT p_tamano_lote
+  ) t;
+
+  IF v_hasta IS NULL THEN
+    RETURN QUERY SELECT 0, NULL::TEXT;
+    RETURN;
+  END IF;
+
+  WITH ordenados AS (
+    SELECT v.id,
+           ROW_NUMBER() OVER (
+             PARTITION BY v.ultimos_13_digitos
+             ORDER BY v.fecha_verificacion DESC NULLS LAST, v.updated_at DESC NULLS LAST, v.id DESC
+           ) AS posicion
+    FROM verificacion_iccids v
+    WHERE v.ultimos_13_digitos <= v_hasta
+      AND (p_desde IS NULL OR v.ultimos_13_digitos > p_desde)
+  )
+  DELETE FROM verificacion_iccids v
+  USING ordenados o
+  WHERE v.id = o.id AND o.posicion > 1;
+
+  GET DIAGNOSTICS v_eliminados = ROW_COUNT;
+  RETURN QUERY SELECT v_eliminados, v_hasta;
+END;
+$$ LANGUAGE plpgsql VOLATILE;
+
+GRANT EXECUTE ON FUNCTION get_resumen_duplicados() TO service_role;
+GRANT EXECUTE ON FUNCTION get_muestra_duplicados(INT) TO service_role;
+GRANT EXECUTE ON FUNCTION eliminar_duplicados(TEXT, INT) TO service_role;
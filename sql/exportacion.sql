@@ -0,0 +1,6 @@
+-- Índices para exportación paginada por llave (keyset) sobre id
+-- Permiten que cada página "id > ultimo_id ORDER BY id LIMIT n" con filtros
+-- de lote y estatus se resuelva con un recorrido de índice, sin ordenar
+
+CREATE INDEX IF NOT EXISTS idx_lote_estatus_id ON verificacion_iccids(lote, estatus, id);
+CREATE INDEX IF NOT EXISTS idx_estatus_id ON verificacion_iccids(estatus, id);
@@ -0,0 +1,14 @@
+-- Exportación incremental por consumidor, basada en updated_at
+-- (updated_at lo mantiene el trigger update_updated_at_column)
+
+-- Cursor por consumidor: último (updated_at, id) entregado
+CREATE TABLE IF NOT EXISTS exportacion_cursores (
+    consumidor VARCHAR(100) PRIMARY KEY,
+    ultimo_updated_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT '1970-01-01T00:00:00+00:00',
+    ultimo_id BIGINT NOT NULL DEFAULT 0,
+    ultimos_exportados INT DEFAULT 0,
+    fecha_actualizacion TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+-- Índice para paginar por la llave compuesta (updated_at, id)
+CREATE INDEX IF NOT EXISTS idx_updated_at_id ON verificacion_iccids(updated_at, id);
@@ -0,0 +1,56 @@
+-- Leases de procesos para varios workers (recuperación tras caídas)
+-- Cada worker toma un lote con un lease que renueva en cada latido; si el
+-- worker muere, el lease expira y otro worker lo toma automáticamente.
+-- Los tiempos se calculan con el reloj del servidor (NOW()), no el de cada nodo.
+ALTER TABLE proceso_verificacion ADD COLUMN IF NOT EXISTS worker_id TEXT;
+ALTER TABLE proceso_verificacion ADD COLUMN IF NOT EXISTS lease_expira TIMESTAMP WITH TIME ZONE;
+ALTER TABLE proceso_verificacion ADD COLUMN IF NOT EXISTS ultimo_latido TIMESTAMP WITH TIME ZONE;
+
+-- Tomar el lease de un lote EJECUTANDO si está libre, vencido o ya es de este worker
+-- Un solo UPDATE condicional: si dos workers compiten, solo uno lo obtiene
+CREATE OR REPLACE FUNCTION tomar_lease_proceso(p_lote TEXT, p_worker TEXT, p_segundos INT DEFAULT 30)
+RETURNS BOOLEAN AS $$
+DECLARE
+  v_filas INT;
+BEGIN
+  UPDATE proceso_verificacion
+  SET worker_id = p_worker,
+      lease_expira = NOW() + make_interval(secs => p_segundos),
+      ultimo_latido = NOW()
+  WHERE lote = p_lote
+    AND estado = 'EJECUTANDO'
+    AND (worker_id IS NULL OR worker_id = p_worker OR lease_expira IS NULL OR lease_expira < NOW());
+
+  GET DIAGNOSTICS v_filas = ROW_COUNT;
+  RETURN v_filas > 0;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Latido: renovar los leases del worker; regresa los lotes que sigue teniendo
+CREATE OR REPLACE FUNCTION renovar_leases_proceso(p_worker TEXT, p_lotes TEXT[], p_segundos INT DEFAULT 30)
+RETURNS TABLE (lote TEXT) AS $$
+BEGIN
+  RETURN QUERY
+  UPDATE proceso_verificacion p
+  SET lease_expira = NOW() + make_interval(secs => p_segundos),
+      ultimo_latido = NOW()
+  WHERE p.lote = ANY(p_lotes)
+    AND p.worker_id = p_worker
+    AND p.estado IN ('EJECUTANDO', 'PAUSADO')
+  RETURNING p.lote::TEXT;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Liberar el lease (al terminar el lote o al apagar el worker)
+CREATE OR REPLACE FUNCTION liberar_lease_proceso(p_lote TEXT, p_worker TEXT)
+RETURNS VOID AS $$
+BEGIN
+  UPDATE proceso_verificacion
+  SET worker_id = NULL, lease_expira = NULL
+  WHERE lote = p_lote AND worker_id = p_worker;
+END;
+$$ LANGUAGE plpgsql;
+
+GRANT EXECUTE ON FUNCTION tomar_lease_proceso(TEXT, TEXT, INT) TO service_role;
+GRANT EXECUTE ON FUNCTION renovar_leases_proceso(TEXT, TEXT[], INT) TO service_role;
+GRANT EXECUTE ON FUNCTION liberar_lease_proceso(TEXT, TEXT) TO service_role;
@@ -0,0 +1,108 @@
+-- Catálogo de lotes con conteos por estatus y última actividad
+-- Lo mantienen triggers por sentencia (con tablas de transición) sobre
+-- verificacion_iccids: una carga por COPY o un UPDATE de 200 resultados
+-- suman sus deltas en una sola pasada, no fila por fila.
+-- Nota: TRUNCATE no dispara estos triggers; tras un TRUNCATE volver a
+-- ejecutar el bloque de inicialización del final.
+
+CREATE TABLE IF NOT EXISTS lotes (
+    lote TEXT PRIMARY KEY,
+    total BIGINT NOT NULL DEFAULT 0,
+    pendientes BIGINT NOT NULL DEFAULT 0,
+    activas BIGINT NOT NULL DEFAULT 0,
+    inactivas BIGINT NOT NULL DEFAULT 0,
+    errores BIGINT NOT NULL DEFAULT 0,
+    ultima_actividad TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW()
+);
+
+-- Delta de una fila: +1 al (lote, estatus) nuevo, -1 al anterior
+DO $$
+BEGIN
+  CREATE TYPE cambio_lote AS (lote TEXT, estatus TEXT, signo INT);
+EXCEPTION WHEN duplicate_object THEN NULL;
+END $$;
+
+-- Suma al catálogo los deltas de una sentencia
+CREATE OR REPLACE FUNCTION sumar_cambios_lotes(p_cambios cambio_lote[])
+RETURNS VOID AS $$
+BEGIN
+  INSERT INTO lotes AS l (lote, total, pendientes, activas, inactivas, errores, ultima_actividad)
+  SELECT
+    c.lote,
+    SUM(c.signo),
+    COALESCE(SUM(c.signo) FILTER (WHERE c.estatus = 'PENDIENTE'), 0),
+    COALESCE(SUM(c.signo) FILTER (WHERE c.estatus = 'ACTIVA'), 0),
+    COALESCE(SUM(c.signo) FILTER (WHERE c.estatus = 'INACTIVA'), 0),
+    COALESCE(SUM(c.signo) FILTER (WHERE c.estatus = 'ERROR'), 0),
+    NOW()
+  FROM unnest(p_cambios) c
+  WHERE c.lote IS NOT NULL
+  GROUP BY c.lote
+  ON CONFLICT (lote) DO UPDATE SET
+    total = l.total + EXCLUDED.total,
+    pendientes = l.pendientes + EXCLUDED.pendientes,
+    activas = l.activas + EXCLUDED.activas,
+    inactivas = l.inactivas + EXCLUDED.inactivas,
+    errores = l.errores + EXCLUDED.errores,
+    ultima_actividad = NOW();
+
+  -- Lotes que se quedaron sin registros (eliminados)
+  DELETE FROM lotes WHERE total <= 0;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION actualizar_catalogo_lotes()
+RETURNS TRIGGER AS $$
+DECLARE
+  v_cambios cambio_lote[] := '{}';
+BEGIN
+  IF TG_OP IN ('INSERT', 'UPDATE') THEN
+    v_cambios := v_cambios || ARRAY(SELECT ROW(n.lote, n.estatus, 1)::cambio_lote FROM nuevas n);
+  END IF;
+
+  IF TG_OP IN ('UPDATE', 'DELETE') THEN
+    v_cambios := v_cambios || ARRAY(SELECT ROW(v.lote, v.estatus, -1)::cambio_lote FROM viejas v);
+  END IF;
+
+  -- En un UPDATE que no cambia lote ni estatus el +1 y el -1 se cancelan,
+  -- pero ultima_actividad sí se actualiza
+  PERFORM sumar_cambios_lotes(v_cambios);
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS catalogo_lotes_insert ON verificacion_iccids;
+CREATE TRIGGER catalogo_lotes_insert
+    AFTER INSERT ON verificacion_iccids
+    REFERENCING NEW TABLE AS nuevas
+    FOR EACH STATEMENT EXECUTE FUNCTION actualizar_catalogo_lotes();
+
+DROP TRIGGER IF EXISTS catalogo_lotes_update ON verificacion_iccids;
+CREATE TRIGGER catalogo_lotes_update
+    AFTER UPDATE ON verificacion_iccids
+    REFERENCING OLD TABLE AS viejas NEW TABLE AS nuevas
+    FOR EACH STATEMENT EXECUTE FUNCTION actualizar_catalogo_lotes();
+
+DROP TRIGGER IF EXISTS catalogo_lotes_delete ON verificacion_iccids;
+CREATE TRIGGER catalogo_lotes_delete
+    AFTER DELETE ON verificacion_iccids
+    REFERENCING OLD TABLE AS viejas
+    FOR EACH STATEMENT EXECUTE FUNCTION actualizar_catalogo_lotes();
+
+-- Inicialización (y reconstrucción) a partir de los datos existentes
+BEGIN;
+LOCK TABLE verificacion_iccids IN SHARE MODE;
+DELETE FROM lotes;
+INSERT INTO lotes (lote, total, pendientes, activas, inactivas, errores, ultima_actividad)
+SELECT
+  v.lote,
+  COUNT(*),
+  COUNT(*) FILTER (WHERE v.estatus = 'PENDIENTE'),
+  COUNT(*) FILTER (WHERE v.estatus = 'ACTIVA'),
+  COUNT(*) FILTER (WHERE v.estatus = 'INACTIVA'),
+  COUNT(*) FILTER (WHERE v.estatus = 'ERROR'),
+  COALESCE(MAX(v.updated_at), NOW())
+FROM verificacion_iccids v
+WHERE v.lote IS NOT NULL
+GROUP BY v.lote;
+COMMIT;
@@ -0,0 +1,29 @@
+-- Modo muestra: estimar la proporción de ACTIVA / INACTIVA de un lote con una
+-- muestra aleatoria de sus PENDIENTE (estimacion.py)
+-- margen_objetivo: mitad del ancho del intervalo al 95% con la que el proceso termina (NULL = corrida completa)
+-- poblacion_muestra: ICCIDs PENDIENTE al iniciar (corrección por población finita)
+ALTER TABLE proceso_verificacion ADD COLUMN IF NOT EXISTS margen_objetivo REAL;
+ALTER TABLE proceso_verificacion ADD COLUMN IF NOT EXISTS poblacion_muestra INT;
+
+-- Muestra estratificada: las PENDIENTE del lote se dividen en p_estratos tramos
+-- consecutivos por id (cajas del embarque) y se barajan dentro de cada tramo;
+-- el resultado va intercalado (una de cada estrato, luego otra de cada uno...),
+-- así que cualquier prefijo de la muestra queda balanceado entre estratos
+CREATE OR REPLACE FUNCTION muestra_estratificada_pendientes(p_lote TEXT, p_tamano INT, p_estratos INT DEFAULT 20)
+RETURNS TABLE (id BIGINT, iccid_completo TEXT, ultimos_13_digitos TEXT, intentos INT, estrato INT) AS $$
+  WITH pendientes AS (
+    SELECT v.id, v.iccid_completo, v.ultimos_13_digitos, v.intentos,
+           ntile(p_estratos) OVER (ORDER BY v.id) AS estrato
+    FROM verificacion_iccids v
+    WHERE v.lote = p_lote AND v.estatus = 'PENDIENTE'
+  ), barajadas AS (
+    SELECT p.*, row_number() OVER (PARTITION BY p.estrato ORDER BY random()) AS turno
+    FROM pendientes p
+  )
+  SELECT b.id::BIGINT, b.iccid_completo::TEXT, b.ultimos_13_digitos::TEXT, b.intentos::INT, b.estrato::INT
+  FROM barajadas b
+  ORDER BY b.turno, b.estrato
+  LIMIT p_tamano;
+$$ LANGUAGE sql VOLATILE;
+
+GRANT EXECUTE ON FUNCTION muestra_estratificada_pendientes(TEXT, INT, INT) TO service_role;
@@ -0,0 +1,6 @@
+-- Índices para el navegador de resultados (paginación por llave)
+-- Orden por ICCID dentro de un lote
+CREATE INDEX IF NOT EXISTS idx_lote_iccid ON verificacion_iccids(lote, iccid_completo);
+
+-- Filtro por rango de fecha de verificación
+CREATE INDEX IF NOT EXISTS idx_fecha_verificacion_id ON verificacion_iccids(fecha_verificacion, id);
@@ -0,0 +1,17 @@
+-- Aviso inmediato al worker cuando cambia un proceso
+-- El worker daemon (con SUPABASE_DB_URL configurada) hace LISTEN proceso_verificacion
+-- y despierta en cuanto se inicia, pausa, detiene o replanifica un lote, en
+-- lugar de esperar al siguiente sondeo. El payload es "lote:estado".
+-- Solo se dispara con cambios de estado/prioridad/peso, no con el progreso.
+CREATE OR REPLACE FUNCTION notificar_proceso_verificacion()
+RETURNS TRIGGER AS $$
+BEGIN
+  PERFORM pg_notify('proceso_verificacion', NEW.lote || ':' || NEW.estado);
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_notificar_proceso_verificacion ON proceso_verificacion;
+CREATE TRIGGER trg_notificar_proceso_verificacion
+AFTER INSERT OR UPDATE OF estado, prioridad, peso ON proceso_verificacion
+FOR EACH ROW EXECUTE FUNCTION notificar_proceso_verificacion();
@@ -0,0 +1,11 @@
+-- Prioridad y peso de cada proceso para el planificador del worker daemon
+-- prioridad: se atiende primero el nivel más alto con trabajo (0 = normal)
+-- peso: dentro del mismo nivel, parte proporcional de los slots de verificación
+ALTER TABLE proceso_verificacion ADD COLUMN IF NOT EXISTS prioridad INT NOT NULL DEFAULT 0;
+ALTER TABLE proceso_verificacion ADD COLUMN IF NOT EXISTS peso INT NOT NULL DEFAULT 1;
+
+DO $$
+BEGIN
+  ALTER TABLE proceso_verificacion ADD CONSTRAINT proceso_peso_positivo CHECK (peso > 0);
+EXCEPTION WHEN duplicate_object THEN NULL;
+END $$;
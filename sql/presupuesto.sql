@@ -0,0 +1,26 @@
+-- Presupuesto diario publicado por el worker (CUOTA_DIARIA / VENTANAS_VERIFICACION)
+-- presupuesto_hoy: ICCIDs del presupuesto de hoy que le tocan al lote
+-- fecha_estimada: día estimado de término al ritmo de la cuota
+ALTER TABLE proceso_verificacion ADD COLUMN IF NOT EXISTS presupuesto_hoy INT;
+ALTER TABLE proceso_verificacion ADD COLUMN IF NOT EXISTS fecha_estimada DATE;
+
+-- Consumo del día: despachos al portal de todos los workers (no baja con
+-- reinicios ni re-verificaciones, a diferencia de verificaciones_por_hora)
+CREATE TABLE IF NOT EXISTS presupuesto_consumo (
+  dia DATE PRIMARY KEY,
+  despachadas BIGINT NOT NULL DEFAULT 0,
+  fecha_actualizacion TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+-- Sumar los despachos de un worker y regresar el total del día (un solo upsert)
+CREATE OR REPLACE FUNCTION sumar_consumo_presupuesto(p_dia DATE, p_cantidad INT)
+RETURNS BIGINT AS $$
+  INSERT INTO presupuesto_consumo (dia, despachadas)
+  VALUES (p_dia, p_cantidad)
+  ON CONFLICT (dia) DO UPDATE
+  SET despachadas = presupuesto_consumo.despachadas + EXCLUDED.despachadas,
+      fecha_actualizacion = NOW()
+  RETURNING despachadas;
+$$ LANGUAGE sql;
+
+GRANT EXECUTE ON FUNCTION sumar_consumo_presupuesto(DATE, INT) TO service_role;
@@ -0,0 +1,6 @@
+-- Velocidad real publicada por el worker en cada actualización de progreso
+-- ICCIDs/min en ventanas móviles de 1, 5 y 15 minutos y ETA en segundos
+ALTER TABLE proceso_verificacion ADD COLUMN IF NOT EXISTS velocidad_1m NUMERIC(10, 2);
+ALTER TABLE proceso_verificacion ADD COLUMN IF NOT EXISTS velocidad_5m NUMERIC(10, 2);
+ALTER TABLE proceso_verificacion ADD COLUMN IF NOT EXISTS velocidad_15m NUMERIC(10, 2);
+ALTER TABLE proceso_verificacion ADD COLUMN IF NOT EXISTS eta_segundos INT;
@@ -0,0 +1,103 @@
+-- Bitácora de intentos de verificación (registro_intentos.py)
+-- Una fila por verificación en el portal, insertada en lotes por el worker:
+-- hora de fin de cada etapa (navegación, llenado del campo, detección),
+-- estatus y clase de error. Solo se agregan filas; la tabla está particionada
+-- por día para que la retención sea un DROP de particiones viejas.
+CREATE TABLE IF NOT EXISTS verificacion_intentos (
+  id BIGINT GENERATED ALWAYS AS IDENTITY,
+  iccid_id BIGINT NOT NULL,              -- verificacion_iccids.id
+  lote TEXT,
+  worker_id TEXT,
+  intento INT NOT NULL DEFAULT 1,        -- verificacion_iccids.intentos + 1 al verificar
+  inicio TIMESTAMP WITH TIME ZONE NOT NULL,
+  fin_navegacion TIMESTAMP WITH TIME ZONE,
+  fin_llenado TIMESTAMP WITH TIME ZONE,
+  fin_deteccion TIMESTAMP WITH TIME ZONE,
+  estatus TEXT NOT NULL,
+  clase_error TEXT,                      -- CAMPO_NO_ENCONTRADO, SIN_RESPUESTA, TIMEOUT o la excepción
+  PRIMARY KEY (id, inicio)
+) PARTITION BY RANGE (inicio);
+
+CREATE INDEX IF NOT EXISTS idx_verificacion_intentos_iccid ON verificacion_intentos (iccid_id);
+
+-- Red de seguridad: si el mantenimiento deja de correr (worker apagado, función
+-- faltante) o un reloj desfasado manda un `inicio` fuera de las particiones
+-- diarias, la fila cae aquí en lugar de hacer fallar la inserción de todo el lote
+CREATE TABLE IF NOT EXISTS verificacion_intentos_default PARTITION OF verificacion_intentos DEFAULT;
+
+-- Crear las particiones de ayer a p_dias_adelante y borrar las anteriores a
+-- p_retencion_dias; regresa cuántas se borraron. El worker la llama cada hora.
+-- Las filas de un día que cayeron en la partición DEFAULT se pasan a la
+-- partición nueva (Postgres no la crea si DEFAULT tiene filas de su rango).
+-- SECURITY DEFINER: service_role no tiene permiso de crear ni borrar tablas
+CREATE OR REPLACE FUNCTION mantener_particiones_intentos(p_retencion_dias INT DEFAULT 30,
+                                                         p_dias_adelante INT DEFAULT 7)
+RETURNS INT AS $$
+DECLARE
+  v_dia DATE;
+  v_particion TEXT;
+  v_borradas INT := 0;
+BEGIN
+  FOR v_dia IN
+    SELECT generate_series(CURRENT_DATE - 1, CURRENT_DATE + p_dias_adelante, INTERVAL '1 day')::DATE
+  LOOP
+    v_particion := 'verificacion_intentos_' || to_char(v_dia, 'YYYYMMDD');
+    CONTINUE WHEN to_regclass(v_particion) IS NOT NULL;
+
+    CREATE TEMP TABLE intentos_sin_particion ON COMMIT DROP AS
+    SELECT * FROM verificacion_intentos_default WHERE false;
+    WITH movidas AS (
+      DELETE FROM verificacion_intentos_default
+      WHERE inicio >= v_dia AND inicio < v_dia + 1
+      RETURNING *
+    )
+    INSERT INTO intentos_sin_particion SELECT * FROM movidas;
+
+    EXECUTE format(
+      'CREATE TABLE %I PARTITION OF verificacion_intentos FOR VALUES FROM (%L) TO (%L)',
+      v_particion, v_dia, v_dia + 1
+    );
+
+    INSERT INTO verificacion_intentos OVERRIDING SYSTEM VALUE SELECT * FROM intentos_sin_particion;
+    DROP TABLE intentos_sin_particion;
+  END LOOP;
+
+  -- Lo que quedó en DEFAULT (días sin partición) sigue la misma retención
+  DELETE FROM verificacion_intentos_default WHERE inicio < CURRENT_DATE - p_retencion_dias;
+
+  FOR v_particion IN
+    SELECT c.relname
+    FROM pg_inherits i
+    JOIN pg_class c ON c.oid = i.inhrelid
+    JOIN pg_class p ON p.oid = i.inhparent
+    WHERE p.relname = 'verificacion_intentos'
+      AND c.relname ~ '^verificacion_intentos_[0-9]{8}$'
+      AND to_date(right(c.relname, 8), 'YYYYMMDD') < CURRENT_DATE - p_retencion_dias
+  LOOP
+    EXECUTE format('DROP TABLE %I', v_particion);
+    v_borradas := v_borradas + 1;
+  END LOOP;
+
+  RETURN v_borradas;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+GRANT EXECUTE ON FUNCTION mantener_particiones_intentos(INT, INT) TO service_role;
+
+-- Particiones iniciales (las siguientes las crea el worker)
+SELECT mantener_particiones_intentos();
+
+-- Duración de cada etapa en milisegundos, para comparar distribuciones
+-- Ej.: p95 por etapa de la última hora
+--   SELECT percentile_cont(0.95) WITHIN GROUP (ORDER BY navegacion_ms) AS navegacion_p95,
+--          percentile_cont(0.95) WITHIN GROUP (ORDER BY llenado_ms) AS llenado_p95,
+--          percentile_cont(0.95) WITHIN GROUP (ORDER BY deteccion_ms) AS deteccion_p95
+--   FROM verificacion_intentos_etapas WHERE inicio > NOW() - INTERVAL '1 hour';
+CREATE OR REPLACE VIEW verificacion_intentos_etapas AS
+SELECT
+  id, iccid_id, lote, worker_id, intento, inicio, estatus, clase_error,
+  EXTRACT(EPOCH FROM fin_navegacion - inicio) * 1000 AS navegacion_ms,
+  EXTRACT(EPOCH FROM fin_llenado - fin_navegacion) * 1000 AS llenado_ms,
+  EXTRACT(EPOCH FROM fin_deteccion - fin_llenado) * 1000 AS deteccion_ms,
+  EXTRACT(EPOCH FROM COALESCE(fin_deteccion, fin_llenado, fin_navegacion) - inicio) * 1000 AS total_ms
+FROM verificacion_intentos;
@@ -0,0 +1,94 @@
+-- Serie de tiempo por hora: verificaciones por lote y estatus según fecha_verificacion
+-- La mantienen triggers por sentencia (mismo esquema de deltas que sql/lotes.sql),
+-- así el dashboard lee unas cuantas filas por hora sin recorrer verificacion_iccids.
+-- Refleja el estado actual: al resetear una ICCID su verificación sale de la serie.
+
+CREATE TABLE IF NOT EXISTS verificaciones_por_hora (
+    hora TIMESTAMP WITH TIME ZONE NOT NULL,
+    lote TEXT NOT NULL,
+    estatus TEXT NOT NULL,
+    total BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (hora, lote, estatus)
+);
+
+CREATE INDEX IF NOT EXISTS idx_verificaciones_hora_lote ON verificaciones_por_hora(lote, hora);
+
+DO $$
+BEGIN
+  CREATE TYPE cambio_hora AS (hora TIMESTAMP WITH TIME ZONE, lote TEXT, estatus TEXT, signo INT);
+EXCEPTION WHEN duplicate_object THEN NULL;
+END $$;
+
+CREATE OR REPLACE FUNCTION sumar_cambios_por_hora(p_cambios cambio_hora[])
+RETURNS VOID AS $$
+BEGIN
+  INSERT INTO verificaciones_por_hora AS h (hora, lote, estatus, total)
+  SELECT c.hora, c.lote, c.estatus, SUM(c.signo)
+  FROM unnest(p_cambios) c
+  GROUP BY c.hora, c.lote, c.estatus
+  HAVING SUM(c.signo) <> 0
+  ON CONFLICT (hora, lote, estatus) DO UPDATE SET total = h.total + EXCLUDED.total;
+
+  DELETE FROM verificaciones_por_hora h
+  WHERE h.total <= 0
+    AND h.hora IN (SELECT DISTINCT c.hora FROM unnest(p_cambios) c);
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION actualizar_verificaciones_por_hora()
+RETURNS TRIGGER AS $$
+DECLARE
+  v_cambios cambio_hora[] := '{}';
+BEGIN
+  -- Solo cuentan las filas ya verificadas (con fecha_verificacion y lote)
+  IF TG_OP IN ('INSERT', 'UPDATE') THEN
+    v_cambios := v_cambios || ARRAY(
+      SELECT ROW(date_trunc('hour', n.fecha_verificacion), n.lote, n.estatus, 1)::cambio_hora
+      FROM nuevas n
+      WHERE n.fecha_verificacion IS NOT NULL AND n.lote IS NOT NULL AND n.estatus IS NOT NULL
+    );
+  END IF;
+
+  IF TG_OP IN ('UPDATE', 'DELETE') THEN
+    v_cambios := v_cambios || ARRAY(
+      SELECT ROW(date_trunc('hour', v.fecha_verificacion), v.lote, v.estatus, -1)::cambio_hora
+      FROM viejas v
+      WHERE v.fecha_verificacion IS NOT NULL AND v.lote IS NOT NULL AND v.estatus IS NOT NULL
+    );
+  END IF;
+
+  IF array_length(v_cambios, 1) > 0 THEN
+    PERFORM sumar_cambios_por_hora(v_cambios);
+  END IF;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS por_hora_insert ON verificacion_iccids;
+CREATE TRIGGER por_hora_insert
+    AFTER INSERT ON verificacion_iccids
+    REFERENCING NEW TABLE AS nuevas
+    FOR EACH STATEMENT EXECUTE FUNCTION actualizar_verificaciones_por_hora();
+
+DROP TRIGGER IF EXISTS por_hora_update ON verificacion_iccids;
+CREATE TRIGGER por_hora_update
+    AFTER UPDATE ON verificacion_iccids
+    REFERENCING OLD TABLE AS viejas NEW TABLE AS nuevas
+    FOR EACH STATEMENT EXECUTE FUNCTION actualizar_verificaciones_por_hora();
+
+DROP TRIGGER IF EXISTS por_hora_delete ON verificacion_iccids;
+CREATE TRIGGER por_hora_delete
+    AFTER DELETE ON verificacion_iccids
+    REFERENCING OLD TABLE AS viejas
+    FOR EACH STATEMENT EXECUTE FUNCTION actualizar_verificaciones_por_hora();
+
+-- Inicialización (y reconstrucción) a partir de los datos existentes
+BEGIN;
+LOCK TABLE verificacion_iccids IN SHARE MODE;
+DELETE FROM verificaciones_por_hora;
+INSERT INTO verificaciones_por_hora (hora, lote, estatus, total)
+SELECT date_trunc('hour', v.fecha_verificacion), v.lote, v.estatus, COUNT(*)
+FROM verificacion_iccids v
+WHERE v.fecha_verificacion IS NOT NULL AND v.lote IS NOT NULL AND v.estatus IS NOT NULL
+GROUP BY 1, 2, 3;
+COMMIT;